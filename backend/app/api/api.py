@@ -1,5 +1,7 @@
 from fastapi import APIRouter
-from app.api.endpoints import upload
+from app.api.endpoints import upload, analytics, export
 
 api_router = APIRouter()
 api_router.include_router(upload.router, prefix="/jobs", tags=["jobs"])
+api_router.include_router(export.router, prefix="/jobs", tags=["export"])
+api_router.include_router(analytics.router, prefix="/analytics", tags=["analytics"])
@@ -0,0 +1,24 @@
+from datetime import datetime
+from typing import Optional
+from fastapi import APIRouter, Query
+from app.services.analytics.rollup import rollup_service
+from app.services.jobs.eta import eta_service
+
+router = APIRouter()
+
+
+@router.get("/trends")
+async def get_trends(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    module: Optional[str] = None,
+    window: int = Query(7, ge=1, le=90),
+):
+    """Pass-rate and defect trends across jobs, served from the rollup tables."""
+    return await rollup_service.query_trends(start=start, end=end, module=module, window=window)
+
+
+@router.get("/capacity")
+async def get_capacity(limit: int = Query(100, ge=1, le=1000)):
+    """Per-stage throughput of recent jobs and how their predicted runtime compared to the actual one."""
+    return await eta_service.capacity(limit=limit)
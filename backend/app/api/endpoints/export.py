@@ -0,0 +1,30 @@
+import os
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, StreamingResponse
+from app.services.export.exporter import FORMATS, ExportError, export_service
+from app.services.report_gen.sidecar import data_dir_for
+
+router = APIRouter()
+
+
+@router.get("/{job_id}/export")
+async def export_job(job_id: str, format: str = Query("xlsx")):
+    """Download a job's analyzed cases as xlsx (annotated original workbook), csv, jsonl or parquet."""
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"不支持的导出格式：{format}，可选：{', '.join(FORMATS)}")
+    if os.path.basename(job_id) != job_id:
+        raise HTTPException(status_code=400, detail="非法的任务 ID。")
+
+    data_dir = data_dir_for(os.path.join("reports", f"report_{job_id}.html"))
+    filename = f"{job_id}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    try:
+        if format == "csv":
+            return StreamingResponse(export_service.stream_csv(data_dir), media_type=FORMATS[format], headers=headers)
+        if format == "jsonl":
+            return StreamingResponse(export_service.stream_jsonl(data_dir), media_type=FORMATS[format], headers=headers)
+        path = await run_in_threadpool(export_service.export_file, job_id, data_dir, format)
+    except ExportError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return FileResponse(path, media_type=FORMATS[format], filename=filename)
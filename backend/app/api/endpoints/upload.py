@@ -1,14 +1,33 @@
-from fastapi import APIRouter, UploadFile, File
-from app.services.ingest.service import ingest_service
+from fastapi import APIRouter, UploadFile, File, Body, HTTPException, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from app.services.ingest.service import IngestCache, ingest_service
+from app.services.ingest.uploads import StoredUpload, UploadError, upload_service
 from app.services.ingest.tagging import module_tagger
-from app.services.analytics.stats import stats_service
+from app.services.analytics.stats import StatsAccumulator
+from app.services.analytics.rollup import rollup_service
 from app.services.defects.extractor import defect_extractor
 from app.services.defects.clustering import defect_clusterer
 from app.services.report_gen.renderer import report_generator
 from app.services.audit.auditor import ResultAuditor
+from app.services.jobs.control import job_control
+from app.services.jobs.events import STAGES, event_hub
+from app.services.jobs.eta import eta_service
+from app.services.jobs.progress import stage_progress
+from app.services.jobs.store import job_store, report_path_for
+from app.services.jobs.revision import revision_service
+from app.services.llm.offline import offline_runner
+from app.services.llm.scheduler import PRIORITY_LABELS, classify_priority, llm_scheduler
+from app.services.llm.usage import DEGRADE_CAUSES, FALLBACK_LABELS, usage_tracker
+from app.services.report_gen.sidecar import data_dir_for
+from app.services.storage.content_store import content_store
 from app.models.testcase import TestCase
-from typing import Dict, Any, List
-import shutil
+from app.core.config import settings
+from app.core import metrics
+from app.core.tracing import span
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import Dict, Any, List, Literal, NamedTuple, Optional, Tuple
+import hashlib
 import os
 import uuid
 import asyncio
@@ -17,58 +36,398 @@ router = APIRouter()
 
 job_logs: Dict[str, List[str]] = {}
 job_meta: Dict[str, Dict[str, Any]] = {}
+# Content hashes whose job is being looked up or registered; resolved once that is done
+starting_hashes: Dict[str, asyncio.Future] = {}
+
+
+class JobSource(NamedTuple):
+    path: str
+    name: str # Original upload filename
+    content: Optional[bytes] = None
 
 
 def append_log(job_id: str, message: str) -> None:
     if job_id not in job_logs:
         job_logs[job_id] = []
     job_logs[job_id].append(message)
+    event_hub.log(job_id, message)
+
+
+def set_status(job_id: str, status: str, **fields: Any) -> None:
+    job_meta[job_id]["status"] = status
+    job_meta[job_id].update(fields)
+    event_hub.status(job_id, status, **fields)
+
+def check_declared_size(request: Request) -> None:
+    # Reject oversized bodies from the declared length before reading anything
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > settings.UPLOAD_MAX_BYTES + (1 << 16):
+        raise HTTPException(status_code=413, detail=f"文件超过大小上限（{settings.UPLOAD_MAX_BYTES // (1 << 20)} MB）。")
+
+# /upload and /revise read their multipart body themselves (see save_upload_request), so the
+# file field is declared here for the API docs instead of through an UploadFile parameter
+UPLOAD_FORM = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["file"],
+            "properties": {"file": {"type": "string", "format": "binary"}},
+        }}},
+    },
+}
+
+async def save_upload_request(request: Request, job_id: str) -> Tuple[StoredUpload, str]:
+    """
+    Stream the request's `file` field straight to the uploads directory. Starlette's form
+    parsing would spool the whole body to a temporary file before the handler runs.
+    """
+    check_declared_size(request)
+    try:
+        return await upload_service.save_multipart_file(
+            request.headers.get("content-type", ""),
+            request.stream(),
+            lambda filename: os.path.join(upload_service.upload_dir, f"{job_id}_{filename}"),
+        )
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+@router.post("/upload", openapi_extra=UPLOAD_FORM)
+async def upload_file(
+    request: Request,
+    force: bool = Query(False),
+    token_budget: Optional[int] = Query(None, ge=0),
+    offline: Optional[bool] = Query(None),
+    priority: Optional[Literal["interactive", "bulk"]] = Query(None),
+):
+    job_id = str(uuid.uuid4())
+    stored, filename = await save_upload_request(request, job_id)
+    return await start_job(job_id, [(stored, filename)], force, token_budget=token_budget, offline=offline, priority=priority)
+
+
+@router.post("/batch")
+async def upload_batch(
+    files: List[UploadFile] = File(...),
+    force: bool = Query(False),
+    token_budget: Optional[int] = Query(None, ge=0),
+    offline: Optional[bool] = Query(None),
+    priority: Optional[Literal["interactive", "bulk"]] = Query(None),
+):
+    """
+    Analyze several workbooks (e.g. one per team for the same release) as a single job:
+    they are ingested concurrently, share LLM column/result mappings, are tagged and
+    clustered together and produce one combined report with a per-file breakdown.
+    Unlike /upload, the files arrive through Starlette's form parsing, which spools the body
+    to temporary files first; use multipart upload sessions for very large workbooks.
+    """
+    if len(files) > settings.BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"单个批次最多 {settings.BATCH_MAX_FILES} 个文件。")
+
+    job_id = str(uuid.uuid4())
+    saved: List[Tuple[StoredUpload, str]] = []
+    try:
+        for index, file in enumerate(files):
+            filename = os.path.basename(file.filename or f"upload_{index}.xlsx")
+            stored = await upload_service.save_upload_file(file, os.path.join(upload_service.upload_dir, f"{job_id}_{index}_{filename}"))
+            saved.append((stored, filename))
+    except UploadError as e:
+        for stored, _ in saved:
+            await asyncio.to_thread(os.remove, stored.path)
+        raise HTTPException(status_code=e.status_code, detail=f"{filename}：{e}")
+    return await start_job(job_id, saved, force, token_budget=token_budget, offline=offline, priority=priority)
+
+
+@router.post("/{base_job_id}/revise", openapi_extra=UPLOAD_FORM)
+async def revise_job(
+    base_job_id: str,
+    request: Request,
+    force: bool = Query(False),
+    token_budget: Optional[int] = Query(None, ge=0),
+    offline: Optional[bool] = Query(None),
+    priority: Optional[Literal["interactive", "bulk"]] = Query(None),
+):
+    """
+    Upload a revised version of a completed job's workbook. Rows are diffed against the base
+    job and only added or changed rows are re-analyzed; the result is a new job.
+    """
+    if os.path.basename(base_job_id) != base_job_id or not os.path.isdir(data_dir_for(report_path_for(base_job_id))):
+        raise HTTPException(status_code=404, detail="基准任务不存在或报告数据已被清理。")
+
+    job_id = str(uuid.uuid4())
+    stored, filename = await save_upload_request(request, job_id)
+    return await start_job(job_id, [(stored, filename)], force, base_job_id=base_job_id, token_budget=token_budget, offline=offline, priority=priority)
 
-@router.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
+
+@router.post("/uploads")
+async def create_multipart_upload(body: Dict[str, Any] = Body(...)):
+    """Start a resumable multipart upload: {"filename": ..., "size": optional, "sha256": optional}."""
+    if not body.get("filename"):
+        raise HTTPException(status_code=400, detail="缺少 filename。")
+    try:
+        return upload_service.create_session(body["filename"], body.get("size"), body.get("sha256"))
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+
+@router.get("/uploads/{upload_id}")
+async def get_multipart_upload(upload_id: str):
+    """Parts received so far, so an interrupted client can resume with the missing ones."""
+    try:
+        return upload_service.session_status(upload_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+
+@router.put("/uploads/{upload_id}/parts/{index}")
+async def upload_part(upload_id: str, index: int, request: Request):
+    if index < 0:
+        raise HTTPException(status_code=400, detail="分片序号必须为非负整数。")
+    try:
+        return await upload_service.write_part(upload_id, index, request.stream())
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+
+
+@router.post("/uploads/{upload_id}/complete")
+async def complete_multipart_upload(
+    upload_id: str,
+    force: bool = Query(False),
+    token_budget: Optional[int] = Query(None, ge=0),
+    offline: Optional[bool] = Query(None),
+    priority: Optional[Literal["interactive", "bulk"]] = Query(None),
+):
     job_id = str(uuid.uuid4())
-    upload_dir = "uploads"
-    os.makedirs(upload_dir, exist_ok=True)
-    file_path = os.path.join(upload_dir, f"{job_id}_{file.filename}")
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
+    try:
+        filename = upload_service.session_filename(upload_id)
+        stored = await upload_service.complete_session(upload_id, os.path.join(upload_service.upload_dir, f"{job_id}_{filename}"))
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=str(e))
+    return await start_job(job_id, [(stored, filename)], force, token_budget=token_budget, offline=offline, priority=priority)
+
+
+async def find_duplicate_job(sha256: str) -> Optional[str]:
+    """A running or completed job for identical workbook content, if any."""
+    for job_id, meta in job_meta.items():
+        if meta.get("sha256") != sha256:
+            continue
+        if meta.get("status") in ("pending", "running", "waiting_batch", "paused") or (meta.get("status") == "completed" and os.path.isfile(report_path_for(job_id))):
+            return job_id
+    job = await job_store.find_completed_by_hash(sha256)
+    if job is None:
+        return None
+    # Completed in an earlier process: register it so status and event streams can serve it
+    job_logs[job.id] = ["已从历史任务恢复分析结果。"]
+    job_meta[job.id] = {
+        "status": "completed", "report_url": job.report_url, "error": None, "sha256": sha256,
+        "stats": job.stats, "usage": job.token_usage,
+    }
+    event_hub.open(job.id, job_logs[job.id])
+    event_hub.status(job.id, "completed", report_url=job.report_url)
+    return job.id
+
+
+@asynccontextmanager
+async def reserved_hash(sha256: str):
+    """
+    Hold the content hash while the duplicate check runs and the new job is registered, so a
+    concurrent upload of the same content waits and then finds this job instead of starting another.
+    """
+    while sha256 in starting_hashes:
+        await asyncio.shield(starting_hashes[sha256])
+    # No await between the check above and the reservation below
+    done = asyncio.get_running_loop().create_future()
+    starting_hashes[sha256] = done
+    try:
+        yield
+    finally:
+        del starting_hashes[sha256]
+        done.set_result(None)
+
+
+def combined_sha256(hashes: List[str]) -> str:
+    """Content key of a batch: independent of upload order, so re-sending the same set dedups."""
+    if len(hashes) == 1:
+        return hashes[0]
+    return hashlib.sha256("\n".join(sorted(hashes)).encode("ascii")).hexdigest()
 
-    job_logs[job_id] = []
-    job_meta[job_id] = {"status": "pending", "report_url": None, "error": None}
-    append_log(job_id, "文件已上传，等待开始处理。")
 
-    asyncio.create_task(run_local_pipeline(job_id, file_path))
+async def start_job(
+    job_id: str,
+    files: List[Tuple[StoredUpload, str]],
+    force: bool = False,
+    base_job_id: Optional[str] = None,
+    token_budget: Optional[int] = None,
+    offline: Optional[bool] = None,
+    priority: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Start a job over one workbook, or several (batch), given as (stored upload, original filename).
+    `token_budget` caps the job's LLM tokens (default JOB_TOKEN_BUDGET, 0 = unlimited).
+    `offline` sends the bulk LLM stages through provider batch files (default: jobs of at
+    least LLM_OFFLINE_MIN_CASES cases); the job waits in "waiting_batch" meanwhile.
+    `priority` is the job's class in the LLM fair-share scheduler (interactive, bulk); by
+    default jobs of up to LLM_INTERACTIVE_MAX_CASES cases are interactive.
+    """
+    sha256 = combined_sha256([stored.sha256 for stored, _ in files])
+    async with reserved_hash(sha256):
+        if not force:
+            existing_id = await find_duplicate_job(sha256)
+            if existing_id:
+                # Identical content: drop the new copies and hand back the existing job
+                for stored, _ in files:
+                    await asyncio.to_thread(os.remove, stored.path)
+                await job_store.update(existing_id, last_used_at=datetime.utcnow())
+                meta = job_meta[existing_id]
+                return {
+                    "job_id": existing_id,
+                    "sha256": sha256,
+                    "deduplicated": True,
+                    "status": meta.get("status"),
+                    "report_url": meta.get("report_url"),
+                    "message": "检测到内容相同的工作簿，直接返回已有任务结果（如需重新分析请传入 force=true）。",
+                }
+
+        sources = [JobSource(await content_store.put(stored), filename, stored.content) for stored, filename in files]
+        size = sum(stored.size for stored, _ in files)
+        member_hashes = [stored.sha256 for stored, _ in files] if len(files) > 1 else None
+        budget = (settings.JOB_TOKEN_BUDGET if token_budget is None else token_budget) or None
+        await job_store.create(job_id, ", ".join(filename for _, filename in files), sha256, size, member_hashes, budget)
+
+        job_logs[job_id] = []
+        job_meta[job_id] = {
+            "status": "pending", "report_url": None, "error": None, "sha256": sha256,
+            "source_paths": [s.path for s in sources], "base_job_id": base_job_id, "token_budget": budget,
+            "offline": offline, "priority": priority,
+        }
+        event_hub.open(job_id, job_logs[job_id])
+        if len(files) > 1:
+            append_log(job_id, f"已上传 {len(files)} 个文件（共 {size} 字节），等待开始处理。")
+        else:
+            append_log(job_id, f"文件已上传（{size} 字节），等待开始处理。")
+
+    job_control.start(job_id, run_local_pipeline(job_id, sources, base_job_id))
 
     return {
         "job_id": job_id,
+        "sha256": sha256,
+        "deduplicated": False,
         "message": "本地流水线已启动。",
     }
 
 
-async def run_local_pipeline(job_id: str, file_path: str) -> None:
-    job_meta[job_id]["status"] = "running"
+async def run_local_pipeline(job_id: str, sources: List[JobSource], base_job_id: Optional[str] = None) -> None:
+    """
+    Full analysis pipeline over one or more workbooks. With `base_job_id` (revision mode) only
+    rows that were added or changed since the base job go through the LLM stages; the rest
+    reuse the base analysis.
+    """
+    # Root span of the job's trace; stage and LLM spans nest under it
+    with span("pipeline", job_id=job_id, files=len(sources), base_job_id=base_job_id) as root:
+        await _run_pipeline(job_id, sources, base_job_id)
+        meta = job_meta.get(job_id) or {}
+        root.set(status=meta.get("status"), cases=(meta.get("stats") or {}).get("total_cases"))
+        root.error = meta.get("error")
+        metrics.JOBS.inc(status=meta.get("status") or "unknown")
+
+
+async def _run_pipeline(job_id: str, sources: List[JobSource], base_job_id: Optional[str]) -> None:
+    usage = None
+    summary_task: Optional[asyncio.Task] = None
+    # Everything from here on is inside the try, so a cancel or failure at any await is recorded
+    # and the trackers opened below are always closed
     try:
-        append_log(job_id, "步骤 1/6：解析 Excel 数据。")
-        raw_cases = await ingest_service.parse_excel(file_path, job_id)
-        cases = [TestCase(**d) for d in raw_cases]
-        append_log(job_id, f"已解析 {len(cases)} 条用例。")
+        set_status(job_id, "running")
+        usage = usage_tracker.open(job_id, job_meta[job_id].get("token_budget"))
+        # Interactive until the case count is known; ingest makes few LLM calls
+        llm_scheduler.open(job_id, job_meta[job_id].get("priority") or "interactive")
+        eta_service.open(job_id, sum(len(s.content) if s.content is not None else os.path.getsize(s.path) for s in sources))
+        await job_store.update(job_id, status="running")
+
+        with stage_progress(job_id, "ingest"):
+            append_log(job_id, "步骤 1/6：解析 Excel 数据。")
+            # Workbooks of a batch are parsed concurrently and share column/result mappings
+            cache = IngestCache() if len(sources) > 1 else None
+            parsed = await asyncio.gather(*(
+                ingest_service.parse_excel(s.path, job_id, s.content, cache=cache, source_name=s.name) for s in sources
+            ))
+            # The in-memory copies of small uploads were only for the parser; don't hold them for the whole job
+            sources[:] = [s._replace(content=None) for s in sources]
+            raw_cases = [d for chunk in parsed for d in chunk]
+            for ordinal, d in enumerate(raw_cases):
+                d["ordinal"] = ordinal # Renumber across files: ordinals key the LLM batches
+            cases = [TestCase(**d) for d in raw_cases]
+            # Result, executor, sheet and file breakdowns are known now; /stats serves them during the LLM stages
+            stats_acc = StatsAccumulator().add(cases)
+            job_meta[job_id]["stats"] = stats_acc.snapshot()
+            if len(sources) > 1:
+                per_file = "，".join(f"{s.name} {len(chunk)} 条" for s, chunk in zip(sources, parsed))
+                append_log(job_id, f"已解析 {len(sources)} 个文件共 {len(cases)} 条用例（{per_file}）。")
+            else:
+                append_log(job_id, f"已解析 {len(cases)} 条用例。")
+
+            targets = cases
+            base_clusters: List[Any] = []
+            if base_job_id:
+                base_records, base_cluster_data = await asyncio.to_thread(
+                    revision_service.load_base, data_dir_for(report_path_for(base_job_id))
+                )
+                diff = revision_service.diff(cases, base_records)
+                base_clusters = revision_service.carry_forward(diff, base_cluster_data, job_id)
+                targets = diff.dirty
+                append_log(
+                    job_id,
+                    f"与基准任务 {base_job_id} 对比：{len(diff.unchanged)} 条未变化（沿用已有分析），"
+                    f"{len(diff.dirty)} 条新增或修改，{diff.removed} 条已删除。"
+                )
+
+        priority = job_meta[job_id].get("priority")
+        if priority:
+            append_log(job_id, f"LLM 调度优先级：{PRIORITY_LABELS[priority]}（上传时指定）。")
+        else:
+            priority = classify_priority(len(targets))
+            llm_scheduler.set_priority(job_id, priority)
+            append_log(job_id, f"LLM 调度优先级：{PRIORITY_LABELS[priority]}（按 {len(targets)} 条待分析用例自动判定）。")
 
-        append_log(job_id, "步骤 2/6：模块打标（LLM 并发）。")
-        cases = await module_tagger.tag_cases_concurrently(cases)
+        offline = job_meta[job_id].get("offline")
+        if offline is None:
+            offline = 0 < settings.LLM_OFFLINE_MIN_CASES <= len(targets)
+        if offline:
+            offline_runner.open(job_id, *_batch_callbacks(job_id))
+            append_log(job_id, f"离线批处理模式：打标、审计与缺陷提取的 LLM 请求将按批写入请求文件提交（{settings.LLM_BATCH_BACKEND}），等待结果期间任务暂停。")
+        eta_service.plan(job_id, {
+            "tagging": len(targets),
+            "audit": sum(1 for c in targets if c.normalized_result == "Pass"),
+            "extraction": sum(1 for c in targets if c.normalized_result in ("Fail", "Blocked")),
+            "stats": len(cases),
+            "report": len(cases),
+        })
 
-        append_log(job_id, "步骤 3/6：结果审计（LLM 并发检查假成功）。")
-        auditor = ResultAuditor()
-        cases = await auditor.audit_cases_concurrently(cases)
-        suspicious_cases = [c for c in cases if c.audit_status == "Flagged"]
-        append_log(job_id, f"发现 {len(suspicious_cases)} 个存疑用例。")
+        await job_control.checkpoint(job_id)
+        with stage_progress(job_id, "tagging", total=len(targets)):
+            append_log(job_id, "步骤 2/6：模块打标（LLM 并发）。")
+            await module_tagger.tag_cases(targets)
 
-        append_log(job_id, "步骤 4/6：计算统计数据。")
-        stats = stats_service.compute_stats(cases)
+        await job_control.checkpoint(job_id)
+        with stage_progress(job_id, "audit", total=sum(1 for c in targets if c.normalized_result == "Pass")):
+            append_log(job_id, "步骤 3/6：结果审计（LLM 并发检查假成功）。")
+            auditor = ResultAuditor()
+            # Verdicts are set in place; the case list keeps its sheet/row order
+            await auditor.audit_cases_concurrently(targets)
+            suspicious_cases = [c for c in cases if c.audit_status == "Flagged"]
+            append_log(job_id, f"发现 {len(suspicious_cases)} 个存疑用例。")
 
-        append_log(job_id, "步骤 5/6：提取缺陷事实（LLM 并发）。")
-        defects = await defect_extractor.extract_defect_facts_concurrently(cases)
-        append_log(job_id, f"提取了 {len(defects)} 条缺陷分析。")
+        await job_control.checkpoint(job_id)
+        with stage_progress(job_id, "extraction", total=sum(1 for c in targets if c.normalized_result in ("Fail", "Blocked"))):
+            append_log(job_id, "步骤 4/6：提取缺陷事实（LLM 并发）。")
+            defects = await defect_extractor.extract_defect_facts_concurrently(targets)
+            append_log(job_id, f"提取了 {len(defects)} 条缺陷分析。")
+
+        # Stats run after extraction so the severity breakdown is available
+        await job_control.checkpoint(job_id)
+        with stage_progress(job_id, "stats"):
+            append_log(job_id, "步骤 5/6：计算统计数据。")
+            stats = stats_acc.add_analysis(cases).snapshot()
+            job_meta[job_id]["stats"] = stats
 
         linked_defects: List[Any] = []
         for c in cases:
@@ -76,40 +435,222 @@ async def run_local_pipeline(job_id: str, file_path: str) -> None:
                 c.defect_analysis.testcase = c
                 linked_defects.append(c.defect_analysis)
 
-        append_log(job_id, "步骤 6/6：缺陷聚类并生成报告。")
-        clusters = await defect_clusterer.cluster_and_summarize_async(linked_defects, job_id)
+        await job_control.checkpoint(job_id)
+        with stage_progress(job_id, "report"):
+            append_log(job_id, "步骤 6/6：缺陷聚类并生成报告。")
+            if base_job_id:
+                # Carried-forward defects keep their clusters; only new ones are assigned
+                clusters = await defect_clusterer.assign_incremental(base_clusters, defects, job_id)
+            else:
+                clusters = await defect_clusterer.cluster_and_summarize_async(linked_defects, job_id)
+
+            output_dir = "reports"
+            os.makedirs(output_dir, exist_ok=True)
+            filename = f"report_{job_id}.html"
+            report_path = os.path.join(output_dir, filename)
+            # The summary only needs stats and cluster names; start it before the report data is written
+            summary_task = report_generator.start_summary(stats, clusters, suspicious_cases, report_path)
+            await report_generator.arender_report(
+                job_id, stats, linked_defects, clusters, suspicious_cases, cases, report_path,
+                summary_task=summary_task, usage=usage.report(),
+            )
 
-        output_dir = "reports"
-        os.makedirs(output_dir, exist_ok=True)
-        filename = f"report_{job_id}.html"
-        report_path = os.path.join(output_dir, filename)
-        report_generator.render_report(job_id, stats, linked_defects, clusters, suspicious_cases, cases, report_path)
+            await rollup_service.write_job_rollups(job_id, stats)
 
         report_url = f"/reports/{filename}"
-        job_meta[job_id]["status"] = "completed"
-        job_meta[job_id]["report_url"] = report_url
         append_log(job_id, f"报告已生成：{report_url}")
+        if usage.degraded:
+            causes = [DEGRADE_CAUSES.get(c, c) + (f"（已用 {usage.total}/{usage.budget}）" if c == "budget" else "") for c in usage.causes]
+            append_log(
+                job_id,
+                "、".join(causes) + "，已降级："
+                + "；".join(FALLBACK_LABELS.get(s, s) for s in usage.degraded) + "。"
+            )
         append_log(job_id, "流水线执行完成。")
+        job_meta[job_id]["usage"] = usage.report()
+        # Offline and paused jobs waited on things other than throughput; they are not learned from
+        job_meta[job_id]["runtime"] = await eta_service.finish(
+            job_id, len(cases), job_meta[job_id]["usage"], learn=not offline and not job_meta[job_id].get("interrupted"),
+        )
+        set_status(job_id, "completed", report_url=report_url)
+        now = datetime.utcnow()
+        await job_store.update(
+            job_id, status="completed", report_url=report_url, stats=stats, completed_at=now, last_used_at=now,
+            token_usage=job_meta[job_id]["usage"],
+        )
+    except asyncio.CancelledError:
+        # Cancelled through the API; stage progress, logs and usage so far are kept
+        if summary_task is not None:
+            summary_task.cancel()
+        append_log(job_id, "任务已取消。")
+        job_meta[job_id]["usage"] = usage.report() if usage else None
+        set_status(job_id, "cancelled", batch=None)
+        await job_store.update(job_id, status="cancelled", token_usage=job_meta[job_id]["usage"])
     except Exception as exc:
-        job_meta[job_id]["status"] = "failed"
-        job_meta[job_id]["error"] = str(exc)
         append_log(job_id, f"流水线执行失败：{exc}")
+        job_meta[job_id]["usage"] = usage.report() if usage else None
+        set_status(job_id, "failed", error=str(exc))
+        await job_store.update(job_id, status="failed", error=str(exc), token_usage=job_meta[job_id]["usage"])
+    finally:
+        usage_tracker.close(job_id)
+        eta_service.close(job_id)
+        job_meta[job_id]["scheduling"] = llm_scheduler.close(job_id)
+        batches = offline_runner.close(job_id)
+        if batches is not None:
+            job_meta[job_id]["batches"] = batches
+
+    await content_store.collect(active_source_paths())
+
+
+def _batch_callbacks(job_id: str):
+    """Park the job while an offline batch is out and resume it when results are in."""
+
+    async def on_wait(batch: Dict[str, Any]) -> None:
+        append_log(job_id, f"{STAGES.get(batch['stage'], batch['stage'])}：已提交批处理 {batch['batch_id']}（{batch['requests']} 个请求），等待结果。")
+        if job_control.paused(job_id):
+            job_meta[job_id]["batch"] = batch
+            return
+        set_status(job_id, "waiting_batch", batch=batch)
+        await job_store.update(job_id, status="waiting_batch")
+
+    async def on_resume(batch: Dict[str, Any]) -> None:
+        if batch["status"] == "failed":
+            append_log(job_id, f"{STAGES.get(batch['stage'], batch['stage'])}：批处理失败（{batch.get('error')}），改为实时调用 LLM。")
+        else:
+            append_log(job_id, f"{STAGES.get(batch['stage'], batch['stage'])}：批处理 {batch['batch_id']} 已完成（{batch.get('answered', 0)}/{batch['requests']} 个结果），继续处理。")
+        job_meta[job_id]["batch"] = None
+        if job_meta[job_id].get("status") == "waiting_batch":
+            set_status(job_id, "running", batch=None)
+            await job_store.update(job_id, status="running")
+
+    return on_wait, on_resume
+
+
+def active_source_paths() -> List[str]:
+    return [
+        path for meta in job_meta.values()
+        if meta.get("status") in ("pending", "running", "waiting_batch", "paused")
+        for path in meta.get("source_paths") or []
+    ]
+
+
+@router.post("/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    """
+    Stop a running job: queued and in-flight LLM calls and outstanding offline batches are
+    cancelled and its LLM slots go to other jobs right away.
+    """
+    meta = _controllable(job_id)
+    await job_control.cancel(job_id)
+    if meta.get("status") == "pending":
+        # Cancelled before the pipeline took its first step, so it recorded nothing itself
+        append_log(job_id, "任务已取消。")
+        set_status(job_id, "cancelled")
+        await job_store.update(job_id, status="cancelled")
+    return {"job_id": job_id, "status": meta.get("status")}
+
+
+@router.post("/{job_id}/pause")
+async def pause_job(job_id: str):
+    """Stop giving the job LLM slots and hold it at the next stage boundary."""
+    _controllable(job_id)
+    if not job_control.pause(job_id):
+        raise HTTPException(status_code=409, detail="任务已处于暂停状态。")
+    job_meta[job_id]["interrupted"] = True
+    append_log(job_id, "任务已暂停：不再发起新的 LLM 调用，进行中的调用完成后停在当前位置。")
+    set_status(job_id, "paused")
+    await job_store.update(job_id, status="paused")
+    return {"job_id": job_id, "status": "paused"}
+
+
+@router.post("/{job_id}/resume")
+async def resume_job(job_id: str):
+    _controllable(job_id)
+    if not job_control.resume(job_id):
+        raise HTTPException(status_code=409, detail="任务未处于暂停状态。")
+    status = "waiting_batch" if job_meta[job_id].get("batch") else "running"
+    append_log(job_id, "任务已恢复。")
+    set_status(job_id, status)
+    await job_store.update(job_id, status=status)
+    return {"job_id": job_id, "status": status}
+
+
+def _controllable(job_id: str) -> Dict[str, Any]:
+    meta = job_meta.get(job_id)
+    if not meta:
+        raise HTTPException(status_code=404, detail="任务不存在。")
+    if not job_control.active(job_id):
+        raise HTTPException(status_code=409, detail=f"任务已结束（{meta.get('status')}）。")
+    return meta
+
+
+@router.get("/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request, last_event_id: Optional[int] = None):
+    """
+    Server-Sent Events stream of a job's stage changes, progress counters and log lines.
+    Reconnecting clients resume from the Last-Event-ID header (or `last_event_id`).
+    """
+    channel = event_hub.get(job_id)
+    if channel is None:
+        raise HTTPException(status_code=404, detail="任务不存在。")
+    header = request.headers.get("last-event-id")
+    if header and header.isdigit():
+        last_event_id = int(header)
+    return StreamingResponse(
+        channel.subscribe(last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/status/{job_id}")
-async def get_job_status(job_id: str):
+async def get_job_status(job_id: str, request: Request, since: Optional[int] = Query(None, ge=0)):
+    """
+    Job status with an incremental log tail: pass the returned `cursor` back as `since`
+    to receive only new log lines. Unchanged status answers 304 to a matching If-None-Match.
+    """
     meta = job_meta.get(job_id)
     logs = job_logs.get(job_id, [])
     if not meta:
         return {
             "job_id": job_id,
             "status": "unknown",
-            "logs": logs,
+            "logs": logs[since or 0:],
+            "cursor": len(logs),
         }
-    return {
+
+    channel = event_hub.get(job_id)
+    live_usage = usage_tracker.get(job_id)
+    payload = {
         "job_id": job_id,
         "status": meta.get("status"),
-        "logs": logs,
+        "stage": channel.state["stage"] if channel else None,
+        "progress": channel.progress_report() if channel else {},
+        "logs": logs[since or 0:],
+        "cursor": len(logs),
         "report_url": meta.get("report_url"),
         "error": meta.get("error"),
+        "usage": live_usage.report() if live_usage else meta.get("usage"),
+        "batch": meta.get("batch"),
+        # Priority class, share of the busy LLM slots and slot wait times
+        "scheduling": llm_scheduler.report(job_id) or meta.get("scheduling"),
+        # Remaining time from historical stage throughput; predicted vs. actual runtime once done
+        "eta": eta_service.estimate(job_id, meta.get("status")),
+        "runtime": meta.get("runtime"),
     }
+    # The ETag hashes the rendered body: progress counters are updated between published
+    # events, and usage, scheduling and ETA change without publishing any
+    response = JSONResponse(payload, headers={"Cache-Control": "no-cache"})
+    etag = f'W/"{hashlib.sha256(response.body).hexdigest()[:32]}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return response
+
+
+@router.get("/{job_id}/stats")
+async def get_job_stats(job_id: str):
+    meta = job_meta.get(job_id)
+    if not meta or meta.get("stats") is None:
+        raise HTTPException(status_code=404, detail="统计数据尚未生成。")
+    return {"job_id": job_id, "stats": meta["stats"]}
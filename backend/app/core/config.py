@@ -1,5 +1,5 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List
+from typing import Any, Dict, List, Optional
 import os
 
 class Settings(BaseSettings):
@@ -16,12 +16,76 @@ class Settings(BaseSettings):
     
     # LLM
     LLM_API_KEY: str
-    LLM_MODEL: str = "glm-4-air"
+    LLM_MODEL: str = "glm-4-air" # Synthesis stages (clustering, summary) and calls without a profile
+    LLM_FAST_MODEL: str = "glm-4-flash" # Bulk stages (alignment, normalization, tagging, audit, extraction)
+    LLM_PROFILES: Dict[str, Dict[str, Any]] = {} # Per-profile overrides as JSON, e.g. {"audit": {"model": "glm-4-air", "max_tokens": 4096}}
+    LLM_BASE_URL: Optional[str] = None # Zhipu-compatible endpoint override, e.g. benchmarks/fake_llm_server.py
     LLM_TEMPERATURE: float = 0.3
     LLM_MAX_TOKENS: int = 10000
-    LLM_CONCURRENCY: int = 20
-    LLM_TIMEOUT: int = 60
-    LLM_MAX_RETRIES: int = 2
+    LLM_CONCURRENCY: int = 20 # Slots shared fairly across jobs (see llm/scheduler.py)
+    LLM_PRIORITY_WEIGHTS: Dict[str, float] = {"interactive": 8.0, "bulk": 1.0} # Fair-share weight of each job priority class
+    LLM_INTERACTIVE_MAX_CASES: int = 2000 # Jobs analyzing up to this many cases are interactive unless the upload says otherwise
+    LLM_TIMEOUT: int = 60 # Seconds per HTTP attempt of calls without a profile
+    LLM_MAX_RETRIES: int = 2 # Within the call's deadline (see llm/profiles.py)
+    LLM_HEDGE_ENABLED: bool = True # Duplicate slow idempotent calls, first answer wins
+    LLM_HEDGE_QUANTILE: float = 0.95 # Hedge once a call runs longer than this quantile of recent ones
+    LLM_HEDGE_MAX_RATIO: float = 0.05 # Hedges as a share of all calls, caps the extra load
+    LLM_HEDGE_MIN_SAMPLES: int = 20 # Latencies a profile needs before its calls are hedged
+    LLM_BREAKER_FAILURES: int = 5 # Timeouts / 5xx / connection errors among the last 20 requests (and a majority) that open the circuit, 0 = off
+    LLM_BREAKER_COOLDOWN: float = 30.0 # Seconds the circuit stays open before one probe call is let through
+    LLM_BATCH_MAX_ROUNDS: int = 3 # Re-queue rounds for items missing from a batch response
+    LLM_OFFLINE_MIN_CASES: int = 0 # Jobs with at least this many cases run tagging/audit/extraction through provider batch files, 0 = only on request
+    LLM_BATCH_BACKEND: str = "local" # Offline batch backend: local (files under LLM_BATCH_DIR), zhipu (Batch API)
+    LLM_BATCH_DIR: str = "batches" # Request files, and the local backend's batches
+    LLM_BATCH_POLL_SECONDS: float = 30.0
+    LLM_BATCH_MAX_WAIT_SECONDS: float = 24 * 3600.0 # Then the batch's requests are sent in real time
+    JOB_TOKEN_BUDGET: int = 0 # Default per-job token cap (prompt + completion), 0 = unlimited
+    JOB_TOKEN_BUDGET_DEGRADE_RATIO: float = 0.8 # Past this share of the budget, stages switch to local strategies
+
+    # Job ETA
+    ETA_HISTORY_JOBS: int = 50 # Completed jobs per stage the throughput model is fit on
+
+    # Module Tagging
+    TAGGING_MODE: str = "full" # full, grouped (opt-in: LLM labels a few exemplars per lexical group)
+    TAGGING_GROUP_THRESHOLD: float = 0.5
+    TAGGING_EXEMPLARS_PER_GROUP: int = 2
+
+    # Result Audit
+    AUDIT_RULES_ENABLED: bool = True
+    AUDIT_RULE_PASS_SIMILARITY: float = 0.9
+    AUDIT_RULE_FLAG_SIMILARITY: float = 0.5
+
+    # Defect Extraction
+    EXTRACT_BATCH_SIZE: int = 5
+
+    # Report
+    REPORT_CHUNK_SIZE: int = 2000 # Cases per JSON data chunk written next to the report
+    REPORT_TEMPLATE_CACHE_DIR: str = ".cache/jinja"
+    REPORT_WRITE_BUFFER: int = 1 << 16
+    REPORT_SUMMARY_TIMEOUT: float = 20.0 # Wait this long for the summary before rendering a placeholder
+    REPORT_SUMMARY_MAX_SECONDS: float = 300.0
+    REPORT_SUMMARY_STREAM: bool = True
+
+    # Upload
+    UPLOAD_MAX_BYTES: int = 256 << 20
+    UPLOAD_CHUNK_BYTES: int = 1 << 20
+    UPLOAD_IN_MEMORY_MAX_BYTES: int = 8 << 20 # Smaller uploads are parsed straight from memory
+    UPLOAD_PART_BYTES: int = 8 << 20 # Suggested part size for resumable multipart uploads
+    BATCH_MAX_FILES: int = 50 # Workbooks accepted by one /jobs/batch request
+
+    STORAGE_BUDGET_BYTES: int = 10 << 30 # Uploads + reports + exports; GC evicts beyond this
+
+    # Job progress events (SSE)
+    JOB_EVENTS_BUFFER: int = 5000 # Events kept per job for Last-Event-ID resume
+    JOB_EVENTS_HEARTBEAT_SECONDS: float = 15.0
+    JOB_EVENTS_PROGRESS_INTERVAL: float = 0.5 # Minimum seconds between progress events of a stage
+    JOB_EVENTS_RETENTION_SECONDS: float = 600.0 # Finished jobs' channels are dropped this long after their last status
+
+    # Export
+    EXPORT_DIR: str = "exports"
+
+    # Observability
+    TRACE_EXPORT_PATH: Optional[str] = None # Append finished spans as OpenTelemetry-style JSON lines, e.g. logs/traces.jsonl
 
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding='utf-8', case_sensitive=True, extra='ignore')
 
@@ -0,0 +1,175 @@
+import math
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# Minimal Prometheus-compatible metrics (text exposition format 0.0.4).
+# Metrics are updated from the event loop and from LLM worker threads, so every
+# metric guards its samples with a lock.
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    @abstractmethod
+    def _samples(self) -> List[str]:
+        """Exposition lines of the metric's current values."""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: str) -> float:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+            return self._values[key]
+
+    def dec(self, amount: float = 1, **labels: str) -> float:
+        return self.inc(-amount, **labels)
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Sequence[float] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self._sums[key] = self._sums.get(key, 0.0) + value
+
+    def _samples(self) -> List[str]:
+        lines = []
+        with self._lock:
+            items = sorted((k, list(c), self._sums[k]) for k, c in self._counts.items())
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, ('le', _format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for m in self.metrics for line in m.render()) + "\n"
+
+registry = Registry()
+
+_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 40, 60, 120, 300)
+_STAGE_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+_DEPTH_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+# Pipeline
+STAGE_DURATION = registry.register(Histogram("pipeline_stage_duration_seconds", "Wall time of pipeline stages.", ["stage"], _STAGE_BUCKETS))
+JOBS = registry.register(Counter("pipeline_jobs_total", "Finished pipeline jobs by outcome.", ["status"]))
+INGEST_CACHE = registry.register(Counter("ingest_cache_lookups_total", "Batch ingest cache lookups.", ["namespace", "result"]))
+
+# LLM calls
+LLM_LATENCY = registry.register(Histogram("llm_request_duration_seconds", "LLM call latency including retries, by pipeline stage.", ["stage"], _LATENCY_BUCKETS))
+LLM_QUEUE_WAIT = registry.register(Histogram("llm_queue_wait_seconds", "Time LLM calls waited for a concurrency slot.", ["stage"], _LATENCY_BUCKETS))
+LLM_SCHEDULER_WAIT = registry.register(Histogram("llm_scheduler_wait_seconds", "Time LLM calls waited for a slot, by the job's priority class.", ["priority"], _LATENCY_BUCKETS))
+LLM_QUEUE_DEPTH = registry.register(Histogram("llm_queue_depth", "Calls waiting for a concurrency slot, sampled when a call arrives.", [], _DEPTH_BUCKETS))
+LLM_INFLIGHT = registry.register(Histogram("llm_inflight_requests", "Calls in flight, sampled when a call starts.", [], _DEPTH_BUCKETS))
+LLM_QUEUE_DEPTH_NOW = registry.register(Gauge("llm_queue_depth_current", "Calls currently waiting for a concurrency slot."))
+LLM_INFLIGHT_NOW = registry.register(Gauge("llm_inflight_requests_current", "Calls currently in flight."))
+LLM_REQUESTS = registry.register(Counter("llm_requests_total", "LLM calls by stage and outcome.", ["stage", "outcome"]))
+LLM_HTTP = registry.register(Counter("llm_http_responses_total", "HTTP responses from the LLM API, including SDK-internal retries.", ["status"]))
+LLM_RETRIES = registry.register(Counter("llm_retries_total", "Extra attempts made for LLM calls.", ["stage"]))
+LLM_ERRORS = registry.register(Counter("llm_errors_total", "Failed LLM attempts by stage and error type.", ["stage", "error"]))
+LLM_RATE_LIMITED = registry.register(Counter("llm_rate_limited_total", "HTTP 429 responses from the LLM API.", ["stage"]))
+LLM_TOKENS = registry.register(Counter("llm_tokens_total", "LLM tokens by stage and kind.", ["stage", "kind"]))
+LLM_ROUTED = registry.register(Counter("llm_routed_requests_total", "LLM calls by model profile and the model it was routed to.", ["profile", "model"]))
+LLM_PROFILE_LATENCY = registry.register(Histogram("llm_profile_request_duration_seconds", "LLM call latency by model profile and model.", ["profile", "model"], _LATENCY_BUCKETS))
+LLM_HEDGES = registry.register(Counter("llm_hedged_requests_total", "Duplicate requests sent for slow calls, and how many answered first.", ["profile", "outcome"]))
+LLM_DEADLINE_EXCEEDED = registry.register(Counter("llm_deadline_exceeded_total", "LLM calls that ran out of their deadline.", ["stage"]))
+LLM_BREAKER_STATE = registry.register(Gauge("llm_circuit_state", "LLM circuit breaker state: 0 closed, 1 half-open, 2 open."))
+LLM_BREAKER_REJECTED = registry.register(Counter("llm_circuit_rejected_total", "LLM calls refused while the circuit was open.", ["stage"]))
+LLM_BATCHES = registry.register(Counter("llm_offline_batches_total", "Provider batch files of offline jobs, by outcome.", ["stage", "outcome"]))
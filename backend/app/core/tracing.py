@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+from app.core.config import settings
+
+# Lightweight spans for the pipeline and LLM calls. The current span lives in a context
+# variable, so asyncio tasks and asyncio.to_thread workers started inside a span see it
+# as their parent. Finished spans are optionally written as OpenTelemetry-style JSON lines.
+
+_current: ContextVar[Optional["Span"]] = ContextVar("trace_span", default=None)
+
+
+def trace_id_for(job_id: str) -> str:
+    """Stable trace id per job, so all spans of a job (and its retries) group together."""
+    return hashlib.md5(job_id.encode("utf-8")).hexdigest()
+
+
+class Span:
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.parent_id = parent.span_id if parent else None
+        job_id = attributes.get("job_id")
+        if parent:
+            self.trace_id = parent.trace_id
+        else:
+            self.trace_id = trace_id_for(str(job_id)) if job_id else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.attributes = {k: v for k, v in attributes.items() if v is not None}
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def set(self, **attributes: Any) -> None:
+        with self._lock:
+            self.attributes.update({k: v for k, v in attributes.items() if v is not None})
+
+    def add(self, key: str, amount: float = 1) -> None:
+        """Accumulate a numeric attribute (tokens, attempts, cache hits)."""
+        with self._lock:
+            self.attributes[key] = self.attributes.get(key, 0) + amount
+
+    @property
+    def duration(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e9
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": [{"key": k, "value": _attribute_value(v)} for k, v in self.attributes.items()],
+            "status": {"code": "STATUS_CODE_ERROR", "message": self.error} if self.error else {"code": "STATUS_CODE_OK"},
+        }
+
+
+def _attribute_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+class SpanExporter:
+    """Buffers finished spans and appends them to TRACE_EXPORT_PATH when a root span ends."""
+
+    def __init__(self, path: Optional[str], max_buffer: int = 1000):
+        self.path = path
+        self.max_buffer = max_buffer
+        self._buffer: List[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        if not self.path:
+            return
+        with self._lock:
+            self._buffer.append(span)
+            if span.parent_id is None or len(self._buffer) >= self.max_buffer:
+                self._flush_locked()
+
+    def _flush_locked(self) -> None:
+        spans, self._buffer = self._buffer, []
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for s in spans:
+                f.write(json.dumps(s.to_dict(), ensure_ascii=False) + "\n")
+
+exporter = SpanExporter(settings.TRACE_EXPORT_PATH)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def start_span(name: str, **attributes: Any) -> Span:
+    """Create a child of the current span without making it current (see `span`)."""
+    return Span(name, _current.get(), attributes)
+
+
+def activate(s: Span) -> None:
+    """Make `s` the current span of this context, e.g. inside a copied context for a worker."""
+    _current.set(s)
+
+
+def finish(s: Span, exc: Optional[BaseException] = None) -> None:
+    if exc is not None:
+        s.error = f"{type(exc).__name__}: {exc}"
+    s.end_ns = time.time_ns()
+    exporter.export(s)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """Open a child span of the current one (or a new trace) for the enclosed block."""
+    s = start_span(name, **attributes)
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as exc:
+        _current.reset(token)
+        finish(s, exc)
+        raise
+    _current.reset(token)
+    finish(s)
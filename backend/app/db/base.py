@@ -3,3 +3,5 @@ from app.models.base import Base
 from app.models.job import Job
 from app.models.testcase import TestCase
 from app.models.defect import DefectAnalysis, DefectCluster
+from app.models.rollup import JobRollup, ModuleRollup, SeverityRollup, StageRollup, RuntimeRollup
+from app.models.content import ContentBlob
@@ -1,6 +1,11 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger("db")
 
 engine = create_async_engine(
     settings.DATABASE_URL,
@@ -20,3 +25,34 @@ async def get_db():
             yield session
         finally:
             await session.close()
+
+async def init_db():
+    # Create any missing tables (all models are registered via app.db.base)
+    from app.db.base import Base
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(add_missing_columns, Base.metadata)
+
+
+def add_missing_columns(conn: Connection, metadata) -> None:
+    """
+    Additive migration: create_all leaves existing tables alone, so columns that models
+    gained since a database was created are added here, together with their indexes.
+    Added columns are nullable whatever the model says (SQLite cannot add a NOT NULL
+    column without a default); rows written before keep NULL.
+    """
+    inspector = inspect(conn)
+    quote = conn.dialect.identifier_preparer.quote
+    for table in metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        missing = [column for column in table.columns if column.name not in existing]
+        for column in missing:
+            conn.execute(text(
+                f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} {column.type.compile(dialect=conn.dialect)}"
+            ))
+            logger.info(f"Added column {table.name}.{column.name}.")
+        if missing:
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
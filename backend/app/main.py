@@ -1,11 +1,15 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse
 from app.core.config import settings
 from app.api.api import api_router
 from app.core.logging import get_logger
+from app.core.metrics import registry
 from app.db.base import Base
+from app.db.session import init_db
+from app.services.storage.content_store import content_store
+from app.services.jobs.eta import eta_service
 import os
 
 logger = get_logger("main")
@@ -27,6 +31,19 @@ if settings.BACKEND_CORS_ORIGINS:
 
 app.include_router(api_router, prefix=settings.API_V1_STR)
 
+
+@app.on_event("startup")
+async def on_startup():
+    await init_db()
+    await content_store.collect()
+    await eta_service.load()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
 base_dir = os.path.dirname(os.path.dirname(__file__))
 project_root = os.path.dirname(base_dir)
 
@@ -0,0 +1,14 @@
+from datetime import datetime
+from sqlalchemy import String, Integer, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+from app.models.base import Base
+
+class ContentBlob(Base):
+    """One physical uploaded workbook, shared by every job with identical content."""
+    __tablename__ = "content_blobs"
+
+    sha256: Mapped[str] = mapped_column(String, primary_key=True)
+    path: Mapped[str] = mapped_column(String)
+    size: Mapped[int] = mapped_column(Integer, default=0)
+    refcount: Mapped[int] = mapped_column(Integer, default=0) # Jobs referencing this blob
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
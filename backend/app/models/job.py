@@ -1,6 +1,6 @@
 from datetime import datetime
-from typing import Optional, Dict, Any
-from sqlalchemy import String, DateTime, JSON
+from typing import Optional, Dict, Any, List
+from sqlalchemy import String, Integer, DateTime, JSON
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.models.base import Base
 
@@ -8,7 +8,7 @@ class Job(Base):
     __tablename__ = "jobs"
 
     id: Mapped[str] = mapped_column(String, primary_key=True) # UUID
-    status: Mapped[str] = mapped_column(String, default="pending") # pending, processing, completed, failed
+    status: Mapped[str] = mapped_column(String, default="pending") # pending, running, waiting_batch, paused, completed, failed, cancelled
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
@@ -16,9 +16,23 @@ class Job(Base):
     stage_status: Mapped[Dict[str, str]] = mapped_column(JSON, default={})
     stage_artifacts: Mapped[Dict[str, Any]] = mapped_column(JSON, default={})
     
+    # Source workbook
+    source_filename: Mapped[Optional[str]] = mapped_column(String)
+    content_sha256: Mapped[Optional[str]] = mapped_column(String, index=True) # Key into the content store
+    content_size: Mapped[Optional[int]] = mapped_column(Integer)
+    source_hashes: Mapped[Optional[List[str]]] = mapped_column(JSON) # Member blobs of a batch job (content_sha256 is their combined hash)
+
     # Results pointers
     stats: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSON)
+    report_url: Mapped[Optional[str]] = mapped_column(String)
+    error: Mapped[Optional[str]] = mapped_column(String)
+    completed_at: Mapped[Optional[datetime]] = mapped_column(DateTime, index=True)
+    last_used_at: Mapped[Optional[datetime]] = mapped_column(DateTime) # Last run or dedup hit, for disk-budget eviction
     validation_report: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSON)
+
+    # LLM token accounting
+    token_budget: Mapped[Optional[int]] = mapped_column(Integer) # None = unlimited
+    token_usage: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSON) # Per-stage prompt/completion tokens, degraded stages
     
     testcases: Mapped[list["TestCase"]] = relationship("TestCase", back_populates="job", cascade="all, delete-orphan")
     defects: Mapped[list["DefectAnalysis"]] = relationship("DefectAnalysis", back_populates="job", cascade="all, delete-orphan")
@@ -0,0 +1,81 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import String, Integer, Float, DateTime, Index, Boolean
+from sqlalchemy.orm import Mapped, mapped_column
+from app.models.base import Base
+
+# Compact per-job aggregates written when a job completes.
+# completed_at is denormalized into every table so trend queries never need a join
+# and never touch raw testcases rows.
+
+class JobRollup(Base):
+    __tablename__ = "job_rollups"
+
+    job_id: Mapped[str] = mapped_column(String, primary_key=True)
+    completed_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+
+    total_cases: Mapped[int] = mapped_column(Integer, default=0)
+    passed: Mapped[int] = mapped_column(Integer, default=0)
+    failed: Mapped[int] = mapped_column(Integer, default=0)
+    blocked: Mapped[int] = mapped_column(Integer, default=0)
+    skipped: Mapped[int] = mapped_column(Integer, default=0)
+    pass_rate: Mapped[float] = mapped_column(Float, default=0.0)
+    flagged: Mapped[int] = mapped_column(Integer, default=0) # Suspicious "false pass" cases
+    defects: Mapped[int] = mapped_column(Integer, default=0)
+
+class ModuleRollup(Base):
+    __tablename__ = "module_rollups"
+    __table_args__ = (
+        Index("ix_module_rollups_module_completed_at", "module", "completed_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    job_id: Mapped[str] = mapped_column(String, index=True)
+    completed_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    module: Mapped[str] = mapped_column(String)
+
+    total_cases: Mapped[int] = mapped_column(Integer, default=0)
+    passed: Mapped[int] = mapped_column(Integer, default=0)
+    failed: Mapped[int] = mapped_column(Integer, default=0)
+    blocked: Mapped[int] = mapped_column(Integer, default=0)
+    pass_rate: Mapped[float] = mapped_column(Float, default=0.0)
+
+class SeverityRollup(Base):
+    __tablename__ = "severity_rollups"
+    __table_args__ = (
+        Index("ix_severity_rollups_severity_completed_at", "severity", "completed_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    job_id: Mapped[str] = mapped_column(String, index=True)
+    completed_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    severity: Mapped[str] = mapped_column(String)
+    count: Mapped[int] = mapped_column(Integer, default=0)
+
+class StageRollup(Base):
+    # Per-stage throughput of completed jobs: the history the ETA model is fit on
+    __tablename__ = "stage_rollups"
+    __table_args__ = (
+        Index("ix_stage_rollups_stage_completed_at", "stage", "completed_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    job_id: Mapped[str] = mapped_column(String, index=True)
+    completed_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    stage: Mapped[str] = mapped_column(String)
+    size: Mapped[int] = mapped_column(Integer, default=0) # Cases the stage worked on; workbook bytes for ingest
+    seconds: Mapped[float] = mapped_column(Float, default=0.0)
+    tokens: Mapped[int] = mapped_column(Integer, default=0)
+    # False for jobs kept out of the model (offline batches, paused); NULL rows predate the flag and were all learned
+    learned: Mapped[Optional[bool]] = mapped_column(Boolean, default=True)
+
+class RuntimeRollup(Base):
+    # Predicted vs. actual runtime per job, for capacity planning
+    __tablename__ = "runtime_rollups"
+
+    job_id: Mapped[str] = mapped_column(String, primary_key=True)
+    completed_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    total_cases: Mapped[int] = mapped_column(Integer, default=0)
+    content_size: Mapped[int] = mapped_column(Integer, default=0)
+    predicted_seconds: Mapped[Optional[float]] = mapped_column(Float) # Estimate once the workbook was parsed
+    actual_seconds: Mapped[float] = mapped_column(Float, default=0.0)
@@ -32,8 +32,10 @@ class TestCase(Base):
     
     # Source Info
     source_file: Mapped[str] = mapped_column(String)
+    source_name: Mapped[Optional[str]] = mapped_column(String) # Original upload filename, per-file breakdown of batch jobs
     source_sheet: Mapped[str] = mapped_column(String)
     source_row: Mapped[int] = mapped_column(Integer)
+    ordinal: Mapped[Optional[int]] = mapped_column(Integer) # Per-job sequence number, used as LLM batch key
     
     # Validation
     parse_warnings: Mapped[Optional[List[str]]] = mapped_column(JSON)
@@ -0,0 +1,134 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from sqlalchemy import delete, select
+from app.db.session import AsyncSessionLocal
+from app.models.rollup import JobRollup, ModuleRollup, SeverityRollup
+from app.core.logging import get_logger
+
+logger = get_logger("rollup")
+
+
+def _moving_average(values: List[float], window: int) -> List[float]:
+    averages: List[float] = []
+    running = 0.0
+    for i, value in enumerate(values):
+        running += value
+        if i >= window:
+            running -= values[i - window]
+        averages.append(round(running / min(i + 1, window), 2))
+    return averages
+
+
+class RollupService:
+    async def write_job_rollups(self, job_id: str, stats: Dict[str, Any], completed_at: Optional[datetime] = None) -> None:
+        """
+        Materialize per-job, per-module and per-severity aggregates from the job's stats.
+        Re-running for the same job replaces its previous rollups.
+        """
+        if not stats:
+            return
+        completed_at = completed_at or datetime.utcnow()
+        results = stats.get("results", {})
+        breakdowns = stats.get("breakdowns", {})
+        severity = breakdowns.get("severity", {})
+
+        job_row = JobRollup(
+            job_id=job_id,
+            completed_at=completed_at,
+            total_cases=stats.get("total_cases", 0),
+            passed=results.get("Pass", 0),
+            failed=results.get("Fail", 0),
+            blocked=results.get("Blocked", 0),
+            skipped=results.get("Skipped", 0),
+            pass_rate=stats.get("pass_rate", 0.0),
+            flagged=breakdowns.get("audit_status", {}).get("Flagged", 0),
+            defects=sum(severity.values()),
+        )
+
+        module_rows = []
+        for module, per_result in breakdowns.get("module_result", {}).items():
+            total = sum(per_result.values())
+            module_rows.append(ModuleRollup(
+                job_id=job_id,
+                completed_at=completed_at,
+                module=module,
+                total_cases=total,
+                passed=per_result.get("Pass", 0),
+                failed=per_result.get("Fail", 0),
+                blocked=per_result.get("Blocked", 0),
+                pass_rate=round(per_result.get("Pass", 0) / total * 100, 2) if total else 0.0,
+            ))
+
+        severity_rows = [
+            SeverityRollup(job_id=job_id, completed_at=completed_at, severity=name, count=count)
+            for name, count in severity.items()
+        ]
+
+        try:
+            async with AsyncSessionLocal() as session:
+                for model in (ModuleRollup, SeverityRollup, JobRollup):
+                    await session.execute(delete(model).where(model.job_id == job_id))
+                session.add(job_row)
+                session.add_all(module_rows)
+                session.add_all(severity_rows)
+                await session.commit()
+            logger.info(f"Wrote rollups for job {job_id}: {len(module_rows)} modules, {len(severity_rows)} severities.")
+        except Exception as e:
+            # Trend data is best-effort; never fail the job because of it
+            logger.error(f"Failed to write rollups for job {job_id}: {e}")
+
+    async def query_trends(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        module: Optional[str] = None,
+        window: int = 7,
+    ) -> Dict[str, Any]:
+        """
+        Pass-rate and defect trends answered purely from the rollup tables.
+        Moving averages are taken over the last `window` jobs.
+        """
+        window = max(window, 1)
+        model = ModuleRollup if module else JobRollup
+        columns = [model.job_id, model.completed_at, model.total_cases, model.passed, model.failed, model.blocked, model.pass_rate]
+        if not module:
+            columns += [JobRollup.flagged, JobRollup.defects]
+
+        query = select(*columns).order_by(model.completed_at)
+        if module:
+            query = query.where(ModuleRollup.module == module)
+        if start:
+            query = query.where(model.completed_at >= start)
+        if end:
+            query = query.where(model.completed_at <= end)
+
+        severity_query = select(SeverityRollup.severity, SeverityRollup.completed_at, SeverityRollup.count).order_by(SeverityRollup.completed_at)
+        if start:
+            severity_query = severity_query.where(SeverityRollup.completed_at >= start)
+        if end:
+            severity_query = severity_query.where(SeverityRollup.completed_at <= end)
+
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(query)).mappings().all()
+            severity_rows = [] if module else (await session.execute(severity_query)).all()
+
+        points = []
+        for row in rows:
+            point = dict(row)
+            point["completed_at"] = row["completed_at"].isoformat()
+            points.append(point)
+
+        severity_series: Dict[str, List[Dict[str, Any]]] = {}
+        for name, completed_at, count in severity_rows:
+            severity_series.setdefault(name, []).append({"completed_at": completed_at.isoformat(), "count": count})
+
+        return {
+            "module": module,
+            "window": window,
+            "points": points,
+            "pass_rate_moving_average": _moving_average([p["pass_rate"] for p in points], window),
+            "failed_moving_average": _moving_average([float(p["failed"] + p["blocked"]) for p in points], window),
+            "severity": severity_series,
+        }
+
+rollup_service = RollupService()
@@ -1,31 +1,132 @@
-from typing import List, Dict, Any
-from app.models.testcase import TestCase
+from typing import List, Dict, Any, Iterable
 from collections import Counter
+import numpy as np
+import pandas as pd
+from app.models.testcase import TestCase
 
-class StatsService:
-    def compute_stats(self, cases: List[TestCase]) -> Dict[str, Any]:
-        total = len(cases)
-        if total == 0:
+UNKNOWN = "未知"
+
+# Breakdown name -> TestCase attribute
+DIMENSIONS = {
+    "module": "module",
+    "result": "normalized_result",
+    "executor": "executor",
+    "priority": "priority",
+    "source_sheet": "source_sheet",
+    "source_name": "source_name",
+    "exec_time": "exec_time",
+    "audit_status": "audit_status",
+    "severity": "defect_analysis",
+}
+# Known once a case is parsed; the rest is set by tagging, audit and extraction
+INGEST_DIMENSIONS = ("result", "executor", "priority", "source_sheet", "source_name", "exec_time")
+ANALYSIS_DIMENSIONS = ("module", "audit_status", "severity")
+
+
+def _column(cases: List[TestCase], attr: str) -> list:
+    # Read loaded state straight from the instance dict: going through the ORM
+    # descriptors dominates the cost for large in-memory case lists.
+    return [vars(c).get(attr) for c in cases]
+
+
+class StatsAccumulator:
+    """
+    Columnar, incremental stats engine.
+    Each call builds the column arrays for a chunk of cases once and counts every
+    breakdown with vectorized bincounts. Chunks are added with `add` as cases come out of
+    ingest; `add_analysis` counts the module, audit and severity breakdowns of the same
+    cases once the LLM stages have set them.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.counts: Dict[str, Counter] = {name: Counter() for name in DIMENSIONS}
+        self.module_result: Dict[str, Counter] = {}
+        self.file_result: Dict[str, Counter] = {}
+
+    def add(self, cases: Iterable[TestCase]) -> "StatsAccumulator":
+        cases = list(cases)
+        if not cases:
+            return self
+        codes = {name: self._count(cases, name) for name in INGEST_DIMENSIONS}
+        self._cross(codes["source_name"], codes["result"], self.file_result)
+        self.total += len(cases)
+        return self
+
+    def add_analysis(self, cases: Iterable[TestCase]) -> "StatsAccumulator":
+        cases = list(cases)
+        if not cases:
+            return self
+        codes = {name: self._count(cases, name) for name in ANALYSIS_DIMENSIONS}
+        self._cross(codes["module"], self._factorize(_column(cases, DIMENSIONS["result"])), self.module_result)
+        return self
+
+    def _count(self, cases: List[TestCase], name: str) -> tuple:
+        values = _column(cases, DIMENSIONS[name])
+        if name == "severity":
+            # Only cases with a defect analysis count towards severity
+            values = [d.severity_guess or UNKNOWN for d in values if d is not None]
+        elif name == "exec_time":
+            values = pd.to_datetime(pd.Series(values, dtype=object), errors="coerce").dt.strftime("%Y-%m-%d")
+        col_codes, uniques = self._factorize(values)
+        tally = np.bincount(col_codes, minlength=len(uniques))
+        self.counts[name].update(dict(zip(uniques, tally.tolist())))
+        return col_codes, uniques
+
+    def _cross(self, rows: tuple, cols: tuple, target: Dict[str, Counter]) -> None:
+        """Two-way tally (e.g. module x result) counted as a single combined code."""
+        a_codes, a_uniques = rows
+        b_codes, b_uniques = cols
+        combined = np.bincount(a_codes * len(b_uniques) + b_codes, minlength=len(a_uniques) * len(b_uniques))
+        grid = combined.reshape(len(a_uniques), len(b_uniques))
+        for ai, label in enumerate(a_uniques):
+            row = {b: int(n) for b, n in zip(b_uniques, grid[ai]) if n}
+            target.setdefault(label, Counter()).update(row)
+
+    def _factorize(self, values) -> tuple:
+        """Category codes for a column, with missing/empty values folded into UNKNOWN."""
+        col_codes, uniques = pd.factorize(pd.Series(values, dtype=object).replace("", None), use_na_sentinel=True)
+        uniques = [str(u) for u in uniques]
+        if (col_codes < 0).any():
+            col_codes = np.where(col_codes < 0, len(uniques), col_codes)
+            uniques.append(UNKNOWN)
+        return col_codes, uniques
+
+    def snapshot(self) -> Dict[str, Any]:
+        if self.total == 0:
             return {}
-            
-        result_counts = Counter(c.normalized_result for c in cases)
-        module_counts = Counter(c.module for c in cases)
-        
-        # Calculate Pass Rate
-        pass_count = result_counts.get("Pass", 0)
-        pass_rate = (pass_count / total) * 100 if total > 0 else 0
-        
-        # Top Failed Modules
-        failed_cases = [c for c in cases if c.normalized_result in ["Fail", "Blocked"]]
-        failed_modules = Counter(c.module for c in failed_cases)
-        
-        stats = {
-            "total_cases": total,
+
+        result_counts = self.counts["result"]
+        pass_rate = result_counts.get("Pass", 0) / self.total * 100
+
+        failed_modules = Counter({
+            module: per_result.get("Fail", 0) + per_result.get("Blocked", 0)
+            for module, per_result in self.module_result.items()
+        })
+        failed_modules = +failed_modules # Drop modules without failures
+
+        return {
+            "total_cases": self.total,
             "results": dict(result_counts),
             "pass_rate": round(pass_rate, 2),
-            "modules": dict(module_counts),
-            "top_failed_modules": dict(failed_modules.most_common(5))
+            "modules": dict(self.counts["module"]),
+            "top_failed_modules": dict(failed_modules.most_common(5)),
+            "breakdowns": {
+                "module_result": {m: dict(r) for m, r in self.module_result.items()},
+                "executor": dict(self.counts["executor"].most_common()),
+                "priority": dict(self.counts["priority"].most_common()),
+                "source_sheet": dict(self.counts["source_sheet"].most_common()),
+                "source_name": dict(self.counts["source_name"].most_common()),
+                "file_result": {f: dict(r) for f, r in self.file_result.items()},
+                "exec_time": dict(sorted(self.counts["exec_time"].items())),
+                "audit_status": dict(self.counts["audit_status"].most_common()),
+                "severity": dict(self.counts["severity"].most_common()),
+            },
         }
-        return stats
+
+
+class StatsService:
+    def compute_stats(self, cases: List[TestCase]) -> Dict[str, Any]:
+        return StatsAccumulator().add(cases).add_analysis(cases).snapshot()
 
 stats_service = StatsService()
@@ -1,9 +1,19 @@
 from typing import List, Dict, Any
 from loguru import logger
 import json
-import asyncio
 from app.models.testcase import TestCase
 from app.services.llm.client import LLMClient
+from app.services.llm.batching import BatchRoundTrip, run_batched_round_trips
+from app.services.audit.rules import rule_pre_auditor
+from app.services.jobs.progress import advance
+from app.services.llm.usage import usage_tracker
+from app.core.config import settings
+
+# Why cases the LLM did not reach were left unchecked
+_UNCHECKED_REASONS = {
+    "budget": "Token 预算不足，未进行 LLM 审计。",
+    "circuit": "LLM 服务暂不可用，未进行 LLM 审计。",
+}
 
 class ResultAuditor:
     def __init__(self):
@@ -17,55 +27,74 @@ class ResultAuditor:
         pass_cases = [c for c in cases if c.normalized_result == "Pass"]
         other_cases = [c for c in cases if c.normalized_result != "Pass"]
         
-        logger.info(f"Starting concurrent result audit for {len(pass_cases)} passed cases...")
+        # Settle the clear-cut cases locally, only the ambiguous middle band goes to the LLM
+        llm_cases = pass_cases
+        if settings.AUDIT_RULES_ENABLED:
+            llm_cases = []
+            for case, (status, reason) in zip(pass_cases, rule_pre_auditor.pre_audit(pass_cases)):
+                if status:
+                    case.audit_status = status
+                    case.audit_reason = reason
+                else:
+                    llm_cases.append(case)
+            advance(len(pass_cases) - len(llm_cases))
+
+        usage = usage_tracker.current()
+        if llm_cases and usage and usage.should_degrade():
+            # Keep the rule verdicts, leave the ambiguous band unchecked rather than overspend
+            logger.warning(f"Token budget nearly used up ({usage.total}/{usage.budget}), skipping LLM audit of {len(llm_cases)} cases.")
+            usage.mark_degraded("audit")
+            for case in llm_cases:
+                case.audit_status = "Unchecked"
+                case.audit_reason = _UNCHECKED_REASONS["budget"]
+            advance(len(llm_cases))
+            return pass_cases + other_cases
+
+        logger.info(f"Starting concurrent result audit for {len(llm_cases)}/{len(pass_cases)} passed cases...")
         
-        tasks = []
-        for i in range(0, len(pass_cases), batch_size):
-            batch = pass_cases[i:i + batch_size]
-            tasks.append(self._audit_batch_async(batch))
-            
-        await asyncio.gather(*tasks)
+        unresolved = await run_batched_round_trips(
+            llm_cases,
+            batch_size,
+            call=self._audit_batch_async,
+            apply=self._apply_audit_result,
+            validate=self._is_valid_result,
+        )
+        cause = usage.fallback_cause() if usage else None
+        if unresolved and cause:
+            logger.warning(f"LLM unavailable ({cause}), {len(unresolved)} cases left unchecked.")
+            usage.mark_degraded("audit", cause)
+            for case in unresolved:
+                case.audit_status = "Unchecked"
+                case.audit_reason = _UNCHECKED_REASONS[cause]
+        elif unresolved:
+            # Leave as Unchecked rather than guessing a verdict
+            logger.warning(f"{len(unresolved)} cases could not be audited after re-queueing.")
         logger.info("Result audit completed.")
             
         return pass_cases + other_cases
 
-    async def _audit_batch_async(self, batch: List[TestCase]):
-        prompt = self._build_audit_prompt(batch)
-        try:
-            response = await self.llm.achat_completion(
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.1, # Low temperature for strict analysis
-                response_format={"type": "json_object"}
-            )
-            
-            results = self._parse_llm_response(response)
-            self._apply_audit_results(batch, results)
-            
-        except Exception as e:
-            logger.error(f"Error auditing batch: {e}")
-            # Fallback: mark as Unchecked or try individual? 
-            # For now, leave as Unchecked (default)
+    async def _audit_batch_async(self, trip: BatchRoundTrip) -> List[Dict[str, Any]]:
+        prompt = self._build_audit_prompt(trip)
+        response = await self.llm.achat_completion(
+            messages=[{"role": "user", "content": prompt}],
+            response_format={"type": "json_object"},
+            profile="audit", # Low temperature for strict analysis
+        )
+        return self._parse_llm_response(response)
 
-    def _apply_audit_results(self, batch: List[TestCase], results: List[Dict[str, Any]]):
-        result_map = {str(r.get("id")): r for r in results}
-        
-        for case in batch:
-            # Match by ID. Since ID might be string or int, convert both to string.
-            # In local processing without DB, we might rely on index or temporary ID.
-            # The prompt builder used str(c.id).
-            res = result_map.get(str(case.id))
-            if res:
-                case.audit_status = res.get("status", "Pass")
-                case.audit_reason = res.get("reason", "")
-            else:
-                case.audit_status = "Pass" # Default if not flagged
+    def _is_valid_result(self, res: Dict[str, Any]) -> bool:
+        return res.get("status") in ("Pass", "Flagged")
+
+    def _apply_audit_result(self, case: TestCase, res: Dict[str, Any]):
+        case.audit_status = res["status"]
+        case.audit_reason = res.get("reason") or ""
 
-    def _build_audit_prompt(self, batch: List[TestCase]) -> str:
+    def _build_audit_prompt(self, trip: BatchRoundTrip) -> str:
         cases_text = []
-        for c in batch:
-            # Construct a concise representation
+        for key, c in trip.by_key.items():
+            # Construct a concise representation keyed by the compact per-job ordinal
             item = {
-                "id": str(c.id),
+                "k": key,
                 "case_name": c.case_name,
                 "expected": c.expected or "N/A",
                 "actual": c.actual or "N/A",
@@ -85,13 +114,13 @@ class ResultAuditor:
 如果用例确实通过，请标记为“Pass”。
 
 输入用例列表 (JSON):
-{json.dumps(cases_text, ensure_ascii=False, indent=2)}
+{json.dumps(cases_text, ensure_ascii=False)}
 
 请返回一个 JSON 对象，格式如下：
 {{
     "results": [
         {{
-            "id": "用例ID",
+            "k": "输入中的用例键 k（原样返回）",
             "status": "Pass" 或 "Flagged",
             "reason": "如果是Flagged，请简要说明理由（中文）；如果是Pass，留空。"
         }}
@@ -101,6 +130,7 @@ class ResultAuditor:
 注意：
 - 严禁返回任何 Python 代码块或 Markdown 格式。
 - 仅返回纯 JSON 字符串。
+- 每个输入用例必须且只能返回一条结果。
 """
 
     def _parse_llm_response(self, response: Any) -> List[Dict[str, Any]]:
@@ -121,14 +151,3 @@ class ResultAuditor:
             logger.error(f"Failed to parse audit response: {e}")
             return []
         return []
-
-    def _apply_audit_results(self, batch: List[TestCase], results: List[Dict[str, Any]]):
-        result_map = {str(r["id"]): r for r in results}
-        
-        for case in batch:
-            res = result_map.get(str(case.id))
-            if res:
-                case.audit_status = res.get("status", "Unchecked")
-                case.audit_reason = res.get("reason", "")
-            else:
-                case.audit_status = "Unchecked"
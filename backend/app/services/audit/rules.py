@@ -0,0 +1,108 @@
+import re
+from typing import List, Optional, Tuple
+import numpy as np
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from app.models.testcase import TestCase
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger("audit_rules")
+
+# Keywords mirror the criteria listed in the LLM audit prompt
+REMARK_FAILURE_PATTERN = r"失败|bug|缺陷|报错|问题单|未通过|不通过"
+ACTUAL_FAILURE_PATTERN = r"失败|错误|报错|异常|未找到|找不到|不匹配|不一致|不符|崩溃|超时|无响应|白屏|error|fail|exception|timeout|crash"
+ACTUAL_SUCCESS_PATTERN = r"^(通过|成功|正常|符合预期|与预期一致|同预期|如预期|达到预期|ok|pass|passed|success|√|✓|✔)$"
+# Amounts, counts, versions: char n-grams barely see "10.00" vs "100.00", so these are compared as tokens
+NUMBER_PATTERN = r"\d+(?:\.\d+)?"
+PLACEHOLDERS = {"", "none", "null", "nan", "n/a", "na", "无", "空", "-", "--", "/", "tbd", "待补充", "略", "同上"}
+
+_NORMALIZE = re.compile(r"[\s,，.。;；:：!！?？、\"'“”‘’()（）\[\]【】]+")
+
+
+class RulePreAuditor:
+    """
+    Deterministic, vectorized pre-audit for Pass cases.
+    Settles clear Pass / clear Flagged cases locally and leaves the uncertain
+    middle band (status None) for the LLM auditor.
+    """
+
+    def pre_audit(self, cases: List[TestCase]) -> List[Tuple[Optional[str], str]]:
+        """
+        Return one (status, reason) per case. status is "Pass", "Flagged" or None (uncertain).
+        """
+        if not cases:
+            return []
+
+        df = pd.DataFrame({
+            "expected": [c.expected or "" for c in cases],
+            "actual": [c.actual or "" for c in cases],
+            "remark": [c.remark or "" for c in cases],
+        })
+        expected = self._normalize(df["expected"])
+        actual = self._normalize(df["actual"])
+        remark = df["remark"].str.lower()
+
+        similarity = self._similarity(expected, actual)
+
+        remark_failure = remark.str.extract(f"({REMARK_FAILURE_PATTERN})", flags=re.IGNORECASE)[0]
+        actual_empty = actual.isin(PLACEHOLDERS).to_numpy()
+        actual_failure = actual.str.contains(ACTUAL_FAILURE_PATTERN, flags=re.IGNORECASE, regex=True).to_numpy()
+        expected_failure = expected.str.contains(ACTUAL_FAILURE_PATTERN, flags=re.IGNORECASE, regex=True).to_numpy()
+        actual_success = actual.str.match(ACTUAL_SUCCESS_PATTERN, flags=re.IGNORECASE).to_numpy()
+        identical = (expected == actual).to_numpy() & ~actual_empty
+        # Taken from the raw text: normalization strips the decimal points
+        numbers_differ = (
+            df["expected"].str.findall(NUMBER_PATTERN).map(self._numbers)
+            != df["actual"].str.findall(NUMBER_PATTERN).map(self._numbers)
+        ).to_numpy()
+
+        pass_threshold = settings.AUDIT_RULE_PASS_SIMILARITY
+        flag_threshold = settings.AUDIT_RULE_FLAG_SIMILARITY
+
+        verdicts: List[Tuple[Optional[str], str]] = []
+        for i in range(len(cases)):
+            # Flag rules take precedence over pass rules
+            if isinstance(remark_failure.iloc[i], str):
+                verdicts.append(("Flagged", f"[规则] 备注包含关键词“{remark_failure.iloc[i]}”。"))
+            elif actual_empty[i]:
+                verdicts.append(("Flagged", "[规则] 实际结果为空或仅为占位符，无法证明测试通过。"))
+            elif actual_failure[i] and not expected_failure[i] and similarity[i] < flag_threshold:
+                verdicts.append(("Flagged", "[规则] 实际结果描述了失败/异常，且与预期结果明显不一致。"))
+            elif numbers_differ[i]:
+                # Similar wording, different figures: only the LLM can tell a typo from a false pass
+                verdicts.append((None, ""))
+            elif identical[i] or (similarity[i] >= pass_threshold and (not actual_failure[i] or expected_failure[i])):
+                # A failure word the expectation does not have ("一致" vs "不一致") is never a local Pass
+                verdicts.append(("Pass", f"[规则] 实际结果与预期结果一致（相似度 {similarity[i]:.2f}）。"))
+            elif actual_success[i] and not actual_failure[i]:
+                verdicts.append(("Pass", "[规则] 实际结果为明确的通过描述。"))
+            else:
+                verdicts.append((None, ""))
+
+        settled = sum(1 for status, _ in verdicts if status)
+        logger.info(f"Rule pre-audit settled {settled}/{len(cases)} cases locally.")
+        return verdicts
+
+    def _numbers(self, tokens: List[str]) -> Tuple[float, ...]:
+        return tuple(sorted(float(t) for t in tokens))
+
+    def _normalize(self, series: pd.Series) -> pd.Series:
+        return series.astype(str).str.strip().str.lower().str.replace(_NORMALIZE, "", regex=True)
+
+    def _similarity(self, expected: pd.Series, actual: pd.Series) -> np.ndarray:
+        """
+        Row-wise cosine similarity of char n-gram TF-IDF vectors, computed in bulk.
+        """
+        total = len(expected)
+        corpus = pd.concat([expected, actual], ignore_index=True)
+        if not corpus.str.len().any():
+            return np.zeros(total)
+
+        vectorizer = TfidfVectorizer(analyzer="char", ngram_range=(1, 2), lowercase=False)
+        matrix = vectorizer.fit_transform(corpus)
+        # Rows are L2-normalized, so the element-wise product summed per row is the cosine
+        return np.asarray(matrix[:total].multiply(matrix[total:]).sum(axis=1)).ravel()
+
+
+rule_pre_auditor = RulePreAuditor()
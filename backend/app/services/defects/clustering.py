@@ -1,15 +1,23 @@
 import asyncio
-from typing import List, Dict, Any
+from collections import Counter
+from typing import List, Dict, Any, Optional
 from app.models.defect import DefectAnalysis, DefectCluster
+from app.core.config import settings
 from app.core.logging import get_logger
+from app.services.ingest.grouping import case_grouper, normalize
 from app.services.llm.client import llm_client
+from app.services.llm.usage import LLMUnavailable, usage_tracker
 
 logger = get_logger("defect_clustering")
 
+UNCLUSTERED = "未分类缺陷"
+
 class DefectClusterer:
     async def cluster_and_summarize_async(self, defects: List[DefectAnalysis], job_id: str) -> List[DefectCluster]:
         if not defects:
             return []
+        if self._over_budget(len(defects)):
+            return self.cluster_locally(defects, job_id)
 
         # 1. Prepare data for LLM
         # Use index as a temporary ID since database IDs might not be set yet
@@ -52,7 +60,7 @@ class DefectClusterer:
         
         try:
             # 2. Call LLM to cluster and summarize
-            response = await llm_client.achat_completion([{"role": "user", "content": prompt}], response_format=dict)
+            response = await llm_client.achat_completion([{"role": "user", "content": prompt}], response_format=dict, profile="clustering")
             
             if isinstance(response, dict) and "clusters" in response:
                 llm_clusters = response["clusters"]
@@ -94,7 +102,7 @@ class DefectClusterer:
                 if unassigned_defects:
                     fallback_cluster = DefectCluster(
                         job_id=job_id,
-                        cluster_name="未分类缺陷",
+                        cluster_name=UNCLUSTERED,
                         summary="未能自动归类的其他缺陷。",
                         risk_assessment="需人工确认"
                     )
@@ -106,6 +114,10 @@ class DefectClusterer:
             else:
                 raise ValueError("LLM response missing 'clusters' key")
                 
+        except LLMUnavailable as e:
+            logger.warning(f"LLM Clustering skipped: {e}")
+            self._mark_degraded(e.cause)
+            return self.cluster_locally(defects, job_id)
         except Exception as e:
             logger.error(f"LLM Clustering failed: {e}")
             # Fallback: Put everything in one cluster
@@ -121,4 +133,149 @@ class DefectClusterer:
 
         return clusters
 
+    async def assign_incremental(self, clusters: List[DefectCluster], new_defects: List[DefectAnalysis], job_id: str) -> List[DefectCluster]:
+        """
+        Incremental clustering: attach new defects to the existing clusters (or new ones)
+        without re-clustering the defects that already have a cluster.
+        """
+        if not new_defects:
+            return clusters
+        if not clusters:
+            return await self.cluster_and_summarize_async(new_defects, job_id)
+        if self._over_budget(len(new_defects)):
+            return clusters + self.cluster_locally(new_defects, job_id, taken={c.cluster_name for c in clusters})
+
+        existing = {c.cluster_name: c for c in clusters}
+        cluster_list = "\n".join(f"- {c.cluster_name}: {c.summary or ''}" for c in clusters)
+        defect_list = "\n".join(f"ID: {i} | 现象: {d.phenomenon or '无描述'}" for i, d in enumerate(new_defects))
+
+        prompt = f"""
+        作为测试专家，请将以下新增缺陷归入已有的缺陷聚类；确实无法归入已有聚类的，可以新建聚类。
+
+        【已有聚类】
+        {cluster_list}
+
+        【新增缺陷】
+        {defect_list}
+
+        【要求】
+        1. 归入已有聚类时，cluster_name 必须与上面的已有聚类名称完全一致。
+        2. 每个新增缺陷必须且只能属于一个聚类。
+        3. 请使用中文回答。
+
+        【输出格式】
+        请仅输出合法的 JSON 字符串，格式如下：
+        {{
+            "clusters": [
+                {{
+                    "cluster_name": "已有聚类名称或新聚类名称",
+                    "summary": "仅新建聚类时填写",
+                    "risk_assessment": "仅新建聚类时填写",
+                    "defect_ids": ["ID1", "ID2"]
+                }}
+            ]
+        }}
+        """
+
+        assigned = set()
+        try:
+            response = await llm_client.achat_completion([{"role": "user", "content": prompt}], response_format=dict, profile="clustering")
+            if not isinstance(response, dict) or "clusters" not in response:
+                raise ValueError("LLM response missing 'clusters' key")
+            for cluster_data in response["clusters"]:
+                name = cluster_data.get("cluster_name", "未知聚类")
+                members = []
+                for did in cluster_data.get("defect_ids", []):
+                    did_str = str(did)
+                    if did_str.isdigit() and int(did_str) < len(new_defects) and did_str not in assigned:
+                        assigned.add(did_str)
+                        members.append(new_defects[int(did_str)])
+                if not members:
+                    continue
+                cluster = existing.get(name)
+                if cluster is None:
+                    cluster = DefectCluster(
+                        job_id=job_id,
+                        cluster_name=name,
+                        summary=cluster_data.get("summary", ""),
+                        risk_assessment=cluster_data.get("risk_assessment", "")
+                    )
+                    existing[name] = cluster
+                    clusters.append(cluster)
+                for d in members:
+                    d.cluster = cluster
+        except LLMUnavailable as e:
+            logger.warning(f"Incremental clustering skipped: {e}")
+            self._mark_degraded(e.cause)
+        except Exception as e:
+            logger.error(f"Incremental clustering failed: {e}")
+
+        unassigned = [d for i, d in enumerate(new_defects) if str(i) not in assigned]
+        if unassigned:
+            fallback = existing.get(UNCLUSTERED)
+            if fallback is None:
+                fallback = DefectCluster(
+                    job_id=job_id,
+                    cluster_name=UNCLUSTERED,
+                    summary="未能自动归类的其他缺陷。",
+                    risk_assessment="需人工确认"
+                )
+                clusters.append(fallback)
+            for d in unassigned:
+                d.cluster = fallback
+
+        return clusters
+
+    def cluster_locally(self, defects: List[DefectAnalysis], job_id: str, taken: Optional[set] = None) -> List[DefectCluster]:
+        """
+        LLM-free fallback: group defects by lexical similarity of their phenomenon and name
+        each group after its most common module. Defects similar to no other one share
+        the "未分类缺陷" cluster.
+        """
+        groups = case_grouper.group_texts([normalize(d.phenomenon or "") for d in defects], threshold=settings.TAGGING_GROUP_THRESHOLD)
+        taken = set(taken or ())
+        clusters = []
+        singles = []
+        for members in sorted(groups, key=len, reverse=True):
+            items = [defects[i] for i in members]
+            if len(items) == 1:
+                singles.extend(items)
+                continue
+            modules = Counter(d.testcase.module for d in items if d.testcase is not None and d.testcase.module)
+            head = (items[0].phenomenon or "无描述")[:20]
+            name = f"{modules.most_common(1)[0][0]}：{head}" if modules else head
+            while name in taken:
+                name += "*"
+            taken.add(name)
+            clusters.append(self._local_cluster(job_id, name, items))
+        if singles:
+            name = UNCLUSTERED if UNCLUSTERED not in taken else UNCLUSTERED + "（本地）"
+            clusters.append(self._local_cluster(job_id, name, singles))
+        logger.info(f"Clustered {len(defects)} defects locally into {len(clusters)} clusters.")
+        return clusters
+
+    def _local_cluster(self, job_id: str, name: str, items: List[DefectAnalysis]) -> DefectCluster:
+        cluster = DefectCluster(
+            job_id=job_id,
+            cluster_name=name,
+            summary=f"按缺陷现象文本相似度本地归类的 {len(items)} 条缺陷（未调用 AI 聚类）。",
+            risk_assessment="需人工评估",
+        )
+        for d in items:
+            d.cluster = cluster
+        return cluster
+
+    def _over_budget(self, count: int) -> bool:
+        usage = usage_tracker.current()
+        if usage is None or not usage.should_degrade():
+            return False
+        logger.warning(f"Token budget nearly used up ({usage.total}/{usage.budget}), clustering {count} defects locally.")
+        usage.mark_degraded("clustering")
+        return True
+
+    def _mark_degraded(self, cause: str) -> None:
+        usage = usage_tracker.current()
+        if usage is not None:
+            usage.mark_degraded("clustering", cause)
+
 defect_clusterer = DefectClusterer()
@@ -1,8 +1,11 @@
 from typing import List, Dict, Any
-import asyncio
+import json
 from app.models.testcase import TestCase
 from app.models.defect import DefectAnalysis
 from app.services.llm.client import llm_client
+from app.services.llm.batching import BatchRoundTrip, run_batched_round_trips
+from app.services.llm.usage import usage_tracker
+from app.core.config import settings
 from app.core.logging import get_logger
 
 logger = get_logger("defect_extractor")
@@ -10,39 +13,63 @@ logger = get_logger("defect_extractor")
 class DefectExtractor:
     async def extract_defect_facts_concurrently(self, cases: List[TestCase]) -> List[DefectAnalysis]:
         failed_cases = [c for c in cases if c.normalized_result in ["Fail", "Blocked"]]
-        analyses = []
-        
+
         logger.info(f"Extracting defects for {len(failed_cases)} cases concurrently...")
-        
-        tasks = [self._extract_single_defect_async(case) for case in failed_cases]
-        results = await asyncio.gather(*tasks)
-        
-        # Filter out None results (failures)
-        analyses = [r for r in results if r is not None]
+
+        unresolved = await run_batched_round_trips(
+            failed_cases,
+            settings.EXTRACT_BATCH_SIZE,
+            call=self._extract_batch_async,
+            apply=self._apply_defect_result,
+            validate=self._is_valid_result,
+        )
+        usage = usage_tracker.current()
+        cause = usage.fallback_cause() if usage else None
+        if unresolved and cause:
+            logger.warning(f"LLM unavailable ({cause}), extracting {len(unresolved)} defects locally.")
+            usage.mark_degraded("extraction", cause)
+            for case in unresolved:
+                self._apply_local_result(case)
+        elif unresolved:
+            logger.warning(f"{len(unresolved)} failed cases could not be analyzed after re-queueing.")
+
+        # Cases without a result are simply left without analysis
+        analyses = [c.defect_analysis for c in failed_cases if c.defect_analysis is not None]
         logger.info(f"Extracted {len(analyses)} defects.")
-        
+
         return analyses
 
-    async def _extract_single_defect_async(self, case: TestCase) -> Any:
-        try:
-            # Prompt adapted from manual
-            prompt = f"""
-            分析此失败用例并提取缺陷事实。
-            
-            【重要指令】
-            1. 仅输出纯 JSON 字符串。
-            2. 严禁输出 Python 代码或 Markdown。
-            3. 使用中文。
-            4. 注意：如果在 JSON 值中引用包含双引号的内容，请务必进行转义，或者将其替换为单引号，确保 JSON 格式合法。
-            
-            用例: {case.case_name}
-            步骤: {case.steps}
-            预期结果: {case.expected}
-            实际结果: {case.actual}
-            备注: {case.remark}
-            
-            JSON 结构:
+    async def _extract_batch_async(self, trip: BatchRoundTrip) -> List[Dict[str, Any]]:
+        cases_input = []
+        for key, case in trip.by_key.items():
+            cases_input.append({
+                "k": key,
+                "case": case.case_name,
+                "steps": case.steps,
+                "expected": case.expected,
+                "actual": case.actual,
+                "remark": case.remark,
+            })
+
+        # Prompt adapted from manual
+        prompt = f"""
+        分析以下失败用例并逐条提取缺陷事实。
+
+        【重要指令】
+        1. 仅输出纯 JSON 字符串。
+        2. 严禁输出 Python 代码或 Markdown。
+        3. 使用中文。
+        4. 注意：如果在 JSON 值中引用包含双引号的内容，请务必进行转义，或者将其替换为单引号，确保 JSON 格式合法。
+        5. 每个输入用例必须且只能返回一条结果，并原样返回其用例键 k。
+
+        输入用例列表 (JSON):
+        {json.dumps(cases_input, ensure_ascii=False)}
+
+        JSON 结构:
+        {{
+          "results": [
             {{
+              "k": "用例键",
               "phenomenon": "简要描述（中文）",
               "observed_fact": "客观事实（中文）",
               "hypothesis": "推测原因（中文）",
@@ -50,28 +77,44 @@ class DefectExtractor:
               "repro_steps": "复现步骤（中文）",
               "severity_guess": "Critical/Major/Minor"
             }}
-            """
-            
-            messages = [{"role": "user", "content": prompt}]
-            result = await llm_client.achat_completion(messages, response_format=dict)
-            
-            if isinstance(result, dict):
-                analysis = DefectAnalysis(
-                    testcase_id=case.id, # Note: ID might not be set if not flushed to DB yet, handle carefully
-                    phenomenon=result.get("phenomenon"),
-                    observed_fact=result.get("observed_fact"),
-                    hypothesis=result.get("hypothesis"),
-                    evidence=result.get("evidence", []),
-                    repro_steps=result.get("repro_steps"),
-                    severity_guess=result.get("severity_guess")
-                )
-                
-                # Link in memory for now
-                case.defect_analysis = analysis
-                return analysis
-                
-        except Exception as e:
-            logger.error(f"Failed to extract defect for {case.case_name}: {e}")
-            return None
+          ]
+        }}
+        """
+
+        messages = [{"role": "user", "content": prompt}]
+        result = await llm_client.achat_completion(messages, response_format=dict, profile="extraction")
+
+        if isinstance(result, dict):
+            return result.get("results", [])
+        if isinstance(result, list):
+            return result
+        raise ValueError("Unexpected defect extraction response")
+
+    def _is_valid_result(self, res: Dict[str, Any]) -> bool:
+        return bool(res.get("phenomenon") or res.get("observed_fact"))
+
+    def _apply_defect_result(self, case: TestCase, res: Dict[str, Any]):
+        analysis = DefectAnalysis(
+            job_id=case.job_id,
+            phenomenon=res.get("phenomenon"),
+            observed_fact=res.get("observed_fact"),
+            hypothesis=res.get("hypothesis"),
+            evidence=res.get("evidence", []),
+            repro_steps=res.get("repro_steps"),
+            severity_guess=res.get("severity_guess")
+        )
+
+        # Link in memory; testcase_id is filled in by the relationship once the case is flushed
+        case.defect_analysis = analysis
+
+    def _apply_local_result(self, case: TestCase):
+        """LLM-free fallback: record the failure as reported, without cause or severity."""
+        actual = (case.actual or case.remark or "").strip()
+        self._apply_defect_result(case, {
+            "phenomenon": actual[:60] or f"{case.case_name} 执行失败",
+            "observed_fact": actual or None,
+            "evidence": [actual] if actual else [],
+            "repro_steps": case.steps,
+        })
 
 defect_extractor = DefectExtractor()
@@ -0,0 +1,226 @@
+import csv
+import io
+import json
+import os
+import tempfile
+from itertools import groupby
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from openpyxl import Workbook, load_workbook
+from app.services.report_gen.sidecar import CASE_FIELDS, DEFECT_FIELDS, MANIFEST, SidecarReader
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger("exporter")
+
+FORMATS = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Flat column layout shared by CSV, JSONL and Parquet
+EXPORT_COLUMNS = CASE_FIELDS + [f"defect_{field}" for field in DEFECT_FIELDS] + ["cluster_name"]
+
+# Analysis columns appended to every sheet of the annotated workbook
+ANNOTATION_COLUMNS = [
+    ("module", "模块"),
+    ("module_confidence", "模块置信度"),
+    ("normalized_result", "标准化结果"),
+    ("audit_status", "审计结论"),
+    ("audit_reason", "审计原因"),
+    ("defect_phenomenon", "缺陷现象"),
+    ("defect_observed_fact", "观察事实"),
+    ("defect_hypothesis", "原因推测"),
+    ("defect_evidence", "证据"),
+    ("defect_repro_steps", "复现步骤"),
+    ("defect_severity_guess", "严重程度"),
+    ("cluster_name", "缺陷聚类"),
+]
+
+_INT_COLUMNS = {"ordinal", "source_row"}
+_FLOAT_COLUMNS = {"module_confidence"}
+
+
+class ExportError(Exception):
+    status_code = 400
+
+
+class ExportNotFound(ExportError):
+    status_code = 404
+
+
+class UnsupportedFormat(ExportError):
+    status_code = 400
+
+
+class ExportUnavailable(ExportError):
+    # The server lacks an optional dependency for the format
+    status_code = 501
+
+
+def flatten_record(record: Dict[str, Any], cluster_names: List[str]) -> Dict[str, Any]:
+    row = {field: record.get(field) for field in CASE_FIELDS}
+    if isinstance(row["parse_warnings"], list):
+        row["parse_warnings"] = "; ".join(row["parse_warnings"])
+    defect = record.get("defect") or {}
+    for field in DEFECT_FIELDS:
+        value = defect.get(field)
+        # evidence is a list of quotes; flat formats and spreadsheet cells take one string
+        row[f"defect_{field}"] = "; ".join(str(v) for v in value) if isinstance(value, list) else value
+    cluster = record.get("cluster")
+    row["cluster_name"] = cluster_names[cluster] if cluster is not None and cluster < len(cluster_names) else None
+    return row
+
+
+class ExportService:
+    """
+    Export a job's analyzed cases from its report data files.
+    Cases are read one sidecar chunk at a time, so memory stays flat regardless of job size.
+    CSV and JSONL are streamed straight to the client; xlsx and Parquet need a finished
+    file and are written once to EXPORT_DIR and reused until the report data changes.
+    """
+
+    def _reader(self, data_dir: str) -> SidecarReader:
+        reader = SidecarReader(data_dir)
+        if not reader.exists():
+            raise ExportNotFound("任务数据不存在或报告尚未生成。")
+        return reader
+
+    def _iter_rows(self, reader: SidecarReader) -> Iterator[List[Dict[str, Any]]]:
+        cluster_names = [c["cluster_name"] for c in reader.clusters()]
+        for records in reader.iter_case_chunks():
+            yield [flatten_record(r, cluster_names) for r in records]
+
+    def stream_csv(self, data_dir: str) -> Iterator[bytes]:
+        reader = self._reader(data_dir)
+
+        def generate() -> Iterator[bytes]:
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+            buffer.write("﻿") # BOM so Excel opens the UTF-8 file correctly
+            writer.writeheader()
+            for rows in self._iter_rows(reader):
+                writer.writerows(rows)
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue().encode("utf-8")
+
+        return generate()
+
+    def stream_jsonl(self, data_dir: str) -> Iterator[bytes]:
+        reader = self._reader(data_dir)
+
+        def generate() -> Iterator[bytes]:
+            for rows in self._iter_rows(reader):
+                yield "".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows).encode("utf-8")
+
+        return generate()
+
+    def export_file(self, job_id: str, data_dir: str, fmt: str) -> str:
+        """Build (or reuse) the xlsx/Parquet export for a job and return its path."""
+        reader = self._reader(data_dir)
+        os.makedirs(settings.EXPORT_DIR, exist_ok=True)
+        path = os.path.join(settings.EXPORT_DIR, f"{job_id}.{fmt}")
+        if os.path.exists(path) and os.path.getmtime(path) >= os.path.getmtime(os.path.join(data_dir, MANIFEST)):
+            return path
+
+        if fmt == "xlsx":
+            write = self._write_workbook
+        elif fmt == "parquet":
+            write = self._write_parquet
+        else:
+            raise UnsupportedFormat(f"不支持的导出格式：{fmt}")
+        # Each request builds into its own temp file; concurrent downloads of a job each replace the
+        # export with a complete file
+        fd, tmp_path = tempfile.mkstemp(dir=settings.EXPORT_DIR, prefix=f"{job_id}.", suffix=f".{fmt}.tmp")
+        os.close(fd)
+        try:
+            write(reader, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        logger.info(f"Exported job {job_id} as {fmt}: {path}")
+        return path
+
+    def _write_parquet(self, reader: SidecarReader, path: str) -> None:
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ExportUnavailable("Parquet 导出需要安装 pyarrow。")
+
+        schema = pa.schema([
+            (name, pa.int64() if name in _INT_COLUMNS else pa.float64() if name in _FLOAT_COLUMNS else pa.string())
+            for name in EXPORT_COLUMNS
+        ])
+        with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+            for rows in self._iter_rows(reader):
+                columns = {
+                    name: [r[name] if name in _INT_COLUMNS or name in _FLOAT_COLUMNS or r[name] is None else str(r[name]) for r in rows]
+                    for name in EXPORT_COLUMNS
+                }
+                writer.write_table(pa.Table.from_pydict(columns, schema=schema))
+
+    def _write_workbook(self, reader: SidecarReader, path: str) -> None:
+        rows = (row for chunk in self._iter_rows(reader) for row in chunk)
+        sources = self._source_files(reader)
+        out = Workbook(write_only=True)
+        if sources and all(os.path.isfile(source) for source, _ in sources):
+            # Batch jobs hold several workbooks, stored one after another: sheet titles get the file stem
+            multiple = len(sources) > 1
+            for (source_file, source_name), group in groupby(rows, key=lambda r: (r["source_file"], r["source_name"])):
+                prefix = os.path.splitext(source_name or os.path.basename(source_file))[0] + "-" if multiple else ""
+                self._annotate_source(source_file, group, out, prefix)
+        else:
+            # Original upload is gone: fall back to a single sheet of the parsed fields
+            logger.warning("Source workbook not found, exporting parsed cases only.")
+            sheet = out.create_sheet("cases")
+            sheet.append(EXPORT_COLUMNS)
+            for row in rows:
+                sheet.append([row[name] for name in EXPORT_COLUMNS])
+        out.save(path)
+
+    def _source_files(self, reader: SidecarReader) -> List[Tuple[str, Optional[str]]]:
+        """(source_file, source_name) of every workbook of the job, in stored order."""
+        sources: List[Tuple[str, Optional[str]]] = []
+        for record in reader.iter_cases():
+            source = (record.get("source_file"), record.get("source_name"))
+            if not sources or sources[-1] != source:
+                sources.append(source)
+        return [s for s in sources if s[0]]
+
+    def _annotate_source(self, source_file: str, rows: Iterator[Dict[str, Any]], out: Workbook, title_prefix: str = "") -> None:
+        """
+        Copy every sheet and row of the original workbook, appending the analysis columns.
+        Cases are stored in sheet/row order, so rows and cases are merged in one pass.
+        """
+        source = load_workbook(source_file, read_only=True, data_only=True)
+        pending = next(rows, None)
+        try:
+            for ws in source.worksheets:
+                target = out.create_sheet((title_prefix + ws.title)[:31])
+                width = ws.max_column or 0
+                for row_number, values in enumerate(ws.iter_rows(values_only=True), start=1):
+                    values = list(values) + [None] * (width - len(values))
+                    if row_number == 1:
+                        target.append(values + [label for _, label in ANNOTATION_COLUMNS])
+                        continue
+                    # Skip cases that point at rows we have already passed
+                    while pending is not None and pending["source_sheet"] == ws.title and (pending["source_row"] or 0) < row_number:
+                        pending = next(rows, None)
+                    if pending is not None and pending["source_sheet"] == ws.title and pending["source_row"] == row_number:
+                        target.append(values + [pending[name] for name, _ in ANNOTATION_COLUMNS])
+                        pending = next(rows, None)
+                    else:
+                        target.append(values)
+                # Drop any cases left over for this sheet before moving to the next one
+                while pending is not None and pending["source_sheet"] == ws.title:
+                    pending = next(rows, None)
+        finally:
+            source.close()
+
+export_service = ExportService()
@@ -0,0 +1,135 @@
+import re
+import zlib
+from typing import List
+import numpy as np
+from app.models.testcase import TestCase
+from app.core.logging import get_logger
+
+logger = get_logger("case_grouping")
+
+# Large Mersenne prime for universal hashing of shingle ids
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+_DIGITS = re.compile(r"\d+")
+_NOISE = re.compile(r"[\s\-_—:：,，.。;；、/\\()（）\[\]【】<>《》\"'“”‘’]+")
+
+
+class CaseGrouper:
+    """
+    Group test cases by lexical similarity of name/steps using MinHash + LSH.
+    Cases that only differ in data values (e.g. "登录-用户名为空" / "登录-密码为空")
+    end up in the same group so that only a few exemplars need an LLM label.
+    """
+
+    def __init__(self, num_perm: int = 64, bands: int = 16, seed: int = 42):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm must be divisible by bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _MAX_HASH, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, _MAX_HASH, size=num_perm, dtype=np.uint64)
+
+    def group(self, cases: List[TestCase], threshold: float = 0.5) -> List[List[int]]:
+        """
+        Return groups as lists of indices into `cases`. Every case belongs to exactly one group.
+        """
+        return self.group_signatures(self.case_signatures(cases), threshold)
+
+    def group_texts(self, texts: List[str], threshold: float = 0.5) -> List[List[int]]:
+        """Same grouping over already-normalized texts (see `normalize`)."""
+        return self.group_signatures(self.signatures(texts), threshold)
+
+    def case_signatures(self, cases: List[TestCase]) -> np.ndarray:
+        return self.signatures([self._case_text(c) for c in cases])
+
+    def signatures(self, texts: List[str]) -> np.ndarray:
+        """One MinHash signature row per text."""
+        if not texts:
+            return np.empty((0, self.num_perm), dtype=np.uint64)
+        return np.vstack([self._signature(t) for t in texts])
+
+    def similarity(self, signatures: np.ndarray, index: int, others: List[int]) -> np.ndarray:
+        """Estimated Jaccard similarity of row `index` to each of the rows `others`."""
+        return (signatures[others] == signatures[index]).mean(axis=1)
+
+    def group_signatures(self, signatures: np.ndarray, threshold: float = 0.5) -> List[List[int]]:
+        total = len(signatures)
+        if total == 0:
+            return []
+
+        # LSH banding: cases sharing any identical band become candidate pairs
+        parent = list(range(total))
+
+        def find(x: int) -> int:
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for band in range(self.bands):
+            cols = signatures[:, band * self.rows:(band + 1) * self.rows]
+            buckets = {}
+            for idx, key in enumerate(map(bytes, cols)):
+                buckets.setdefault(key, []).append(idx)
+
+            for members in buckets.values():
+                if len(members) < 2:
+                    continue
+                head = members[0]
+                # Verify candidates with the estimated Jaccard similarity
+                sims = (signatures[members[1:]] == signatures[head]).mean(axis=1)
+                for other, sim in zip(members[1:], sims):
+                    if sim >= threshold:
+                        ra, rb = find(head), find(other)
+                        if ra != rb:
+                            parent[rb] = ra
+
+        groups = {}
+        for idx in range(total):
+            groups.setdefault(find(idx), []).append(idx)
+
+        result = list(groups.values())
+        logger.info(f"Grouped {total} texts into {len(result)} lexical groups.")
+        return result
+
+    def _case_text(self, case: TestCase) -> str:
+        return normalize(f"{case.case_name or ''} {(case.steps or '')[:100]}")
+
+    def _signature(self, text: str) -> np.ndarray:
+        shingles = self._shingles(text)
+        if not shingles:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+
+        hashes = np.array([zlib.crc32(s.encode("utf-8")) for s in shingles], dtype=np.uint64)
+        # (a * h + b) mod p for every permutation at once; a, h, b < 2^32 so it fits in uint64
+        permuted = (np.outer(hashes, self._a) + self._b) % _PRIME
+        return (permuted & _MAX_HASH).min(axis=0)
+
+    def _shingles(self, text: str, size: int = 2) -> set:
+        if len(text) <= size:
+            return {text} if text else set()
+        return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+
+def normalize(text: str) -> str:
+    """Lowercase, fold digits and drop punctuation/whitespace before shingling."""
+    return _NOISE.sub("", _DIGITS.sub("0", text.lower()))
+
+
+def pick_exemplars(members: List[int], k: int) -> List[int]:
+    """Pick up to k members spread evenly across the group."""
+    if len(members) <= k:
+        return list(members)
+    step = (len(members) - 1) / max(k - 1, 1)
+    picked = []
+    for i in range(k):
+        idx = members[int(round(i * step))]
+        if idx not in picked:
+            picked.append(idx)
+    return picked
+
+
+case_grouper = CaseGrouper()
@@ -1,38 +1,98 @@
+import io
+import os
+import asyncio
 import pandas as pd
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable, Hashable
 import json
 from app.core.logging import get_logger
+from app.core.metrics import INGEST_CACHE
+from app.core.tracing import current_span, span
 from app.models.testcase import TestCase
 from app.services.llm.client import llm_client
 import uuid
 
 logger = get_logger("ingest_service")
 
+class IngestCache:
+    """
+    LLM answers shared by all workbooks of one batch job: column mappings keyed by the
+    header row and result normalization keyed by raw result value. Concurrent requests
+    for the same key wait on a single in-flight call.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[Tuple[str, Hashable], asyncio.Future] = {}
+
+    async def fetch(
+        self,
+        namespace: str,
+        keys: List[Hashable],
+        fetch: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]],
+    ) -> Dict[Hashable, Any]:
+        missing = [k for k in keys if (namespace, k) not in self._tasks]
+        hits = len(keys) - len(missing)
+        INGEST_CACHE.inc(hits, namespace=namespace, result="hit")
+        INGEST_CACHE.inc(len(missing), namespace=namespace, result="miss")
+        s = current_span()
+        if s:
+            s.add("cache_hits", hits)
+            s.add("cache_misses", len(missing))
+        if missing:
+            task = asyncio.ensure_future(fetch(missing))
+            for k in missing:
+                self._tasks[(namespace, k)] = task
+        results = {}
+        for k in keys:
+            try:
+                results[k] = (await self._tasks[(namespace, k)]).get(k)
+            except Exception:
+                # Do not cache failures; the next workbook asks again
+                self._tasks.pop((namespace, k), None)
+                raise
+        return results
+
+
 class IngestService:
-    async def parse_excel(self, file_path: str, job_id: str) -> List[Dict[str, Any]]:
+    async def parse_excel(
+        self,
+        file_path: str,
+        job_id: str,
+        content: Optional[bytes] = None,
+        cache: Optional[IngestCache] = None,
+        source_name: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Parse every sheet of the workbook. `content` (raw bytes of a small upload) is parsed
+        from memory; `file_path` is still recorded as the cases' source file.
+        `cache` shares LLM column/result mappings across the workbooks of a batch.
+        """
         logger.info(f"Parsing Excel file: {file_path}")
         try:
-            # Read all sheets
-            xls = pd.ExcelFile(file_path)
+            # Read all sheets; parsing runs in worker threads so the workbooks of a batch load concurrently
+            xls = await asyncio.to_thread(pd.ExcelFile, io.BytesIO(content) if content is not None else file_path)
             all_cases = []
             
             for sheet_name in xls.sheet_names:
-                df = pd.read_excel(file_path, sheet_name=sheet_name)
+                with span("ingest.sheet", file=source_name or os.path.basename(file_path), sheet=sheet_name) as sheet_span:
+                    df = await asyncio.to_thread(xls.parse, sheet_name)
                 
-                # 1. LLM-based Column Alignment
-                df = await self._align_columns_with_llm(df, sheet_name)
+                    # 1. LLM-based Column Alignment
+                    df = await self._align_columns_with_llm(df, sheet_name, cache)
                 
-                # 2. LLM-based Result Normalization
-                df = await self._normalize_results_with_llm(df)
+                    # 2. LLM-based Result Normalization
+                    df = await self._normalize_results_with_llm(df, cache)
                 
-                # Iterate rows
-                for index, row in df.iterrows():
-                    # Skip empty rows (must have case_name or result)
-                    if pd.isna(row.get("case_name")) and pd.isna(row.get("test_result")):
-                        continue
+                    # Iterate rows
+                    for index, row in df.iterrows():
+                        # Skip empty rows (must have case_name or result)
+                        if pd.isna(row.get("case_name")) and pd.isna(row.get("test_result")):
+                            continue
                         
-                    case_data = self._row_to_case_dict(row, index, sheet_name, file_path, job_id)
-                    all_cases.append(case_data)
+                        case_data = self._row_to_case_dict(row, index, sheet_name, file_path, job_id)
+                        case_data["ordinal"] = len(all_cases) # Stable per-job key for LLM batch round-trips
+                        case_data["source_name"] = source_name or os.path.basename(file_path)
+                        all_cases.append(case_data)
+                    sheet_span.set(rows=len(df))
             
             logger.info(f"Parsed {len(all_cases)} cases from {file_path}")
             return all_cases
@@ -41,7 +101,7 @@ class IngestService:
             logger.error(f"Failed to parse Excel: {e}")
             raise e
 
-    async def _align_columns_with_llm(self, df: pd.DataFrame, sheet_name: str) -> pd.DataFrame:
+    async def _align_columns_with_llm(self, df: pd.DataFrame, sheet_name: str, cache: Optional[IngestCache] = None) -> pd.DataFrame:
         headers = df.columns.tolist()
         # Take first valid row as sample
         sample = {}
@@ -86,12 +146,20 @@ class IngestService:
         
         try:
             logger.info(f"Aligning columns for sheet {sheet_name} with LLM...")
-            mapping = await llm_client.achat_completion([{"role": "user", "content": prompt}], response_format=dict)
-            
-            if not isinstance(mapping, dict):
-                 # Fallback parsing if LLM returns string
-                logger.warning("LLM returned string instead of dict for column mapping, attempting parse")
-                mapping = json.loads(str(mapping))
+            async def request(keys: List[Hashable]) -> Dict[Hashable, Any]:
+                mapping = await llm_client.achat_completion([{"role": "user", "content": prompt}], response_format=dict, profile="align")
+                if not isinstance(mapping, dict):
+                    # Fallback parsing if LLM returns string
+                    logger.warning("LLM returned string instead of dict for column mapping, attempting parse")
+                    mapping = json.loads(str(mapping))
+                return {keys[0]: mapping}
+
+            # Workbooks of a batch usually share a template: identical header rows are mapped once
+            header_key = tuple(str(h) for h in headers)
+            if cache is not None:
+                mapping = (await cache.fetch("columns", [header_key], request))[header_key]
+            else:
+                mapping = (await request([header_key]))[header_key]
 
             logger.info(f"Column mapping received: {mapping}")
             
@@ -118,7 +186,7 @@ class IngestService:
             # Fallback to empty mapping (will likely fail validation later, but better than crash)
             return df
 
-    async def _normalize_results_with_llm(self, df: pd.DataFrame) -> pd.DataFrame:
+    async def _normalize_results_with_llm(self, df: pd.DataFrame, cache: Optional[IngestCache] = None) -> pd.DataFrame:
         if "test_result" not in df.columns:
             logger.warning("'test_result' column not found after alignment.")
             return df
@@ -127,7 +195,32 @@ class IngestService:
         if not unique_values:
             return df
             
-        prompt = f"""
+        async def request(values: List[Hashable]) -> Dict[Hashable, Any]:
+            logger.info(f"Normalizing results with LLM for values: {values}")
+            mapping = await llm_client.achat_completion(
+                [{"role": "user", "content": self._normalize_prompt(values)}], response_format=dict, profile="normalize"
+            )
+            if not isinstance(mapping, dict):
+                 mapping = json.loads(str(mapping))
+            return mapping
+
+        try:
+            # In a batch, values already normalized for another workbook are not sent again
+            mapping = await cache.fetch("results", unique_values, request) if cache is not None else await request(unique_values)
+                 
+            logger.info(f"Result mapping received: {mapping}")
+            
+            # Apply mapping
+            df["normalized_result"] = df["test_result"].astype(str).map(mapping).fillna("Skipped")
+            return df
+            
+        except Exception as e:
+            logger.error(f"Result normalization failed: {e}")
+            df["normalized_result"] = "Skipped"
+            return df
+
+    def _normalize_prompt(self, unique_values: List[Hashable]) -> str:
+        return f"""
         请将以下测试结果值映射到标准状态：Pass, Fail, Blocked, Skipped。
         
         【重要指令】
@@ -148,24 +241,6 @@ class IngestService:
             "bug": "Fail"
         }}
         """
-        
-        try:
-            logger.info(f"Normalizing results with LLM for values: {unique_values}")
-            mapping = await llm_client.achat_completion([{"role": "user", "content": prompt}], response_format=dict)
-            
-            if not isinstance(mapping, dict):
-                 mapping = json.loads(str(mapping))
-                 
-            logger.info(f"Result mapping received: {mapping}")
-            
-            # Apply mapping
-            df["normalized_result"] = df["test_result"].astype(str).map(mapping).fillna("Skipped")
-            return df
-            
-        except Exception as e:
-            logger.error(f"Result normalization failed: {e}")
-            df["normalized_result"] = "Skipped"
-            return df
 
     def _row_to_case_dict(self, row: pd.Series, row_idx: int, sheet: str, file: str, job_id: str) -> Dict[str, Any]:
         # Basic fields
@@ -1,12 +1,21 @@
 from typing import List, Dict, Any
+import re
 import json
-import asyncio
 from app.models.testcase import TestCase
 from app.services.llm.client import llm_client
+from app.services.ingest.grouping import case_grouper, pick_exemplars
+from app.core.config import settings
+from app.services.jobs.progress import advance
 from app.core.logging import get_logger
+from app.core.tracing import span
+from app.services.llm.offline import gather
+from app.services.llm.usage import usage_tracker
 
 logger = get_logger("module_tagging")
 
+# Module prefix of a case name: "【支付】退款", "登录-用户名为空", "支付/退款：..."
+_NAME_PREFIX = re.compile(r"^\s*(?:[\[【]([^\]】]{2,12})[\]】]|([^\-_—:：/|\s]{2,12})\s*[\-_—:：/|])")
+
 class ModuleTagger:
     async def tag_cases_concurrently(self, cases: List[TestCase], batch_size: int = 10) -> List[TestCase]:
         """
@@ -20,11 +29,91 @@ class ModuleTagger:
             batch = cases[i:i + batch_size]
             tasks.append(self._process_batch_async(batch, i))
             
-        await asyncio.gather(*tasks)
+        await gather(*tasks)
         logger.info("Module tagging completed.")
             
         return cases
 
+    async def tag_cases_grouped(self, cases: List[TestCase], batch_size: int = 10) -> List[TestCase]:
+        """
+        Representative-sampling mode: group lexically similar cases, tag a few exemplars
+        per group with the LLM and propagate the module to the rest of the group.
+        Groups whose exemplars disagree are tagged in full.
+        """
+        signatures = case_grouper.case_signatures(cases)
+        groups = case_grouper.group_signatures(signatures, threshold=settings.TAGGING_GROUP_THRESHOLD)
+        exemplars_by_group = [pick_exemplars(g, settings.TAGGING_EXEMPLARS_PER_GROUP) for g in groups]
+
+        exemplars = [cases[i] for ex in exemplars_by_group for i in ex]
+        logger.info(f"Grouped tagging: {len(cases)} cases, {len(groups)} groups, {len(exemplars)} exemplars.")
+        await self.tag_cases_concurrently(exemplars, batch_size)
+
+        leftovers = []
+        for members, ex in zip(groups, exemplars_by_group):
+            rest = [cases[i] for i in members if i not in ex]
+            if not rest:
+                continue
+
+            labels = {cases[i].module for i in ex}
+            if len(labels) == 1 and None not in labels:
+                module_name = labels.pop()
+                for i in members:
+                    if i in ex:
+                        continue
+                    # Inherited label: the exemplar's confidence scaled by how close the case is to it
+                    sims = case_grouper.similarity(signatures, i, ex)
+                    nearest = cases[ex[int(sims.argmax())]]
+                    cases[i].module = module_name
+                    cases[i].module_confidence = round(float(sims.max()) * (nearest.module_confidence or 0.9), 3)
+                advance(len(rest))
+            else:
+                # Exemplars disagree (or failed): the group is not homogeneous, tag every member
+                leftovers.extend(rest)
+
+        if leftovers:
+            logger.info(f"Grouped tagging: {len(leftovers)} cases in ambiguous groups need full tagging.")
+            await self.tag_cases_concurrently(leftovers, batch_size)
+
+        return cases
+
+    async def tag_cases(self, cases: List[TestCase], batch_size: int = 10) -> List[TestCase]:
+        """
+        Tag cases with the strategy configured by TAGGING_MODE.
+        """
+        usage = usage_tracker.current()
+        if usage and usage.should_degrade():
+            logger.warning(f"Token budget nearly used up ({usage.total}/{usage.budget}), tagging {len(cases)} cases by rules.")
+            usage.mark_degraded("tagging")
+            return self.tag_cases_by_rules(cases)
+
+        if settings.TAGGING_MODE == "grouped":
+            await self.tag_cases_grouped(cases, batch_size)
+        else:
+            await self.tag_cases_concurrently(cases, batch_size)
+
+        cause = usage.fallback_cause() if usage else None
+        if cause:
+            # The budget ran out or the circuit opened mid-stage: rule-tag whatever the LLM did not reach
+            untagged = [c for c in cases if not c.module]
+            if untagged:
+                usage.mark_degraded("tagging", cause)
+                self.tag_cases_by_rules(untagged)
+        return cases
+
+    def tag_cases_by_rules(self, cases: List[TestCase]) -> List[TestCase]:
+        """
+        LLM-free fallback: take the module from a case name prefix ("登录-用户名为空" -> 登录),
+        otherwise from the source sheet name.
+        """
+        for case in cases:
+            match = _NAME_PREFIX.match(case.case_name or "")
+            if match:
+                case.module, case.module_confidence = match.group(1) or match.group(2), 0.5
+            else:
+                case.module, case.module_confidence = case.source_sheet or "未分类", 0.3
+        advance(len(cases))
+        return cases
+
     async def _process_batch_async(self, batch: List[TestCase], start_index: int):
         # Prepare concise input for LLM
         batch_input = []
@@ -57,7 +146,8 @@ class ModuleTagger:
         """
         
         try:
-            response = await llm_client.achat_completion([{"role": "user", "content": prompt}], response_format=list)
+            with span("llm.batch", batch_size=len(batch)):
+                response = await llm_client.achat_completion([{"role": "user", "content": prompt}], response_format=list, profile="tagging")
             
             if not isinstance(response, list):
                  # Fallback parsing
@@ -73,6 +163,7 @@ class ModuleTagger:
 
             # Map results back to cases
             if isinstance(response, list):
+                tagged = 0
                 for item in response:
                     if not isinstance(item, dict): continue
                     
@@ -82,6 +173,8 @@ class ModuleTagger:
                     if local_id is not None and 0 <= local_id < len(batch) and module_name:
                         batch[local_id].module = module_name
                         batch[local_id].module_confidence = 0.9 # High confidence for LLM
+                        tagged += 1
+                advance(tagged)
                         
         except Exception as e:
             logger.error(f"Batch tagging failed: {e}")
@@ -0,0 +1,289 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from typing import AsyncIterator, Callable, Dict, Any, List, Optional, Tuple
+from fastapi import UploadFile
+try:
+    from python_multipart.multipart import MultipartParseError, MultipartParser, parse_options_header
+except ImportError: # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParseError, MultipartParser, parse_options_header
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger("uploads")
+
+PARTS_DIR = ".parts"
+SESSION_FILE = "session.json"
+
+
+class UploadError(Exception):
+    status_code = 400
+
+
+class UploadTooLarge(UploadError):
+    status_code = 413
+
+
+class UploadNotFound(UploadError):
+    status_code = 404
+
+
+class StoredUpload:
+    def __init__(self, path: str, sha256: str, size: int, content: Optional[bytes] = None):
+        self.path = path
+        self.sha256 = sha256
+        self.size = size
+        # Raw bytes of small uploads, handed to the parser so it does not re-read the file
+        self.content = content
+
+
+async def _iter_upload_file(file: UploadFile) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await file.read(settings.UPLOAD_CHUNK_BYTES)
+        if not chunk:
+            break
+        yield chunk
+
+
+class MultipartFileReader:
+    """
+    Incremental reader of one file field of a multipart/form-data body. Body chunks are pushed
+    through python-multipart's parser as they arrive, so the file reaches the caller without
+    being spooled first; the whole body is held to the upload size limit while it is read.
+    """
+
+    def __init__(self, content_type: str, body: AsyncIterator[bytes], field: str = "file"):
+        media_type, params = parse_options_header(content_type or "")
+        if media_type != b"multipart/form-data" or not params.get(b"boundary"):
+            raise UploadError("请求须为 multipart/form-data。")
+        self.field = field
+        self.filename: Optional[str] = None
+        self._body = body.__aiter__()
+        self._received = 0
+        self._data: List[bytes] = []
+        self._in_file = False
+        self._found = False
+        self._finished = False
+        self._headers: Dict[bytes, bytes] = {}
+        self._header_field = b""
+        self._header_value = b""
+        self._parser = MultipartParser(params[b"boundary"], callbacks={
+            "on_part_begin": self._on_part_begin,
+            "on_header_field": lambda data, start, end: self._append_header("_header_field", data[start:end]),
+            "on_header_value": lambda data, start, end: self._append_header("_header_value", data[start:end]),
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+        })
+
+    def _append_header(self, name: str, data: bytes) -> None:
+        setattr(self, name, getattr(self, name) + data)
+
+    def _on_part_begin(self) -> None:
+        self._headers = {}
+
+    def _on_header_end(self) -> None:
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = self._header_value = b""
+
+    def _on_headers_finished(self) -> None:
+        _, params = parse_options_header(self._headers.get(b"content-disposition", b""))
+        if not self._found and params.get(b"name") == self.field.encode() and b"filename" in params:
+            self._found = self._in_file = True
+            self.filename = params[b"filename"].decode("utf-8", "replace")
+
+    def _on_part_data(self, data: bytes, start: int, end: int) -> None:
+        if self._in_file:
+            self._data.append(bytes(data[start:end]))
+
+    def _on_part_end(self) -> None:
+        if self._in_file:
+            self._in_file = False
+            self._finished = True
+
+    async def _feed(self) -> bool:
+        """Parse the next body chunk; False once the body is exhausted."""
+        try:
+            chunk = await self._body.__anext__()
+        except StopAsyncIteration:
+            return False
+        self._received += len(chunk)
+        # Form fields and boundaries around the file get the same headroom as the declared length check
+        if self._received > settings.UPLOAD_MAX_BYTES + (1 << 16):
+            raise UploadTooLarge(f"文件超过大小上限（{settings.UPLOAD_MAX_BYTES // (1 << 20)} MB）。")
+        try:
+            self._parser.write(chunk)
+        except MultipartParseError as e:
+            raise UploadError(f"multipart 请求格式错误：{e}")
+        return True
+
+    async def open(self) -> str:
+        """Read up to the start of the file field and return its client-side filename."""
+        while not self._found:
+            if not await self._feed():
+                raise UploadError(f"请求中缺少文件字段 {self.field}。")
+        return self.filename
+
+    async def chunks(self) -> AsyncIterator[bytes]:
+        while True:
+            if self._data:
+                data, self._data = b"".join(self._data), []
+                yield data
+            if self._finished:
+                return
+            if not await self._feed():
+                raise UploadError("上传内容不完整。")
+
+
+class UploadService:
+    """
+    Streaming upload storage. Content is hashed while it streams and written from a worker
+    thread, so large uploads never block the event loop; the size limit is enforced per chunk.
+    Very large workbooks can be sent as resumable multipart sessions.
+    """
+
+    def __init__(self, upload_dir: str = "uploads"):
+        self.upload_dir = upload_dir
+
+    async def save_upload_file(self, file: UploadFile, dest_path: str) -> StoredUpload:
+        return await self.save_stream(_iter_upload_file(file), dest_path)
+
+    async def save_multipart_file(
+        self,
+        content_type: str,
+        body: AsyncIterator[bytes],
+        dest_path_for: Callable[[str], str],
+        field: str = "file",
+    ) -> Tuple[StoredUpload, str]:
+        """
+        Stream the `field` file of a raw multipart/form-data body to disk. Returns the stored
+        upload and its base filename, which `dest_path_for` turns into the destination path.
+        """
+        reader = MultipartFileReader(content_type, body, field)
+        filename = os.path.basename(await reader.open()) or "upload.xlsx"
+        return await self.save_stream(reader.chunks(), dest_path_for(filename)), filename
+
+    async def save_stream(self, chunks: AsyncIterator[bytes], dest_path: str) -> StoredUpload:
+        os.makedirs(os.path.dirname(dest_path) or ".", exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        head: List[bytes] = [] # Kept while the upload is still small enough to parse from memory
+        tmp_path = dest_path + ".tmp"
+        f = await asyncio.to_thread(open, tmp_path, "wb")
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > settings.UPLOAD_MAX_BYTES:
+                    raise UploadTooLarge(f"文件超过大小上限（{settings.UPLOAD_MAX_BYTES // (1 << 20)} MB）。")
+                digest.update(chunk)
+                if head is not None:
+                    head.append(chunk)
+                    if size > settings.UPLOAD_IN_MEMORY_MAX_BYTES:
+                        head = None
+                await asyncio.to_thread(f.write, chunk)
+        except BaseException:
+            await asyncio.to_thread(f.close)
+            await asyncio.to_thread(os.remove, tmp_path)
+            raise
+        await asyncio.to_thread(f.close)
+        os.replace(tmp_path, dest_path)
+        return StoredUpload(dest_path, digest.hexdigest(), size, b"".join(head) if head is not None else None)
+
+    # Resumable multipart sessions: parts are stored under uploads/.parts/<upload_id>/ and
+    # concatenated on completion, so a client can re-send only the parts that are missing.
+
+    def _session_dir(self, upload_id: str) -> str:
+        if os.path.basename(upload_id) != upload_id:
+            raise UploadNotFound("上传会话不存在。")
+        return os.path.join(self.upload_dir, PARTS_DIR, upload_id)
+
+    def _load_session(self, upload_id: str) -> Dict[str, Any]:
+        path = os.path.join(self._session_dir(upload_id), SESSION_FILE)
+        if not os.path.isfile(path):
+            raise UploadNotFound("上传会话不存在。")
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def create_session(self, filename: str, size: Optional[int] = None, sha256: Optional[str] = None) -> Dict[str, Any]:
+        if size is not None and size > settings.UPLOAD_MAX_BYTES:
+            raise UploadTooLarge(f"文件超过大小上限（{settings.UPLOAD_MAX_BYTES // (1 << 20)} MB）。")
+        upload_id = uuid.uuid4().hex
+        session = {
+            "upload_id": upload_id,
+            "filename": os.path.basename(filename),
+            "size": size,
+            "sha256": sha256.lower() if sha256 else None,
+            "part_size": settings.UPLOAD_PART_BYTES,
+        }
+        session_dir = self._session_dir(upload_id)
+        os.makedirs(session_dir, exist_ok=True)
+        with open(os.path.join(session_dir, SESSION_FILE), "w", encoding="utf-8") as f:
+            json.dump(session, f, ensure_ascii=False)
+        return {**session, "received_parts": []}
+
+    def session_status(self, upload_id: str) -> Dict[str, Any]:
+        session = self._load_session(upload_id)
+        return {**session, "received_parts": self._received_parts(upload_id)}
+
+    def _received_parts(self, upload_id: str) -> List[int]:
+        return sorted(
+            int(name.split(".")[0])
+            for name in os.listdir(self._session_dir(upload_id))
+            if name.endswith(".part")
+        )
+
+    async def write_part(self, upload_id: str, index: int, chunks: AsyncIterator[bytes]) -> Dict[str, Any]:
+        self._load_session(upload_id)
+        session_dir = self._session_dir(upload_id)
+        stored = sum(
+            os.path.getsize(os.path.join(session_dir, f"{i:05d}.part"))
+            for i in self._received_parts(upload_id) if i != index
+        )
+
+        async def limited() -> AsyncIterator[bytes]:
+            received = 0
+            async for chunk in chunks:
+                received += len(chunk)
+                if received > settings.UPLOAD_PART_BYTES * 2:
+                    raise UploadTooLarge("分片过大。")
+                if stored + received > settings.UPLOAD_MAX_BYTES:
+                    raise UploadTooLarge(f"文件超过大小上限（{settings.UPLOAD_MAX_BYTES // (1 << 20)} MB）。")
+                yield chunk
+
+        part = await self.save_stream(limited(), os.path.join(session_dir, f"{index:05d}.part"))
+        return {"upload_id": upload_id, "index": index, "size": part.size, "sha256": part.sha256}
+
+    async def complete_session(self, upload_id: str, dest_path: str) -> StoredUpload:
+        """Concatenate the parts in order into `dest_path`, verifying the declared size and hash."""
+        session = self._load_session(upload_id)
+        session_dir = self._session_dir(upload_id)
+        parts = self._received_parts(upload_id)
+        if not parts or parts != list(range(len(parts))):
+            raise UploadError(f"分片不完整，已收到：{parts}")
+
+        async def read_parts() -> AsyncIterator[bytes]:
+            for i in parts:
+                with open(os.path.join(session_dir, f"{i:05d}.part"), "rb") as f:
+                    while True:
+                        chunk = await asyncio.to_thread(f.read, settings.UPLOAD_CHUNK_BYTES)
+                        if not chunk:
+                            break
+                        yield chunk
+
+        stored = await self.save_stream(read_parts(), dest_path)
+        if (session["size"] is not None and stored.size != session["size"]) or (session["sha256"] and stored.sha256 != session["sha256"]):
+            os.remove(dest_path)
+            raise UploadError("合并后的文件大小或 SHA-256 与声明不一致，请重新上传缺失或损坏的分片。")
+
+        await asyncio.to_thread(shutil.rmtree, session_dir, True)
+        logger.info(f"Completed multipart upload {upload_id}: {stored.size} bytes in {len(parts)} parts.")
+        return stored
+
+    def session_filename(self, upload_id: str) -> str:
+        return self._load_session(upload_id)["filename"]
+
+upload_service = UploadService()
@@ -0,0 +1,83 @@
+import asyncio
+from typing import Coroutine, Dict, Set
+from app.core.logging import get_logger
+from app.services.llm.offline import offline_runner
+from app.services.llm.scheduler import llm_scheduler
+
+logger = get_logger("job_control")
+
+
+class JobControl:
+    """
+    Cancel, pause and resume running pipelines.
+
+    Cancelling cancels the pipeline task, which reaches every LLM call it waits on: queued calls
+    leave the scheduler, calls in flight give their slots back at once and outstanding offline
+    batches are cancelled with the provider. Pausing stops the job from getting LLM slots (calls
+    in flight finish) and holds the pipeline at the next stage boundary until it is resumed.
+    """
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._resumed: Dict[str, asyncio.Event] = {}
+        self._cancelled: Set[str] = set()
+
+    def start(self, job_id: str, pipeline: Coroutine) -> asyncio.Task:
+        resumed = asyncio.Event()
+        resumed.set()
+        self._resumed[job_id] = resumed
+        task = asyncio.create_task(pipeline)
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._forget(job_id))
+        return task
+
+    def active(self, job_id: str) -> bool:
+        return job_id in self._tasks
+
+    def paused(self, job_id: str) -> bool:
+        resumed = self._resumed.get(job_id)
+        return resumed is not None and not resumed.is_set()
+
+    async def cancel(self, job_id: str, wait: float = 5.0) -> bool:
+        """
+        Cancel the job and wait up to `wait` seconds for the pipeline to wind down. Repeated
+        calls only wait: cancelling the task again would interrupt it while it records the cancel.
+        """
+        task = self._tasks.get(job_id)
+        if task is None:
+            return False
+        if job_id not in self._cancelled:
+            self._cancelled.add(job_id)
+            logger.info(f"Cancelling job {job_id}.")
+            llm_scheduler.cancel(job_id)
+            task.cancel()
+            await offline_runner.cancel(job_id)
+        await asyncio.wait({task}, timeout=wait)
+        return True
+
+    def pause(self, job_id: str) -> bool:
+        if not self.active(job_id) or self.paused(job_id):
+            return False
+        self._resumed[job_id].clear()
+        llm_scheduler.pause(job_id)
+        return True
+
+    def resume(self, job_id: str) -> bool:
+        if not self.paused(job_id):
+            return False
+        self._resumed[job_id].set()
+        llm_scheduler.resume(job_id)
+        return True
+
+    async def checkpoint(self, job_id: str) -> None:
+        """Stage boundary: wait here while the job is paused."""
+        resumed = self._resumed.get(job_id)
+        if resumed is not None:
+            await resumed.wait()
+
+    def _forget(self, job_id: str) -> None:
+        self._tasks.pop(job_id, None)
+        self._resumed.pop(job_id, None)
+        self._cancelled.discard(job_id)
+
+job_control = JobControl()
@@ -0,0 +1,271 @@
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Tuple
+from sqlalchemy import or_, select
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.db.session import AsyncSessionLocal
+from app.models.rollup import RuntimeRollup, StageRollup
+from app.services.jobs.events import STAGES, event_hub
+from app.services.llm.scheduler import llm_scheduler
+
+logger = get_logger("job_eta")
+
+# Stages whose speed depends on the job's share of the LLM slots
+LLM_STAGES = ("tagging", "audit", "extraction")
+
+# Seconds per item before any job completed: pipeline benchmark figures at 200 ms LLM
+# latency and 20 slots. Ingest is per workbook byte.
+_PRIOR_SECONDS_PER_ITEM = {
+    "ingest": 1e-5, "tagging": 1.3e-3, "audit": 1.1e-3, "extraction": 4e-4, "stats": 1e-5, "report": 2e-4,
+}
+_PRIOR_BYTES_PER_CASE = 70.0
+
+
+class StageSample(NamedTuple):
+    size: float
+    seconds: float
+    tokens: int
+
+
+def _fit(samples: List[StageSample]) -> Tuple[float, float]:
+    """Least-squares seconds = base + per_item * size, both kept non-negative."""
+    xs = [s.size for s in samples]
+    ys = [s.seconds for s in samples]
+    mean_x, mean_y = sum(xs) / len(xs), sum(ys) / len(ys)
+    var = sum((x - mean_x) ** 2 for x in xs)
+    if len(samples) < 3 or var == 0:
+        return 0.0, sum(ys) / max(sum(xs), 1.0)
+    per_item = max(sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var, 0.0)
+    return max(mean_y - per_item * mean_x, 0.0), per_item
+
+
+class ThroughputModel:
+    """Rolling per-stage runtime model over the last `window` completed jobs."""
+
+    def __init__(self, window: int):
+        self.window = window
+        self.samples: Dict[str, Deque[StageSample]] = {}
+        self.bytes_per_case: Deque[float] = deque(maxlen=window)
+        self._fits: Dict[str, Tuple[float, float]] = {}
+
+    def add(self, stage: str, sample: StageSample) -> None:
+        self.samples.setdefault(stage, deque(maxlen=self.window)).append(sample)
+        self._fits.pop(stage, None)
+
+    def predict(self, stage: str, size: float) -> float:
+        samples = self.samples.get(stage)
+        if not samples:
+            return _PRIOR_SECONDS_PER_ITEM.get(stage, 0.0) * size
+        if stage not in self._fits:
+            self._fits[stage] = _fit(list(samples))
+        base, per_item = self._fits[stage]
+        return base + per_item * size
+
+    def cases_for(self, content_size: int) -> float:
+        """Cases a workbook of this size is likely to hold, until it has been parsed."""
+        ratio = sum(self.bytes_per_case) / len(self.bytes_per_case) if self.bytes_per_case else _PRIOR_BYTES_PER_CASE
+        return content_size / max(ratio, 1.0)
+
+    def rates(self) -> Dict[str, Dict[str, Any]]:
+        rates = {}
+        for stage, samples in self.samples.items():
+            seconds = sum(s.seconds for s in samples)
+            base, per_item = self._fits.get(stage) or _fit(list(samples))
+            rates[stage] = {
+                "jobs": len(samples),
+                "items_per_second": round(sum(s.size for s in samples) / seconds, 2) if seconds else None,
+                "tokens_per_second": round(sum(s.tokens for s in samples) / seconds, 1) if seconds else None,
+                "base_seconds": round(base, 3),
+                "seconds_per_item": per_item,
+            }
+        return rates
+
+
+class JobClock:
+    """Stage timings of one running job."""
+
+    def __init__(self, content_size: int):
+        self.started = time.monotonic()
+        self.content_size = content_size
+        self.sizes: Dict[str, float] = {}
+        self.durations: Dict[str, float] = {}
+        self.stage: Optional[str] = None
+        self.stage_started = self.started
+        self.predicted: Optional[float] = None
+
+
+class EtaService:
+    """
+    Estimated completion of running jobs. Each remaining stage is predicted from the rolling
+    throughput model, LLM stages slowed down by the job's expected share of the LLM slots; the
+    running stage blends that prediction with its live rate as its progress counter advances.
+    Completed jobs feed their stage timings back into the model and into the rollup tables.
+    """
+
+    def __init__(self):
+        self.model = ThroughputModel(settings.ETA_HISTORY_JOBS)
+        self.clocks: Dict[str, JobClock] = {}
+
+    async def load(self) -> None:
+        """Fit the model on the stage history of earlier processes."""
+        try:
+            async with AsyncSessionLocal() as session:
+                for stage in STAGES:
+                    rows = (await session.execute(
+                        select(StageRollup.size, StageRollup.seconds, StageRollup.tokens)
+                        .where(StageRollup.stage == stage, or_(StageRollup.learned.is_(None), StageRollup.learned.is_(True)))
+                        .order_by(StageRollup.completed_at.desc())
+                        .limit(self.model.window)
+                    )).all()
+                    for size, seconds, tokens in reversed(rows):
+                        self.model.add(stage, StageSample(size, seconds, tokens))
+                sizes = (await session.execute(
+                    select(RuntimeRollup.content_size, RuntimeRollup.total_cases)
+                    .order_by(RuntimeRollup.completed_at.desc())
+                    .limit(self.model.window)
+                )).all()
+            for content_size, cases in reversed(sizes):
+                if content_size and cases:
+                    self.model.bytes_per_case.append(content_size / cases)
+        except Exception as e:
+            logger.error(f"Failed to load stage throughput history: {e}")
+
+    def open(self, job_id: str, content_size: int) -> None:
+        self.clocks[job_id] = JobClock(content_size)
+
+    def plan(self, job_id: str, sizes: Dict[str, int]) -> None:
+        """Items per stage once the workbook is parsed; the prediction made here is kept for comparison."""
+        clock = self.clocks.get(job_id)
+        if clock is None:
+            return
+        clock.sizes = dict(sizes)
+        estimate = self.estimate(job_id)
+        if estimate:
+            clock.predicted = estimate["elapsed_seconds"] + estimate["remaining_seconds"]
+
+    def stage_started(self, job_id: str, stage: str) -> None:
+        clock = self.clocks.get(job_id)
+        if clock is not None:
+            clock.stage, clock.stage_started = stage, time.monotonic()
+
+    def stage_finished(self, job_id: str, stage: str, seconds: float) -> None:
+        clock = self.clocks.get(job_id)
+        if clock is not None:
+            clock.durations[stage] = seconds
+            clock.stage = None
+
+    def estimate(self, job_id: str, status: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Remaining seconds, completion time and percentage; None while the job is not running."""
+        clock = self.clocks.get(job_id)
+        if clock is None:
+            return None
+        now = time.monotonic()
+        elapsed = now - clock.started
+        if status in ("paused", "waiting_batch"):
+            # Depends on when the user resumes or the provider answers
+            return {"elapsed_seconds": round(elapsed, 1), "remaining_seconds": None, "eta": None, "percent": None}
+
+        share = llm_scheduler.expected_share(job_id)
+        guessed = self.model.cases_for(clock.content_size)
+        channel = event_hub.get(job_id)
+        progress = channel.state["progress"] if channel else {}
+        remaining = 0.0
+        for stage in STAGES:
+            if stage in clock.durations:
+                continue
+            size = clock.content_size if stage == "ingest" else clock.sizes.get(stage, guessed)
+            predicted = self.model.predict(stage, size) / (share if stage in LLM_STAGES else 1.0)
+            if stage != clock.stage:
+                remaining += predicted
+                continue
+            spent = now - clock.stage_started
+            left = max(predicted - spent, 0.0)
+            counter = progress.get(stage)
+            if counter and counter["total"] and counter["done"]:
+                # Trust the live rate more as the stage advances
+                done = counter["done"] / counter["total"]
+                live = spent * (1 - done) / done
+                left = done * live + (1 - done) * left
+            remaining += left
+
+        return {
+            "elapsed_seconds": round(elapsed, 1),
+            "remaining_seconds": round(remaining, 1),
+            "eta": (datetime.now(timezone.utc) + timedelta(seconds=remaining)).isoformat(timespec="seconds"),
+            "percent": round(elapsed / (elapsed + remaining) * 100, 1) if elapsed + remaining > 0 else 100.0,
+            "llm_share": round(share, 3),
+            "history_jobs": max((len(s) for s in self.model.samples.values()), default=0),
+        }
+
+    async def finish(self, job_id: str, cases: int, usage: Optional[Dict[str, Any]], learn: bool = True) -> Optional[Dict[str, Any]]:
+        """
+        Record a completed job: its stage timings always go into the rollup tables, flagged
+        with `learn`; only learned ones feed the model, now and on the next start (jobs that
+        were paused or ran offline would skew it). Returns the predicted and actual runtime.
+        """
+        clock = self.clocks.get(job_id)
+        if clock is None:
+            return None
+        actual = time.monotonic() - clock.started
+        stage_tokens = (usage or {}).get("stages") or {}
+        samples = {
+            stage: StageSample(clock.content_size if stage == "ingest" else clock.sizes.get(stage, cases), seconds,
+                               (stage_tokens.get(stage) or {}).get("total_tokens", 0))
+            for stage, seconds in clock.durations.items()
+        }
+        if learn:
+            for stage, sample in samples.items():
+                self.model.add(stage, sample)
+            if clock.content_size and cases:
+                self.model.bytes_per_case.append(clock.content_size / cases)
+
+        completed_at = datetime.utcnow()
+        try:
+            async with AsyncSessionLocal() as session:
+                session.add_all([
+                    StageRollup(
+                        job_id=job_id, completed_at=completed_at, stage=stage, size=int(s.size), seconds=s.seconds,
+                        tokens=s.tokens, learned=learn,
+                    )
+                    for stage, s in samples.items()
+                ])
+                session.add(RuntimeRollup(
+                    job_id=job_id, completed_at=completed_at, total_cases=cases, content_size=clock.content_size,
+                    predicted_seconds=clock.predicted, actual_seconds=actual,
+                ))
+                await session.commit()
+        except Exception as e:
+            # Capacity data is best-effort; never fail the job because of it
+            logger.error(f"Failed to write stage throughput for job {job_id}: {e}")
+        return {
+            "predicted_seconds": round(clock.predicted, 1) if clock.predicted is not None else None,
+            "actual_seconds": round(actual, 1),
+        }
+
+    def close(self, job_id: str) -> None:
+        self.clocks.pop(job_id, None)
+
+    async def capacity(self, limit: int = 100) -> Dict[str, Any]:
+        """Current per-stage throughput and predicted vs. actual runtime of recent jobs."""
+        async with AsyncSessionLocal() as session:
+            rows = (await session.execute(
+                select(RuntimeRollup).order_by(RuntimeRollup.completed_at.desc()).limit(limit)
+            )).scalars().all()
+        jobs = [
+            {
+                "job_id": r.job_id,
+                "completed_at": r.completed_at.isoformat(),
+                "total_cases": r.total_cases,
+                "content_size": r.content_size,
+                "predicted_seconds": r.predicted_seconds,
+                "actual_seconds": round(r.actual_seconds, 1),
+                "error_percent": round((r.predicted_seconds - r.actual_seconds) / r.actual_seconds * 100, 1)
+                if r.predicted_seconds is not None and r.actual_seconds else None,
+            }
+            for r in rows
+        ]
+        return {"stages": self.model.rates(), "jobs": jobs}
+
+eta_service = EtaService()
@@ -0,0 +1,193 @@
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger("job_events")
+
+# Pipeline stages in execution order, with the labels shown to users
+STAGES = {
+    "ingest": "解析 Excel",
+    "tagging": "模块打标",
+    "audit": "结果审计",
+    "extraction": "缺陷提取",
+    "stats": "统计计算",
+    "report": "聚类与报告",
+}
+TERMINAL_STATUSES = ("completed", "failed", "cancelled")
+
+
+def encode_sse(event_id: int, event_type: str, data: Dict[str, Any]) -> str:
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class JobChannel:
+    """
+    Event log of a single job. The pipeline is the only producer; every viewer reads the
+    same pre-encoded events from a bounded buffer, so adding viewers adds no producer work.
+    """
+
+    def __init__(self, job_id: str, logs: List[str], buffer_size: int):
+        self.job_id = job_id
+        self.logs = logs
+        self.events: Deque[Tuple[int, str]] = deque(maxlen=buffer_size)
+        self.last_id = 0
+        self.state: Dict[str, Any] = {
+            "status": "pending",
+            "stage": None,
+            "progress": {},
+            "report_url": None,
+            "error": None,
+        }
+        self._wakeup = asyncio.Event()
+        self._last_progress_at: Dict[str, float] = {}
+        self.closed_at: Optional[float] = None
+
+    @property
+    def closed(self) -> bool:
+        return self.state["status"] in TERMINAL_STATUSES
+
+    def publish(self, event_type: str, data: Dict[str, Any]) -> int:
+        self.last_id += 1
+        self.events.append((self.last_id, encode_sse(self.last_id, event_type, data)))
+        # Wake every waiting viewer at once, then arm a fresh event for the next round
+        wakeup, self._wakeup = self._wakeup, asyncio.Event()
+        wakeup.set()
+        return self.last_id
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {**self.state, "job_id": self.job_id, "logs": list(self.logs)}
+
+    def progress_report(self) -> Dict[str, Dict[str, Any]]:
+        """Per-stage counters with completion percentages."""
+        return {
+            stage: {**counter, "percent": round(counter["done"] / counter["total"] * 100, 1) if counter["total"] else 100.0}
+            for stage, counter in self.state["progress"].items()
+        }
+
+    def since(self, last_event_id: int) -> Tuple[List[str], bool]:
+        """Encoded events after `last_event_id`; the flag is False if some were already evicted."""
+        if not self.events or last_event_id >= self.last_id:
+            return [], True
+        first_id = self.events[0][0]
+        if last_event_id < first_id - 1:
+            return [], False
+        return [encoded for event_id, encoded in self.events if event_id > last_event_id], True
+
+    async def subscribe(self, last_event_id: Optional[int] = None) -> AsyncIterator[str]:
+        """
+        Yield encoded SSE frames. A fresh viewer (or one whose cursor fell out of the buffer)
+        first gets a snapshot of the whole job state; heartbeat comments keep proxies from
+        closing idle connections. The stream ends once the job is finished and drained.
+        """
+        if last_event_id is None or last_event_id > self.last_id:
+            cursor = self.last_id
+            yield encode_sse(cursor, "snapshot", self.snapshot())
+        else:
+            cursor = last_event_id
+
+        while True:
+            wakeup = self._wakeup
+            frames, complete = self.since(cursor)
+            if complete:
+                for frame in frames:
+                    yield frame
+            else:
+                # The viewer fell behind the buffer: resync from the current state instead
+                yield encode_sse(self.last_id, "snapshot", self.snapshot())
+            cursor = self.last_id
+            if self.closed:
+                return
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=settings.JOB_EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+
+
+class EventHub:
+    """
+    Registry of job channels; the pipeline publishes here and the SSE endpoint subscribes.
+    Channels of finished jobs stay for JOB_EVENTS_RETENTION_SECONDS so late viewers can still
+    replay the end of the job; expired channels are dropped whenever a job opens or finishes.
+    """
+
+    def __init__(self):
+        self.channels: Dict[str, JobChannel] = {}
+
+    def open(self, job_id: str, logs: List[str]) -> JobChannel:
+        self.evict_finished()
+        channel = JobChannel(job_id, logs, settings.JOB_EVENTS_BUFFER)
+        self.channels[job_id] = channel
+        return channel
+
+    def evict_finished(self, now: Optional[float] = None) -> int:
+        """Drop channels whose job finished more than the retention period ago."""
+        cutoff = (time.monotonic() if now is None else now) - settings.JOB_EVENTS_RETENTION_SECONDS
+        expired = [
+            job_id for job_id, channel in self.channels.items()
+            if channel.closed and channel.closed_at is not None and channel.closed_at <= cutoff
+        ]
+        for job_id in expired:
+            del self.channels[job_id]
+        return len(expired)
+
+    def get(self, job_id: str) -> Optional[JobChannel]:
+        return self.channels.get(job_id)
+
+    def log(self, job_id: str, message: str) -> None:
+        channel = self.channels.get(job_id)
+        if channel:
+            channel.publish("log", {"index": len(channel.logs) - 1, "message": message})
+
+    def status(self, job_id: str, status: str, **fields: Any) -> None:
+        channel = self.channels.get(job_id)
+        if not channel:
+            return
+        channel.state.update(status=status, **fields)
+        channel.closed_at = time.monotonic() if channel.closed else None
+        if channel.closed:
+            self.evict_finished()
+        channel.publish("status", {"status": status, **fields})
+
+    def stage(self, job_id: str, stage: str, total: Optional[int] = None) -> None:
+        channel = self.channels.get(job_id)
+        if not channel:
+            return
+        # Closing the previous stage marks its counter complete
+        previous = channel.state["stage"]
+        if previous and previous in channel.state["progress"]:
+            self._set_progress(channel, previous, done=channel.state["progress"][previous]["total"], force=True)
+        channel.state["stage"] = stage
+        stage_names = list(STAGES)
+        channel.publish("stage", {
+            "stage": stage,
+            "label": STAGES.get(stage, stage),
+            "index": stage_names.index(stage) + 1 if stage in STAGES else None,
+            "total_stages": len(STAGES),
+        })
+        if total is not None:
+            self._set_progress(channel, stage, done=0, total=total, force=True)
+
+    def advance(self, job_id: str, stage: str, n: int = 1) -> None:
+        channel = self.channels.get(job_id)
+        if not channel or stage not in channel.state["progress"]:
+            return
+        counter = channel.state["progress"][stage]
+        self._set_progress(channel, stage, done=min(counter["done"] + n, counter["total"]))
+
+    def _set_progress(self, channel: JobChannel, stage: str, done: int, total: Optional[int] = None, force: bool = False) -> None:
+        counter = channel.state["progress"].setdefault(stage, {"done": 0, "total": 0})
+        counter["done"] = done
+        if total is not None:
+            counter["total"] = total
+        # Coalesce bursts of per-batch updates; the final count is always published
+        now = time.monotonic()
+        if not force and counter["done"] < counter["total"] and now - channel._last_progress_at.get(stage, 0.0) < settings.JOB_EVENTS_PROGRESS_INTERVAL:
+            return
+        channel._last_progress_at[stage] = now
+        channel.publish("progress", {"stage": stage, **counter})
+
+event_hub = EventHub()
@@ -0,0 +1,41 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional, Tuple
+from app.core.metrics import STAGE_DURATION
+from app.core.tracing import span
+from app.services.jobs.eta import eta_service
+from app.services.jobs.events import event_hub
+
+# (job_id, stage) of the pipeline stage running in the current task.
+# Services call `advance()` without knowing which job they work for; tasks spawned
+# inside the stage (asyncio.gather etc.) inherit the context.
+_current: ContextVar[Optional[Tuple[str, str]]] = ContextVar("job_stage", default=None)
+
+
+@contextmanager
+def stage_progress(job_id: str, stage: str, total: Optional[int] = None) -> Iterator[None]:
+    event_hub.stage(job_id, stage, total)
+    eta_service.stage_started(job_id, stage)
+    token = _current.set((job_id, stage))
+    started = time.perf_counter()
+    try:
+        with span(f"stage.{stage}", job_id=job_id, stage=stage, items=total):
+            yield
+        # Only stages that ran to completion are timed for the ETA model
+        eta_service.stage_finished(job_id, stage, time.perf_counter() - started)
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - started, stage=stage)
+        _current.reset(token)
+
+
+def current_stage() -> Tuple[Optional[str], str]:
+    """(job_id, stage) of the running stage, or (None, "other") outside the pipeline."""
+    return _current.get() or (None, "other")
+
+
+def advance(n: int = 1) -> None:
+    """Count `n` more items of the current stage as done (no-op outside a job stage)."""
+    current = _current.get()
+    if current and n:
+        event_hub.advance(current[0], current[1], n)
@@ -0,0 +1,115 @@
+import hashlib
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+from app.models.testcase import TestCase
+from app.models.defect import DefectAnalysis, DefectCluster
+from app.services.report_gen.sidecar import DEFECT_FIELDS, SidecarReader
+from app.core.logging import get_logger
+
+logger = get_logger("revision")
+
+# Source fields that feed the analysis; a row whose fingerprint is unchanged keeps its results
+FINGERPRINT_FIELDS = [
+    "case_name", "precondition", "steps", "expected", "actual", "test_result",
+    "priority", "executor", "remark",
+]
+
+# Analysis results copied forward from the base job for unchanged rows
+CARRIED_FIELDS = ["module", "module_confidence", "normalized_result", "audit_status", "audit_reason"]
+
+
+def fingerprint(values: Mapping[str, Any]) -> str:
+    digest = hashlib.sha1()
+    for field in FINGERPRINT_FIELDS:
+        value = values.get(field)
+        digest.update(("" if value is None else str(value).strip()).encode("utf-8"))
+        digest.update(b"\x1f")
+    return digest.hexdigest()
+
+
+class RevisionDiff:
+    def __init__(self):
+        self.unchanged: List[Tuple[TestCase, Dict[str, Any]]] = [] # (new case, base record)
+        self.dirty: List[TestCase] = [] # Added or changed rows
+        self.removed = 0
+
+
+class RevisionService:
+    """
+    Diff a revised workbook against a completed base job and carry the base analysis forward
+    for unchanged rows, so only added or changed rows go through the LLM stages again.
+    """
+
+    def load_base(self, data_dir: str) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        reader = SidecarReader(data_dir)
+        if not reader.exists():
+            raise FileNotFoundError(data_dir)
+        return list(reader.iter_cases()), reader.clusters()
+
+    def diff(self, cases: List[TestCase], base_records: List[Dict[str, Any]]) -> RevisionDiff:
+        """
+        Match rows by (source_sheet, source_row) plus fingerprint; rows that only moved
+        (e.g. after an insertion above them) are matched by fingerprint alone.
+        """
+        by_position = {(r.get("source_sheet"), r.get("source_row")): r for r in base_records}
+        by_fingerprint: Dict[str, List[Dict[str, Any]]] = {}
+        for r in base_records:
+            by_fingerprint.setdefault(fingerprint(r), []).append(r)
+
+        result = RevisionDiff()
+        used = set()
+        pending = []
+        for case in cases:
+            fp = fingerprint(vars(case))
+            record = by_position.get((case.source_sheet, case.source_row))
+            if record is not None and id(record) not in used and fingerprint(record) == fp:
+                used.add(id(record))
+                result.unchanged.append((case, record))
+            else:
+                pending.append((case, fp))
+
+        for case, fp in pending:
+            record = next((r for r in by_fingerprint.get(fp, []) if id(r) not in used), None)
+            if record is not None:
+                used.add(id(record))
+                result.unchanged.append((case, record))
+            else:
+                result.dirty.append(case)
+
+        result.removed = len(base_records) - len(used)
+        return result
+
+    def carry_forward(
+        self,
+        diff: RevisionDiff,
+        base_clusters: List[Dict[str, Any]],
+        job_id: str,
+    ) -> List[DefectCluster]:
+        """
+        Copy module, audit verdict and defect analysis from the base records onto the
+        unchanged cases. Returns the base clusters (recreated for the new job) that still
+        have at least one defect.
+        """
+        clusters: Dict[int, DefectCluster] = {}
+        for case, record in diff.unchanged:
+            for field in CARRIED_FIELDS:
+                setattr(case, field, record.get(field))
+            defect = record.get("defect")
+            if not defect:
+                case.defect_analysis = None
+                continue
+            analysis = DefectAnalysis(job_id=job_id, **{f: defect.get(f) for f in DEFECT_FIELDS})
+            index = record.get("cluster")
+            if index is not None and index < len(base_clusters):
+                if index not in clusters:
+                    data = base_clusters[index]
+                    clusters[index] = DefectCluster(
+                        job_id=job_id,
+                        cluster_name=data["cluster_name"],
+                        summary=data.get("summary"),
+                        risk_assessment=data.get("risk_assessment"),
+                    )
+                analysis.cluster = clusters[index]
+            case.defect_analysis = analysis
+        return [clusters[i] for i in sorted(clusters)]
+
+revision_service = RevisionService()
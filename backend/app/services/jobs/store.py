@@ -0,0 +1,91 @@
+import os
+from datetime import datetime
+from typing import Any, List, Optional
+from sqlalchemy import select, update
+from app.db.session import AsyncSessionLocal
+from app.models.job import Job
+from app.core.logging import get_logger
+
+logger = get_logger("job_store")
+
+
+def report_path_for(job_id: str) -> str:
+    return os.path.join("reports", f"report_{job_id}.html")
+
+
+class JobStore:
+    """
+    Persistent job records. The pipeline keeps its live state in memory; this table is what
+    survives restarts (content-hash dedup, disk-budget eviction). Writes are best-effort.
+    """
+
+    async def create(
+        self,
+        job_id: str,
+        filename: str,
+        sha256: str,
+        size: int,
+        source_hashes: Optional[List[str]] = None,
+        token_budget: Optional[int] = None,
+    ) -> None:
+        now = datetime.utcnow()
+        try:
+            async with AsyncSessionLocal() as session:
+                session.add(Job(
+                    id=job_id,
+                    status="pending",
+                    source_filename=filename,
+                    content_sha256=sha256,
+                    content_size=size,
+                    source_hashes=source_hashes,
+                    token_budget=token_budget,
+                    created_at=now,
+                    last_used_at=now,
+                ))
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Failed to record job {job_id}: {e}")
+
+    async def update(self, job_id: str, **fields: Any) -> None:
+        try:
+            async with AsyncSessionLocal() as session:
+                await session.execute(update(Job).where(Job.id == job_id).values(**fields))
+                await session.commit()
+        except Exception as e:
+            logger.error(f"Failed to update job {job_id}: {e}")
+
+    async def get(self, job_id: str) -> Optional[Job]:
+        async with AsyncSessionLocal() as session:
+            return await session.get(Job, job_id)
+
+    async def find_completed_by_hash(self, sha256: str) -> Optional[Job]:
+        """Most recent completed job for this workbook content whose report is still on disk."""
+        try:
+            async with AsyncSessionLocal() as session:
+                jobs = (await session.execute(
+                    select(Job)
+                    .where(Job.content_sha256 == sha256, Job.status == "completed")
+                    .order_by(Job.completed_at.desc())
+                )).scalars().all()
+        except Exception as e:
+            logger.error(f"Job lookup by content hash failed: {e}")
+            return None
+        for job in jobs:
+            if os.path.isfile(report_path_for(job.id)):
+                return job
+        return None
+
+    async def list_evictable(self) -> List[Job]:
+        """Finished jobs, least recently used first."""
+        async with AsyncSessionLocal() as session:
+            return list((await session.execute(
+                select(Job)
+                .where(Job.status.in_(("completed", "failed", "cancelled")))
+                .order_by(Job.last_used_at)
+            )).scalars().all())
+
+    async def known_ids(self) -> set:
+        async with AsyncSessionLocal() as session:
+            return set((await session.execute(select(Job.id).where(Job.status != "evicted"))).scalars().all())
+
+job_store = JobStore()
@@ -0,0 +1,144 @@
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core.tracing import span
+from app.services.jobs.progress import advance
+from app.services.llm.offline import gather
+from app.services.llm.usage import LLMUnavailable
+
+logger = get_logger("llm_batching")
+
+_ALPHABET = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def encode_key(ordinal: int) -> str:
+    """Encode a per-job ordinal as a compact base36 key to save prompt tokens."""
+    if ordinal < 0:
+        raise ValueError(f"ordinal must be non-negative, got {ordinal}")
+    if ordinal == 0:
+        return "0"
+    digits = []
+    while ordinal:
+        ordinal, rem = divmod(ordinal, 36)
+        digits.append(_ALPHABET[rem])
+    return "".join(reversed(digits))
+
+
+def case_key(case: Any) -> str:
+    if getattr(case, "ordinal", None) is None:
+        raise ValueError("Case has no ordinal; ordinals are assigned at ingest")
+    return encode_key(case.ordinal)
+
+
+class RoundTripOutcome:
+    def __init__(self, matched: List[Any], requeue: List[Any]):
+        self.matched = matched
+        self.requeue = requeue
+
+
+class BatchRoundTrip:
+    """
+    Map a batch LLM response back to its items by ordinal key in O(n).
+    Items whose key is missing, duplicated or fails validation are collected in `requeue`
+    instead of being silently defaulted.
+    """
+
+    def __init__(self, batch: Sequence[Any], key_field: str = "k"):
+        self.batch = list(batch)
+        self.key_field = key_field
+        self.by_key: Dict[str, Any] = {case_key(item): item for item in self.batch}
+        if len(self.by_key) != len(self.batch):
+            raise ValueError("Items in a batch must carry unique ordinals")
+
+    def keys(self) -> List[str]:
+        return list(self.by_key.keys())
+
+    def map_results(
+        self,
+        results: Any,
+        validate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    ) -> RoundTripOutcome:
+        seen: Dict[str, Dict[str, Any]] = {}
+        duplicated = set()
+        unknown = 0
+
+        for res in results if isinstance(results, list) else []:
+            if not isinstance(res, dict):
+                continue
+            key = str(res.get(self.key_field, "")).strip().lower()
+            if key not in self.by_key:
+                unknown += 1
+                continue
+            if key in seen:
+                duplicated.add(key)
+                continue
+            seen[key] = res
+
+        matched = []
+        requeue = []
+        for key, item in self.by_key.items():
+            res = seen.get(key)
+            if res is None or key in duplicated or (validate and not validate(res)):
+                requeue.append(item)
+            else:
+                matched.append((item, res))
+
+        if unknown or duplicated:
+            logger.warning(f"Batch round-trip: {unknown} unknown keys, {len(duplicated)} duplicated keys.")
+        return RoundTripOutcome(matched, requeue)
+
+
+async def run_batched_round_trips(
+    items: Sequence[Any],
+    batch_size: int,
+    call: Callable[[BatchRoundTrip], Awaitable[Any]],
+    apply: Callable[[Any, Dict[str, Any]], None],
+    validate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    max_rounds: Optional[int] = None,
+) -> List[Any]:
+    """
+    Run `call` concurrently over batches of `items`, apply every matched result and
+    re-queue items whose result was missing, duplicated or invalid.
+    Returns the items that were still unresolved after `max_rounds` rounds.
+    """
+    max_rounds = settings.LLM_BATCH_MAX_ROUNDS if max_rounds is None else max_rounds
+    pending = list(items)
+
+    for round_no in range(1, max_rounds + 1):
+        if not pending:
+            break
+
+        trips = [BatchRoundTrip(pending[i:i + batch_size]) for i in range(0, len(pending), batch_size)]
+        responses = await gather(*(_traced_call(call, trip, round_no) for trip in trips), return_exceptions=True)
+
+        next_pending = []
+        refused: Optional[LLMUnavailable] = None
+        for trip, response in zip(trips, responses):
+            if isinstance(response, LLMUnavailable):
+                refused = response
+                next_pending.extend(trip.batch)
+                continue
+            if isinstance(response, Exception):
+                logger.error(f"Batch call failed (round {round_no}): {response}")
+                next_pending.extend(trip.batch)
+                continue
+            outcome = trip.map_results(response, validate)
+            for item, res in outcome.matched:
+                apply(item, res)
+            advance(len(outcome.matched))
+            next_pending.extend(outcome.requeue)
+
+        if refused is not None:
+            # Further rounds would be refused as well
+            logger.warning(f"Round {round_no}: LLM calls refused ({refused.cause}), {len(next_pending)} items left unresolved.")
+            return next_pending
+        if next_pending:
+            logger.info(f"Round {round_no}: re-queueing {len(next_pending)}/{len(pending)} items.")
+        pending = next_pending
+
+    return pending
+
+
+async def _traced_call(call: Callable[[BatchRoundTrip], Awaitable[Any]], trip: BatchRoundTrip, round_no: int) -> Any:
+    with span("llm.batch", batch_size=len(trip.batch), round=round_no):
+        return await call(trip)
@@ -1,19 +1,106 @@
 import json
+import time
 import asyncio
-from typing import Any, Dict, Optional, Type
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional, Type
+import httpx
 from zhipuai import ZhipuAI
 from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 from app.core.config import settings
 from app.core.logging import get_logger
+from app.core import metrics
+from app.core.tracing import Span, activate, current_span, finish, span, start_span
+from app.services.jobs.progress import current_stage
+from app.services.llm.offline import current_round
+from app.services.llm.profiles import ModelProfile, profile_router
+from app.services.llm.scheduler import llm_scheduler
+from app.services.llm.resilience import CircuitOpen, Deadline, DeadlineExceeded, hedge_policy, llm_breaker
+from app.services.llm.usage import LLMUnavailable, usage_tracker
 from pydantic import BaseModel
 
 logger = get_logger("llm_client")
 
+# Worker threads of in-flight calls. A call keeps its slot until its thread returns, except for
+# calls of cancelled jobs, which hand their slots back at once; the spare threads let the next
+# calls start while those requests run out. The default executor (cpu_count + 4) would cap
+# concurrency below LLM_CONCURRENCY on small hosts and be starved by stuck requests.
+llm_executor = ThreadPoolExecutor(max_workers=settings.LLM_CONCURRENCY * 2, thread_name_prefix="llm")
+
+
+@asynccontextmanager
+async def llm_slot(job_id: Optional[str], stage: str, s: Span, profile: Optional[str] = None) -> AsyncIterator[None]:
+    """
+    Wait for the scheduler to grant the job a slot, recording queue depth, queue wait
+    and in-flight calls.
+    """
+    metrics.LLM_QUEUE_DEPTH.observe(metrics.LLM_QUEUE_DEPTH_NOW.inc() - 1)
+    started = time.perf_counter()
+    try:
+        job = await llm_scheduler.acquire(job_id, profile)
+    finally:
+        metrics.LLM_QUEUE_DEPTH_NOW.dec()
+    waited = time.perf_counter() - started
+    metrics.LLM_QUEUE_WAIT.observe(waited, stage=stage)
+    s.set(queue_wait_ms=round(waited * 1000, 1))
+    metrics.LLM_INFLIGHT.observe(metrics.LLM_INFLIGHT_NOW.inc())
+    try:
+        yield
+    finally:
+        metrics.LLM_INFLIGHT_NOW.dec()
+        llm_scheduler.release(job, profile)
+
+
+def _discard_outcome(worker: asyncio.Future) -> None:
+    if not worker.cancelled():
+        worker.exception() # Outcome already recorded by the worker
+
+
+def _on_response(response: httpx.Response) -> None:
+    # Runs for every HTTP attempt, including the SDK's own retries of 429 and 5xx answers
+    metrics.LLM_HTTP.inc(status=str(response.status_code))
+    if response.status_code == 429:
+        metrics.LLM_RATE_LIMITED.inc(stage=current_stage()[1])
+        s = current_span()
+        if s:
+            s.add("rate_limited")
+
+
+def _record_usage(usage: Any) -> None:
+    job_id, stage = current_stage()
+    prompt, completion = usage.prompt_tokens or 0, usage.completion_tokens or 0
+    usage_tracker.record(job_id, stage, prompt, completion)
+    metrics.LLM_TOKENS.inc(prompt, stage=stage, kind="prompt")
+    metrics.LLM_TOKENS.inc(completion, stage=stage, kind="completion")
+    s = current_span()
+    if s:
+        s.add("prompt_tokens", prompt)
+        s.add("completion_tokens", completion)
+
+
 class LLMClient:
     def __init__(self):
-        self.client = ZhipuAI(api_key=settings.LLM_API_KEY)
-        self.model = settings.LLM_MODEL
-        self.total_tokens = 0
+        # Same timeout and pool limits as the SDK defaults, plus a hook counting every HTTP response
+        http_client = httpx.Client(
+            timeout=httpx.Timeout(timeout=300.0, connect=8.0),
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=10),
+            event_hooks={"response": [_on_response]},
+        )
+        self.client = ZhipuAI(api_key=settings.LLM_API_KEY, base_url=settings.LLM_BASE_URL, http_client=http_client)
+        # Async calls retry within their deadline themselves; the SDK's own retries (3 per call,
+        # each with the full timeout) would run past it
+        self.attempt_client = ZhipuAI(api_key=settings.LLM_API_KEY, base_url=settings.LLM_BASE_URL, http_client=http_client, max_retries=0)
+        self.model = settings.LLM_MODEL # Default profile; call sites pick theirs (see llm/profiles.py)
+        self.total_tokens = 0 # Process-wide; per-job usage is kept by usage_tracker
+        self._tokens_lock = threading.Lock()
+
+    def _add_tokens(self, usage: Any) -> None:
+        # Called from worker threads
+        with self._tokens_lock:
+            self.total_tokens += usage.total_tokens
+        _record_usage(usage)
         
     def _clean_json_string(self, content: str) -> str:
         """
@@ -75,22 +162,42 @@ class LLMClient:
         self, 
         messages: list, 
         response_format: Optional[Type[BaseModel]] = None,
-        temperature: float = settings.LLM_TEMPERATURE
+        temperature: Optional[float] = None,
+        profile: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        p = profile_router.get(profile)
+        s = current_span()
+        if s:
+            s.add("attempts")
+            if s.attributes["attempts"] > 1:
+                metrics.LLM_RETRIES.inc(stage=current_stage()[1])
+        return self._complete(self.client, messages, response_format, temperature, p, p.timeout)
+
+    def _complete(
+        self,
+        client: ZhipuAI,
+        messages: list,
+        response_format: Optional[Type[BaseModel]],
+        temperature: Optional[float],
+        p: ModelProfile,
+        timeout: float,
     ) -> Dict[str, Any]:
+        """One request (plus whatever retries `client` makes itself), parsed."""
         try:
             kwargs = {
-                "model": self.model,
+                "model": p.model,
                 "messages": messages,
-                "temperature": temperature,
-                "max_tokens": settings.LLM_MAX_TOKENS,
+                "temperature": p.temperature if temperature is None else temperature,
+                "max_tokens": p.max_tokens,
+                "timeout": timeout,
             }
             
             # logger.debug(f"Calling LLM with messages: {messages}")
-            response = self.client.chat.completions.create(**kwargs)
+            response = client.chat.completions.create(**kwargs)
             
             # Track tokens
             if hasattr(response, 'usage') and response.usage:
-                self.total_tokens += response.usage.total_tokens
+                self._add_tokens(response.usage)
                 
             content = response.choices[0].message.content
             
@@ -106,20 +213,266 @@ class LLMClient:
 
         except Exception as e:
             logger.error(f"LLM Call failed: {e}")
+            metrics.LLM_ERRORS.inc(stage=current_stage()[1], error=type(e).__name__)
             raise e
 
     async def achat_completion(
         self, 
         messages: list, 
         response_format: Optional[Type[BaseModel]] = None,
-        temperature: float = settings.LLM_TEMPERATURE
+        temperature: Optional[float] = None,
+        profile: Optional[str] = None,
     ) -> Dict[str, Any]:
-        """Async wrapper for chat_completion using asyncio.to_thread"""
-        return await asyncio.to_thread(
-            self.chat_completion, 
-            messages=messages, 
-            response_format=response_format, 
-            temperature=temperature
-        )
+        """
+        Async chat completion. `profile` names the call site's model profile (model, max_tokens,
+        temperature, timeout, deadline, concurrency share). Attempts are retried within the
+        profile's deadline, slow attempts of hedgeable profiles get a duplicate request, and
+        calls fail fast with CircuitOpen while the provider is down.
+        """
+        round_ = current_round()
+        if round_ is not None:
+            # Offline job: answered from a provider batch file (see llm/offline.py)
+            return await round_.request(messages, response_format, temperature, profile)
+        job_id, stage = current_stage()
+        p = profile_router.get(profile)
+        metrics.LLM_ROUTED.inc(profile=profile or "default", model=p.model)
+        with span("llm.chat", job_id=job_id, stage=stage, profile=profile or "default", model=p.model) as s:
+            started = time.perf_counter()
+            try:
+                result = await self._call_with_retries(messages, response_format, temperature, profile, p, s)
+            except LLMUnavailable as e:
+                metrics.LLM_REQUESTS.inc(stage=stage, outcome="refused")
+                if isinstance(e, CircuitOpen):
+                    metrics.LLM_BREAKER_REJECTED.inc(stage=stage)
+                usage = usage_tracker.get(job_id)
+                if usage is not None:
+                    usage.note_refused(e.cause)
+                raise
+            except Exception:
+                metrics.LLM_REQUESTS.inc(stage=stage, outcome="error")
+                raise
+            finally:
+                latency = time.perf_counter() - started
+                metrics.LLM_LATENCY.observe(latency, stage=stage)
+                metrics.LLM_PROFILE_LATENCY.observe(latency, profile=profile or "default", model=p.model)
+                s.set(latency_ms=round(latency * 1000, 1), retries=s.attributes.get("attempts", 1) - 1)
+            metrics.LLM_REQUESTS.inc(stage=stage, outcome="ok")
+            return result
+
+    async def _call_with_retries(self, messages, response_format, temperature, profile, p: ModelProfile, s: Span) -> Any:
+        stage = current_stage()[1]
+        deadline = Deadline(p.deadline)
+        for attempt in range(1, settings.LLM_MAX_RETRIES + 2):
+            s.add("attempts")
+            if attempt > 1:
+                metrics.LLM_RETRIES.inc(stage=stage)
+            try:
+                return await self._hedged(messages, response_format, temperature, profile, p, s, deadline)
+            except LLMUnavailable:
+                raise
+            except DeadlineExceeded:
+                metrics.LLM_DEADLINE_EXCEEDED.inc(stage=stage)
+                raise
+            except Exception:
+                if attempt > settings.LLM_MAX_RETRIES:
+                    raise
+                # Same backoff as the sync path (2, 2, 4 ... 10 s), but never past the deadline
+                wait = min(max(2 ** (attempt - 1), 2), 10)
+                if deadline.remaining() <= wait:
+                    metrics.LLM_DEADLINE_EXCEEDED.inc(stage=stage)
+                    raise
+                await asyncio.sleep(wait)
+
+    async def _hedged(self, messages, response_format, temperature, profile, p: ModelProfile, s: Span, deadline: Deadline) -> Any:
+        """
+        One attempt. If it is still in flight after the profile's hedge delay (a high quantile
+        of its recent latencies), a duplicate is sent and the first success wins.
+        """
+        name = profile or "default"
+        if not (p.hedge and settings.LLM_HEDGE_ENABLED):
+            return await self._attempt(messages, response_format, temperature, profile, p, s, deadline)
+
+        hedge_policy.count()
+        in_flight = asyncio.Event()
+        primary = asyncio.ensure_future(self._attempt(messages, response_format, temperature, profile, p, s, deadline, in_flight))
+        tasks = {primary}
+        try:
+            # The hedge delay counts from when the attempt got a slot, not from when it queued
+            waiter = asyncio.ensure_future(in_flight.wait())
+            try:
+                await asyncio.wait({primary, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                waiter.cancel()
+            began = time.monotonic()
+            while not primary.done():
+                # Re-read: a stage's calls start in a burst, before any of them gave a sample
+                delay = hedge_policy.delay(name)
+                elapsed = time.monotonic() - began
+                if delay is None or elapsed < delay:
+                    await asyncio.wait({primary}, timeout=1.0 if delay is None else max(0.05, delay - elapsed))
+                elif llm_scheduler.saturated(profile):
+                    # A duplicate queued behind other calls would not help
+                    await asyncio.wait({primary}, timeout=0.1)
+                else:
+                    break
+            if primary.done() or deadline.remaining() <= 0 or not hedge_policy.allow():
+                return await primary
+
+            hedge = asyncio.ensure_future(self._attempt(messages, response_format, temperature, profile, p, s, deadline))
+            tasks.add(hedge)
+            metrics.LLM_HEDGES.inc(profile=name, outcome="sent")
+            s.add("hedges")
+            error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if t.exception() is None:
+                        if t is hedge:
+                            metrics.LLM_HEDGES.inc(profile=name, outcome="won")
+                            s.set(hedge_won=True)
+                        return t.result()
+                    error = error or t.exception()
+            raise error
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    async def _attempt(
+        self, messages, response_format, temperature, profile, p: ModelProfile, s: Span, deadline: Deadline,
+        in_flight: Optional[asyncio.Event] = None,
+    ) -> Any:
+        job_id, stage = current_stage()
+        llm_breaker.check()
+        async with llm_slot(job_id, stage, s, profile):
+            with usage_tracker.reservation(job_id, messages):
+                deadline.start()
+                remaining = deadline.remaining()
+                if remaining <= 0:
+                    raise DeadlineExceeded(f"LLM call ran out of its {p.deadline:.0f}s deadline")
+                llm_breaker.before_call()
+                if in_flight is not None:
+                    in_flight.set()
+                # Run in a copy of the context, so the worker sees this span and stage
+                worker = asyncio.get_running_loop().run_in_executor(
+                    llm_executor, contextvars.copy_context().run,
+                    self._timed_attempt, messages, response_format, temperature, profile, p, min(p.timeout, remaining),
+                )
+                try:
+                    return await asyncio.shield(worker)
+                except asyncio.CancelledError:
+                    if llm_scheduler.cancelled(job_id):
+                        # The job was cancelled: free the slot now, the request runs out unobserved
+                        worker.add_done_callback(_discard_outcome)
+                        raise
+                    # A losing hedge or a cancelled caller. The worker thread cannot be interrupted,
+                    # so the slot stays taken until its request returns (bounded by the attempt timeout).
+                    await asyncio.wait({worker})
+                    if not worker.cancelled():
+                        worker.exception() # Outcome already recorded by the worker
+                    raise
+
+    def _timed_attempt(self, messages, response_format, temperature, profile, p: ModelProfile, timeout: float) -> Any:
+        # Runs in a worker thread; feeds the circuit breaker and the hedge delay
+        started = time.perf_counter()
+        try:
+            result = self._complete(self.attempt_client, messages, response_format, temperature, p, timeout)
+        except Exception as e:
+            llm_breaker.record_failure(e)
+            raise
+        llm_breaker.record_success()
+        hedge_policy.observe(profile or "default", time.perf_counter() - started)
+        return result
+
+    async def astream_chat_completion(
+        self,
+        messages: list,
+        temperature: Optional[float] = None,
+        profile: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """
+        Stream a completion as text deltas. The SDK stream is consumed in a worker thread
+        and handed to the event loop through a queue, so the loop never blocks on it. If the
+        consumer stops early (timeout, cancellation), the thread stops reading and closes the stream.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        stop = threading.Event()
+        p = profile_router.get(profile)
+
+        def produce():
+            response = None
+            try:
+                response = self.client.chat.completions.create(
+                    model=p.model,
+                    messages=messages,
+                    temperature=p.temperature if temperature is None else temperature,
+                    max_tokens=p.max_tokens,
+                    timeout=p.timeout,
+                    stream=True,
+                )
+                for chunk in response:
+                    if stop.is_set():
+                        return
+                    if getattr(chunk, "usage", None):
+                        self._add_tokens(chunk.usage)
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        loop.call_soon_threadsafe(queue.put_nowait, chunk.choices[0].delta.content)
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+                llm_breaker.record_success()
+            except Exception as e:
+                if stop.is_set():
+                    return
+                llm_breaker.record_failure(e)
+                logger.error(f"LLM stream failed: {e}")
+                metrics.LLM_ERRORS.inc(stage=stage, error=type(e).__name__)
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+            finally:
+                # Releases the HTTP connection, also when the consumer went away mid-stream
+                http_response = getattr(response, "response", None)
+                if http_response is not None:
+                    http_response.close()
+
+        # Async generators share the consumer's context, so the span is not made current
+        # here; only the producer thread runs with it active.
+        job_id, stage = current_stage()
+        metrics.LLM_ROUTED.inc(profile=profile or "default", model=p.model)
+        s = start_span("llm.stream", job_id=job_id, stage=stage, profile=profile or "default", model=p.model)
+        context = contextvars.copy_context()
+        context.run(activate, s)
+        error: Optional[BaseException] = None
+        started = time.perf_counter()
+        try:
+            llm_breaker.check()
+            async with llm_slot(job_id, stage, s, profile):
+                with usage_tracker.reservation(job_id, messages):
+                    started = time.perf_counter()
+                    llm_breaker.before_call()
+                    producer = loop.run_in_executor(llm_executor, context.run, produce)
+                    while True:
+                        item = await queue.get()
+                        if item is done:
+                            break
+                        if isinstance(item, Exception):
+                            raise item
+                        yield item
+                    await producer
+        except LLMUnavailable as e:
+            error = e
+            usage = usage_tracker.get(job_id)
+            if usage is not None:
+                usage.note_refused(e.cause)
+            raise
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            stop.set()
+            latency = time.perf_counter() - started
+            metrics.LLM_LATENCY.observe(latency, stage=stage)
+            metrics.LLM_PROFILE_LATENCY.observe(latency, profile=profile or "default", model=p.model)
+            metrics.LLM_REQUESTS.inc(stage=stage, outcome="refused" if isinstance(error, LLMUnavailable) else "error" if error else "ok")
+            s.set(latency_ms=round(latency * 1000, 1))
+            finish(s, error)
 
 llm_client = LLMClient()
@@ -0,0 +1,416 @@
+import asyncio
+import io
+import json
+import os
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional, Set
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core import metrics
+from app.services.jobs.progress import current_stage
+from app.services.llm.profiles import profile_router
+from app.services.llm.usage import BudgetExceeded, usage_tracker
+
+logger = get_logger("llm_offline")
+
+# Stages whose LLM calls can go through provider batch files
+OFFLINE_STAGES = ("tagging", "audit", "extraction")
+
+# Request file lines follow the provider batch format:
+#   {"custom_id": "...", "method": "POST", "url": "/v4/chat/completions", "body": {...chat request...}}
+# Result lines: {"custom_id": "...", "response": {"status_code": 200, "body": {...chat completion...}}}
+# or {"custom_id": "...", "error": {"code": "...", "message": "..."}}.
+BATCH_URL = "/v4/chat/completions"
+
+
+class OfflineBatchFailed(Exception):
+    """The provider batch failed, expired or returned no answer for a request."""
+
+
+class BatchBackend(ABC):
+    """Where request files are submitted and result lines come back from."""
+
+    name = ""
+
+    @abstractmethod
+    async def submit(self, request_path: str, metadata: Dict[str, str]) -> str:
+        """Send a request file; returns the batch id."""
+
+    @abstractmethod
+    async def status(self, batch_id: str) -> str:
+        """One of "pending", "completed", "failed"."""
+
+    @abstractmethod
+    async def results(self, batch_id: str) -> List[Dict[str, Any]]:
+        """Result lines of a completed batch."""
+
+    @abstractmethod
+    async def cancel(self, batch_id: str) -> None:
+        """Ask the provider to drop the batch."""
+
+
+class LocalBatchBackend(BatchBackend):
+    """
+    File-based backend for testing and air-gapped setups: a batch is a directory under `root`
+    holding `input.jsonl`. Whatever processes it (e.g. `benchmarks/fake_llm_server.py --batch-dir`)
+    writes `output.jsonl`, or `error.txt` to fail the batch.
+    """
+
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _dir(self, batch_id: str) -> str:
+        return os.path.join(self.root, batch_id)
+
+    async def submit(self, request_path: str, metadata: Dict[str, str]) -> str:
+        batch_id = f"batch_{uuid.uuid4().hex[:16]}"
+
+        def write() -> None:
+            os.makedirs(self._dir(batch_id), exist_ok=True)
+            with open(os.path.join(self._dir(batch_id), "metadata.json"), "w", encoding="utf-8") as f:
+                json.dump(metadata, f, ensure_ascii=False)
+            # Rename last, so a watcher never sees a half-written request file
+            tmp = os.path.join(self._dir(batch_id), "input.jsonl.tmp")
+            with open(request_path, "rb") as src, open(tmp, "wb") as dst:
+                dst.write(src.read())
+            os.replace(tmp, os.path.join(self._dir(batch_id), "input.jsonl"))
+
+        await asyncio.to_thread(write)
+        return batch_id
+
+    async def status(self, batch_id: str) -> str:
+        if await asyncio.to_thread(os.path.isfile, os.path.join(self._dir(batch_id), "error.txt")):
+            return "failed"
+        if await asyncio.to_thread(os.path.isfile, os.path.join(self._dir(batch_id), "output.jsonl")):
+            return "completed"
+        return "pending"
+
+    async def results(self, batch_id: str) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(_read_jsonl, os.path.join(self._dir(batch_id), "output.jsonl"))
+
+    async def cancel(self, batch_id: str) -> None:
+        def write() -> None:
+            with open(os.path.join(self._dir(batch_id), "error.txt"), "w", encoding="utf-8") as f:
+                f.write("cancelled")
+
+        await asyncio.to_thread(write)
+
+
+class ZhipuBatchBackend(BatchBackend):
+    """Zhipu Batch API: the request file is uploaded with purpose "batch" and run within 24 hours."""
+
+    name = "zhipu"
+
+    def __init__(self):
+        from zhipuai import ZhipuAI
+        self.client = ZhipuAI(api_key=settings.LLM_API_KEY, base_url=settings.LLM_BASE_URL)
+
+    async def submit(self, request_path: str, metadata: Dict[str, str]) -> str:
+        def create() -> str:
+            with open(request_path, "rb") as f:
+                uploaded = self.client.files.create(file=f, purpose="batch")
+            batch = self.client.batches.create(
+                input_file_id=uploaded.id, endpoint=BATCH_URL, completion_window="24h", metadata=metadata,
+            )
+            return batch.id
+
+        return await asyncio.to_thread(create)
+
+    async def status(self, batch_id: str) -> str:
+        batch = await asyncio.to_thread(self.client.batches.retrieve, batch_id)
+        if batch.status == "completed":
+            return "completed"
+        if batch.status in ("failed", "expired", "cancelled"):
+            return "failed"
+        return "pending"
+
+    async def results(self, batch_id: str) -> List[Dict[str, Any]]:
+        def download() -> List[Dict[str, Any]]:
+            batch = self.client.batches.retrieve(batch_id)
+            lines: List[Dict[str, Any]] = []
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if file_id:
+                    content = self.client.files.content(file_id).content.decode("utf-8")
+                    lines.extend(_parse_jsonl(io.StringIO(content)))
+            return lines
+
+        return await asyncio.to_thread(download)
+
+    async def cancel(self, batch_id: str) -> None:
+        await asyncio.to_thread(self.client.batches.cancel, batch_id)
+
+
+def _read_jsonl(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        return _parse_jsonl(f)
+
+
+def _parse_jsonl(lines) -> List[Dict[str, Any]]:
+    records = []
+    for line in lines:
+        line = line.strip()
+        if line:
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                logger.warning(f"Skipping malformed batch result line: {line[:200]}")
+    return records
+
+
+def create_backend(name: str) -> BatchBackend:
+    if name == "local":
+        return LocalBatchBackend(os.path.join(settings.LLM_BATCH_DIR, "local"))
+    if name == "zhipu":
+        return ZhipuBatchBackend()
+    raise ValueError(f"Unknown LLM batch backend: {name}")
+
+
+class _Request(NamedTuple):
+    messages: List[Dict[str, Any]]
+    response_format: Any
+    temperature: Optional[float]
+    profile: Optional[str]
+    future: asyncio.Future
+
+
+class _Round:
+    """
+    The LLM calls of one `gather`. Once every gathered coroutine is either waiting on a
+    request or finished, the waiting requests are written to one file and submitted.
+    """
+
+    def __init__(self, session: "OfflineSession", stage: str, expected: int):
+        self.session = session
+        self.stage = stage
+        self.expected = expected
+        self.finished = 0
+        self.waiting: Dict[str, _Request] = {}
+        self.flushing = False
+
+    async def track(self, aw: Awaitable[Any]) -> Any:
+        try:
+            return await aw
+        finally:
+            self.finished += 1
+            self._maybe_flush()
+
+    def request(self, messages, response_format, temperature, profile) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self.waiting[f"{self.stage}-{self.session.next_id()}"] = _Request(messages, response_format, temperature, profile, future)
+        self._maybe_flush()
+        return future
+
+    def _maybe_flush(self) -> None:
+        if self.flushing or not self.waiting or len(self.waiting) + self.finished < self.expected:
+            return
+        self.flushing = True
+        requests, self.waiting = self.waiting, {}
+        task = asyncio.ensure_future(self._flush(requests))
+        self.session.tasks.add(task)
+        task.add_done_callback(self.session.tasks.discard)
+
+    async def _flush(self, requests: Dict[str, _Request]) -> None:
+        # Real-time fallback calls made from here must not land in this round again
+        _round.set(None)
+        try:
+            await self.session.run_batch(self.stage, requests)
+        except Exception as e:
+            for r in requests.values():
+                if not r.future.done():
+                    r.future.set_exception(e)
+        finally:
+            self.flushing = False
+            # Coroutines resumed by this batch may already be waiting on their next request
+            self._maybe_flush()
+
+
+_round: ContextVar[Optional[_Round]] = ContextVar("offline_round", default=None)
+
+
+class OfflineSession:
+    """
+    Offline execution of one job. Requests are answered from provider batch files; while a
+    batch is out the job is parked (`on_wait`) and it resumes (`on_resume`) when results arrive.
+    If a batch fails, its requests are sent as real-time calls instead.
+    """
+
+    def __init__(
+        self,
+        job_id: str,
+        backend: BatchBackend,
+        on_wait: Callable[[Dict[str, Any]], Awaitable[None]],
+        on_resume: Callable[[Dict[str, Any]], Awaitable[None]],
+    ):
+        self.job_id = job_id
+        self.backend = backend
+        self.on_wait = on_wait
+        self.on_resume = on_resume
+        self.batches: List[Dict[str, Any]] = []
+        self.tasks: Set[asyncio.Task] = set() # Batches being submitted or waited for
+        self._ids = 0
+
+    def next_id(self) -> int:
+        self._ids += 1
+        return self._ids
+
+    async def cancel(self) -> None:
+        """Stop waiting for outstanding batches and ask the provider to drop them."""
+        for task in list(self.tasks):
+            task.cancel()
+        for info in self.batches:
+            if info["status"] != "waiting":
+                continue
+            info["status"] = "cancelled"
+            try:
+                await self.backend.cancel(info["batch_id"])
+                metrics.LLM_BATCHES.inc(stage=info["stage"], outcome="cancelled")
+            except Exception as e:
+                logger.warning(f"Could not cancel batch {info['batch_id']}: {e}")
+
+    async def run_batch(self, stage: str, requests: Dict[str, _Request]) -> None:
+        from app.services.llm.client import llm_client
+
+        usage = usage_tracker.get(self.job_id)
+        if usage is not None and usage.exhausted():
+            usage.note_refused("budget")
+            raise BudgetExceeded(f"任务 Token 预算已用尽（{usage.total}/{usage.budget}）。")
+
+        info = {"stage": stage, "requests": len(requests), "backend": self.backend.name, "batch_id": None, "status": "submitting"}
+        self.batches.append(info)
+        try:
+            path = await asyncio.to_thread(self._write_requests, stage, requests)
+            info["batch_id"] = await self.backend.submit(path, {"job_id": self.job_id, "stage": stage})
+            info.update(status="waiting", submitted_at=time.time())
+            metrics.LLM_BATCHES.inc(stage=stage, outcome="submitted")
+            await self.on_wait(info)
+            lines = await self._wait(info)
+        except Exception as e:
+            logger.error(f"Offline batch for {stage} failed ({e}), sending {len(requests)} requests in real time.")
+            metrics.LLM_BATCHES.inc(stage=stage, outcome="failed")
+            info.update(status="failed", error=str(e))
+            await self.on_resume(info)
+            await asyncio.gather(*(self._realtime(llm_client, r) for r in requests.values()))
+            return
+
+        info.update(status="completed", completed_at=time.time())
+        metrics.LLM_BATCHES.inc(stage=stage, outcome="completed")
+        answered = 0
+        for line in lines:
+            r = requests.get(str(line.get("custom_id")))
+            if r is None or r.future.done():
+                continue
+            try:
+                r.future.set_result(self._parse(llm_client, stage, r, line))
+                answered += 1
+            except Exception as e:
+                r.future.set_exception(e)
+        for custom_id, r in requests.items():
+            if not r.future.done():
+                r.future.set_exception(OfflineBatchFailed(f"批处理结果中缺少请求 {custom_id}。"))
+        info["answered"] = answered
+        await self.on_resume(info)
+
+    def _write_requests(self, stage: str, requests: Dict[str, _Request]) -> str:
+        os.makedirs(os.path.join(settings.LLM_BATCH_DIR, "requests"), exist_ok=True)
+        path = os.path.join(settings.LLM_BATCH_DIR, "requests", f"{self.job_id}-{stage}-{self._ids}.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            for custom_id, r in requests.items():
+                p = profile_router.get(r.profile)
+                body = {
+                    "model": p.model,
+                    "messages": r.messages,
+                    "temperature": p.temperature if r.temperature is None else r.temperature,
+                    "max_tokens": p.max_tokens,
+                }
+                f.write(json.dumps({"custom_id": custom_id, "method": "POST", "url": BATCH_URL, "body": body}, ensure_ascii=False) + "\n")
+        return path
+
+    async def _wait(self, info: Dict[str, Any]) -> List[Dict[str, Any]]:
+        deadline = time.monotonic() + settings.LLM_BATCH_MAX_WAIT_SECONDS
+        while True:
+            status = await self.backend.status(info["batch_id"])
+            if status == "completed":
+                return await self.backend.results(info["batch_id"])
+            if status == "failed":
+                raise OfflineBatchFailed(f"批处理 {info['batch_id']} 失败。")
+            if time.monotonic() >= deadline:
+                raise OfflineBatchFailed(f"批处理 {info['batch_id']} 超过 {settings.LLM_BATCH_MAX_WAIT_SECONDS:.0f} 秒未完成。")
+            await asyncio.sleep(settings.LLM_BATCH_POLL_SECONDS)
+
+    def _parse(self, llm_client: Any, stage: str, r: _Request, line: Dict[str, Any]) -> Any:
+        response = line.get("response") or {}
+        if line.get("error") or response.get("status_code") != 200:
+            raise OfflineBatchFailed(f"批处理请求失败：{line.get('error') or response.get('status_code')}")
+        body = response.get("body") or {}
+        tokens = body.get("usage") or {}
+        prompt, completion = tokens.get("prompt_tokens") or 0, tokens.get("completion_tokens") or 0
+        usage_tracker.record(self.job_id, stage, prompt, completion)
+        metrics.LLM_TOKENS.inc(prompt, stage=stage, kind="prompt")
+        metrics.LLM_TOKENS.inc(completion, stage=stage, kind="completion")
+        content = body["choices"][0]["message"]["content"]
+        if r.response_format:
+            return json.loads(llm_client._clean_json_string(content))
+        return content
+
+    async def _realtime(self, llm_client: Any, r: _Request) -> None:
+        try:
+            r.future.set_result(await llm_client.achat_completion(r.messages, r.response_format, r.temperature, r.profile))
+        except Exception as e:
+            r.future.set_exception(e)
+
+
+class OfflineRunner:
+    """Offline sessions of running jobs, keyed by job id."""
+
+    def __init__(self):
+        self._sessions: Dict[str, OfflineSession] = {}
+
+    def open(self, job_id: str, on_wait, on_resume, backend: Optional[BatchBackend] = None) -> OfflineSession:
+        session = OfflineSession(job_id, backend or create_backend(settings.LLM_BATCH_BACKEND), on_wait, on_resume)
+        self._sessions[job_id] = session
+        return session
+
+    def get(self, job_id: Optional[str]) -> Optional[OfflineSession]:
+        return self._sessions.get(job_id) if job_id else None
+
+    async def cancel(self, job_id: str) -> None:
+        session = self._sessions.get(job_id)
+        if session is not None:
+            await session.cancel()
+
+    def close(self, job_id: str) -> Optional[List[Dict[str, Any]]]:
+        session = self._sessions.pop(job_id, None)
+        if session is None:
+            return None
+        for task in list(session.tasks):
+            task.cancel()
+        return session.batches
+
+offline_runner = OfflineRunner()
+
+
+async def gather(*aws: Awaitable[Any], return_exceptions: bool = False) -> List[Any]:
+    """
+    `asyncio.gather` for a stage's concurrent LLM calls. For a job in offline mode the
+    requests they make are collected into one provider batch instead of sent one by one.
+    """
+    job_id, stage = current_stage()
+    session = offline_runner.get(job_id)
+    if session is None or stage not in OFFLINE_STAGES or not aws:
+        return await asyncio.gather(*aws, return_exceptions=return_exceptions)
+    round_ = _Round(session, stage, len(aws))
+    token = _round.set(round_)
+    try:
+        # Tasks copy the context, so the calls they make see this round
+        return await asyncio.gather(*(round_.track(aw) for aw in aws), return_exceptions=return_exceptions)
+    finally:
+        _round.reset(token)
+
+
+def current_round() -> Optional[_Round]:
+    return _round.get()
@@ -0,0 +1,62 @@
+from typing import Any, Dict, NamedTuple, Optional
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger("llm_profiles")
+
+
+class ModelProfile(NamedTuple):
+    model: str
+    max_tokens: int
+    temperature: float
+    timeout: float # Seconds per HTTP attempt
+    concurrency: float # Share of LLM_CONCURRENCY this profile may hold at once, across all jobs
+    deadline: float # Seconds for the whole call, retries and hedges included; the stage's latency objective per call
+    hedge: bool # Idempotent and cheap enough to duplicate when slow
+
+
+def _defaults() -> Dict[str, ModelProfile]:
+    fast, strong = settings.LLM_FAST_MODEL, settings.LLM_MODEL
+    t = settings.LLM_TEMPERATURE
+    return {
+        # Bulk stages: many small structured answers, a fast model with tight max_tokens
+        "align": ModelProfile(fast, 1024, t, 30.0, 0.25, 60.0, True),
+        "normalize": ModelProfile(fast, 1024, t, 30.0, 0.25, 60.0, True),
+        "tagging": ModelProfile(fast, 2048, t, 60.0, 1.0, 120.0, True),
+        "audit": ModelProfile(fast, 2048, 0.1, 60.0, 1.0, 120.0, True), # Low temperature for strict analysis
+        "extraction": ModelProfile(fast, 8192, t, 90.0, 1.0, 180.0, True), # Answers quote long actual results; a cut answer costs a re-queue
+        # Synthesis: one long call per job, worth the stronger model and not worth paying twice
+        "clustering": ModelProfile(strong, settings.LLM_MAX_TOKENS, t, 180.0, 0.25, 360.0, False), # Answer grows with the defect count
+        "summary": ModelProfile(strong, 4096, t, settings.REPORT_SUMMARY_MAX_SECONDS, 0.25, settings.REPORT_SUMMARY_MAX_SECONDS, False),
+        # Calls that name no profile keep the previous global behaviour
+        "default": ModelProfile(
+            strong, settings.LLM_MAX_TOKENS, t, float(settings.LLM_TIMEOUT), 1.0,
+            float(settings.LLM_TIMEOUT * (settings.LLM_MAX_RETRIES + 1)), False,
+        ),
+    }
+
+
+def _load(overrides: Dict[str, Dict[str, Any]]) -> Dict[str, ModelProfile]:
+    profiles = _defaults()
+    for name, fields in overrides.items():
+        base = profiles.get(name, profiles["default"])
+        unknown = set(fields) - set(ModelProfile._fields)
+        if unknown:
+            logger.warning(f"Ignoring unknown fields {sorted(unknown)} in LLM profile '{name}'.")
+        profiles[name] = base._replace(**{k: v for k, v in fields.items() if k in ModelProfile._fields})
+    return profiles
+
+
+class ProfileRouter:
+    """
+    Resolve the model profile of a call site. The scheduler (llm/scheduler.py) caps the
+    slots each profile can hold, so a bulk stage cannot starve synthesis calls.
+    """
+
+    def __init__(self, overrides: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.profiles = _load(overrides or {})
+
+    def get(self, name: Optional[str]) -> ModelProfile:
+        return self.profiles.get(name or "default", self.profiles["default"])
+
+profile_router = ProfileRouter(settings.LLM_PROFILES)
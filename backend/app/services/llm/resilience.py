@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Optional
+from zhipuai import APIConnectionError, APIStatusError
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.core import metrics
+from app.services.llm.usage import LLMUnavailable
+
+logger = get_logger("llm_resilience")
+
+
+class CircuitOpen(LLMUnavailable):
+    """The LLM provider looks down; the call was not sent."""
+    cause = "circuit"
+
+
+class DeadlineExceeded(TimeoutError):
+    """The call used up its deadline across attempts."""
+
+
+class Deadline:
+    """
+    Time budget of one logical LLM call across its retries and hedges. It starts when the
+    first attempt gets a concurrency slot, so queueing behind our own limiter does not count.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires: Optional[float] = None
+
+    def start(self) -> None:
+        if self.expires is None:
+            self.expires = time.monotonic() + self.seconds
+
+    def remaining(self) -> float:
+        return self.seconds if self.expires is None else self.expires - time.monotonic()
+
+
+def is_outage(exc: BaseException) -> bool:
+    """Failures that say the provider is unreachable or broken, as opposed to a bad answer."""
+    if isinstance(exc, APIConnectionError): # Includes timeouts
+        return True
+    return isinstance(exc, APIStatusError) and exc.status_code >= 500
+
+
+class CircuitBreaker:
+    """
+    Stop sending LLM traffic once at least `threshold` of the last `window` requests failed
+    with an outage error and they are the majority; a few stuck requests timing out together
+    are left to hedging. While open, calls fail fast with CircuitOpen so stages switch to their
+    local strategies; after `cooldown` seconds a single probe call is let through, and its
+    outcome closes or re-opens the circuit.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, threshold: int, cooldown: float, window: int = 20):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self.outcomes: Deque[bool] = deque(maxlen=window) # True for an outage failure
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self.state == self.OPEN and time.monotonic() - self.opened_at < self.cooldown
+
+    def check(self) -> None:
+        """Fail fast before queueing for a slot; whether to probe is decided in `before_call`."""
+        if self.is_open:
+            raise CircuitOpen("LLM 服务连续失败，熔断中，调用未发送。")
+
+    def before_call(self) -> None:
+        """Called right before a request is sent; its outcome must be recorded."""
+        if self.threshold <= 0:
+            return
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.cooldown:
+                self._set_state(self.HALF_OPEN)
+            if self.state == self.OPEN or (self.state == self.HALF_OPEN and self._probing):
+                raise CircuitOpen("LLM 服务连续失败，熔断中，调用未发送。")
+            if self.state == self.HALF_OPEN:
+                self._probing = True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.outcomes.append(False)
+            self._probing = False
+            if self.state != self.CLOSED:
+                logger.info("LLM circuit closed.")
+                self._set_state(self.CLOSED)
+
+    def record_failure(self, exc: BaseException) -> None:
+        if not is_outage(exc):
+            # The provider answered; a bad answer is no sign of an outage
+            self.record_success()
+            return
+        with self._lock:
+            self.outcomes.append(True)
+            self._probing = False
+            failures = sum(self.outcomes)
+            tripped = self.threshold > 0 and failures >= self.threshold and failures * 2 > len(self.outcomes)
+            if self.state == self.HALF_OPEN or (self.state == self.CLOSED and tripped):
+                logger.warning(f"LLM circuit opened after {failures} of the last {len(self.outcomes)} requests failed ({type(exc).__name__}), cooling down {self.cooldown}s.")
+                self.opened_at = time.monotonic()
+                self.outcomes.clear()
+                self._set_state(self.OPEN)
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        metrics.LLM_BREAKER_STATE.set({self.CLOSED: 0, self.HALF_OPEN: 1, self.OPEN: 2}[state])
+
+llm_breaker = CircuitBreaker(settings.LLM_BREAKER_FAILURES, settings.LLM_BREAKER_COOLDOWN)
+
+
+class HedgePolicy:
+    """
+    Decide when to send a duplicate of a slow call. The delay is a high quantile of the
+    profile's recent attempt latencies, and hedges are capped at a share of all calls so a
+    slow provider does not get twice the load.
+    """
+
+    def __init__(self, quantile: float, max_ratio: float, min_samples: int, window: int = 200):
+        self.quantile = quantile
+        self.max_ratio = max_ratio
+        self.min_samples = min_samples
+        self.window = window
+        self.calls = 0
+        self.hedges = 0
+        self._samples: Dict[str, Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, profile: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(profile, deque(maxlen=self.window)).append(seconds)
+
+    def count(self) -> None:
+        """A hedgeable call started."""
+        with self._lock:
+            self.calls += 1
+
+    def delay(self, profile: str) -> Optional[float]:
+        """Seconds an attempt may run before it is hedged, None while too few samples."""
+        with self._lock:
+            samples = sorted(self._samples.get(profile, ()))
+        if len(samples) < self.min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * self.quantile))]
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.hedges >= self.calls * self.max_ratio:
+                return False
+            self.hedges += 1
+            return True
+
+hedge_policy = HedgePolicy(settings.LLM_HEDGE_QUANTILE, settings.LLM_HEDGE_MAX_RATIO, settings.LLM_HEDGE_MIN_SAMPLES)
@@ -0,0 +1,214 @@
+import asyncio
+import time
+from collections import Counter, deque
+from typing import Any, Deque, Dict, Optional
+from app.core.config import settings
+from app.core import metrics
+from app.services.llm.profiles import profile_router
+
+PRIORITY_LABELS = {"interactive": "交互", "bulk": "批量"}
+
+
+class _Waiter:
+    __slots__ = ("profile", "future", "queued_at")
+
+    def __init__(self, profile: str, future: asyncio.Future):
+        self.profile = profile
+        self.future = future
+        self.queued_at = time.perf_counter()
+
+
+class JobQueue:
+    """One job's waiting LLM calls, per profile, and what the scheduler gave it so far."""
+
+    def __init__(self, job_id: Optional[str], priority: str):
+        self.job_id = job_id
+        self.priority = priority
+        self.waiting: Dict[str, Deque[_Waiter]] = {}
+        self.tag = 0.0 # Virtual finish time of the last grant
+        self.inflight = 0
+        self.granted = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.closed = False
+        self.paused = False # Gets no new slots; calls in flight finish
+        self.cancelled = False
+
+    @property
+    def weight(self) -> float:
+        return max(settings.LLM_PRIORITY_WEIGHTS.get(self.priority, 1.0), 0.01)
+
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for q in self.waiting.values())
+
+    @property
+    def eligible(self) -> bool:
+        return not self.paused and not self.cancelled
+
+
+class FairScheduler:
+    """
+    Hand out the LLM_CONCURRENCY slots across jobs by start-time fair queuing: every job has
+    its own queue, and the next free slot goes to the waiting job with the lowest virtual start
+    time, which advances by 1/weight per grant. Interactive jobs weigh more than bulk ones, so
+    a small job submitted during a huge one gets most of the slots that free up. A job that was
+    idle starts at the current virtual time and cannot claim slots for the time it waited for
+    nothing. Per-profile caps (ModelProfile.concurrency) still apply across all jobs.
+    """
+
+    def __init__(self, slots: int):
+        self.slots = slots
+        self.inflight = 0
+        self.by_profile: Counter = Counter()
+        self.jobs: Dict[Optional[str], JobQueue] = {}
+        self.vtime = 0.0
+
+    def open(self, job_id: str, priority: str) -> JobQueue:
+        job = self._job(job_id)
+        job.priority = priority
+        job.closed = False
+        return job
+
+    def set_priority(self, job_id: str, priority: str) -> None:
+        self._job(job_id).priority = priority
+
+    def pause(self, job_id: str) -> None:
+        self._job(job_id).paused = True
+
+    def resume(self, job_id: str) -> None:
+        self._job(job_id).paused = False
+        self._dispatch()
+
+    def cancel(self, job_id: str) -> None:
+        """
+        Drop the job's queued calls; cancelling its task then makes the callers go away. Calls in
+        flight give their slots back as soon as they are cancelled (see LLMClient._attempt).
+        """
+        job = self._job(job_id)
+        job.cancelled = True
+        job.waiting.clear()
+
+    def cancelled(self, job_id: Optional[str]) -> bool:
+        job = self.jobs.get(job_id)
+        return job is not None and job.cancelled
+
+    def close(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        report = self.report(job_id)
+        job.closed = True
+        self._drop_if_idle(job)
+        return report
+
+    def report(self, job_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        job = self.jobs.get(job_id)
+        if job is None:
+            return None
+        return {
+            "priority": job.priority,
+            "weight": job.weight,
+            "paused": job.paused,
+            "inflight": job.inflight,
+            "queued": job.queued,
+            # Share of the busy slots this job holds right now
+            "share": round(job.inflight / self.inflight, 3) if self.inflight else 0.0,
+            "granted": job.granted,
+            "wait_ms_avg": round(job.wait_total / job.granted * 1000, 1) if job.granted else 0.0,
+            "wait_ms_max": round(job.wait_max * 1000, 1),
+        }
+
+    def expected_share(self, job_id: Optional[str]) -> float:
+        """Share of the slots the job can expect while the other jobs now busy keep competing."""
+        job = self.jobs.get(job_id)
+        weight = job.weight if job else 1.0
+        others = sum(j.weight for j in self.jobs.values() if j is not job and j.eligible and (j.queued or j.inflight))
+        return weight / (weight + others)
+
+    def saturated(self, profile: Optional[str]) -> bool:
+        """No slot would be free for another call of this profile right now."""
+        name = self._profile(profile)
+        return (
+            self.inflight >= self.slots or self.by_profile[name] >= self._cap(name)
+            or any(j.queued for j in self.jobs.values() if j.eligible)
+        )
+
+    async def acquire(self, job_id: Optional[str], profile: Optional[str]) -> JobQueue:
+        job = self._job(job_id)
+        waiter = _Waiter(self._profile(profile), asyncio.get_running_loop().create_future())
+        job.waiting.setdefault(waiter.profile, deque()).append(waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted, but the caller went away before it could use the slot
+                self.release(job, waiter.profile)
+            elif not job.cancelled: # A cancelled job's queues were already cleared
+                job.waiting[waiter.profile].remove(waiter)
+                self._drop_if_idle(job)
+            raise
+        return job
+
+    def release(self, job: JobQueue, profile: Optional[str]) -> None:
+        name = self._profile(profile)
+        self.inflight -= 1
+        self.by_profile[name] -= 1
+        job.inflight -= 1
+        self._drop_if_idle(job)
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        while self.inflight < self.slots:
+            best = None
+            for job in self.jobs.values():
+                if not job.eligible:
+                    continue
+                for name, queue in job.waiting.items():
+                    if not queue or self.by_profile[name] >= self._cap(name):
+                        continue
+                    key = (max(job.tag, self.vtime), queue[0].queued_at)
+                    if best is None or key < best[0]:
+                        best = (key, job, name)
+            if best is None:
+                return
+            (start, _), job, name = best
+            waiter = job.waiting[name].popleft()
+            job.tag = start + 1.0 / job.weight
+            self.vtime = start
+            self.inflight += 1
+            self.by_profile[name] += 1
+            job.inflight += 1
+            job.granted += 1
+            waited = time.perf_counter() - waiter.queued_at
+            job.wait_total += waited
+            job.wait_max = max(job.wait_max, waited)
+            metrics.LLM_SCHEDULER_WAIT.observe(waited, priority=job.priority)
+            waiter.future.set_result(None)
+
+    def _job(self, job_id: Optional[str]) -> JobQueue:
+        job = self.jobs.get(job_id)
+        if job is None:
+            # Calls outside a job, or of a job that is not open (e.g. a summary finishing after
+            # its report), count as interactive; the queue is dropped once idle
+            job = self.jobs[job_id] = JobQueue(job_id, "interactive")
+            job.closed = True
+        return job
+
+    def _drop_if_idle(self, job: JobQueue) -> None:
+        if job.closed and not job.inflight and not job.queued:
+            self.jobs.pop(job.job_id, None)
+
+    def _profile(self, profile: Optional[str]) -> str:
+        return profile if profile in profile_router.profiles else "default"
+
+    def _cap(self, name: str) -> int:
+        return max(1, round(self.slots * profile_router.get(name).concurrency))
+
+llm_scheduler = FairScheduler(settings.LLM_CONCURRENCY)
+
+
+def classify_priority(cases: int) -> str:
+    """Priority class of a job that did not ask for one, by the number of cases to analyze."""
+    return "interactive" if cases <= settings.LLM_INTERACTIVE_MAX_CASES else "bulk"
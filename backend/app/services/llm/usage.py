@@ -0,0 +1,160 @@
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Set
+from app.core.config import settings
+from app.core.logging import get_logger
+from app.services.jobs.progress import current_stage
+
+logger = get_logger("llm_usage")
+
+# Local strategies stages switch to when the budget runs low, as shown to users
+FALLBACK_LABELS = {
+    "tagging": "模块打标改用规则",
+    "audit": "跳过 LLM 审计",
+    "extraction": "缺陷事实改为本地提取",
+    "clustering": "缺陷聚类改为本地聚类",
+}
+
+# Why stages fell back, as shown to users
+DEGRADE_CAUSES = {
+    "budget": "Token 预算接近上限",
+    "circuit": "LLM 服务连续失败（熔断）",
+}
+
+
+class LLMUnavailable(Exception):
+    """The call was not sent; stages fall back to their local strategies."""
+    cause = "unavailable"
+
+
+class BudgetExceeded(LLMUnavailable):
+    """The job has used up its token budget; the call was not sent."""
+    cause = "budget"
+
+
+class JobUsage:
+    """
+    Token usage of one job, per pipeline stage. Updated from LLM worker threads.
+    With a budget, stages check `should_degrade()` and switch to local strategies once
+    most of it is spent; calls beyond the budget are refused with BudgetExceeded. Calls in
+    flight reserve their estimated prompt size so concurrent batches cannot all slip past it.
+    """
+
+    def __init__(self, budget: Optional[int] = None):
+        self.budget = budget or None
+        self.stages: Dict[str, Dict[str, int]] = {}
+        self.degraded: List[str] = [] # Stages that fell back to a local strategy
+        self.causes: List[str] = [] # Why they did, see DEGRADE_CAUSES
+        self.refused: Set[str] = set() # Causes of calls that were not sent
+        self.reserved = 0
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, prompt_tokens: int, completion_tokens: int) -> None:
+        with self._lock:
+            entry = self.stages.setdefault(stage, {"prompt_tokens": 0, "completion_tokens": 0, "calls": 0})
+            entry["prompt_tokens"] += prompt_tokens
+            entry["completion_tokens"] += completion_tokens
+            entry["calls"] += 1
+
+    @property
+    def total(self) -> int:
+        with self._lock:
+            return self._total()
+
+    def _total(self) -> int:
+        return sum(e["prompt_tokens"] + e["completion_tokens"] for e in self.stages.values())
+
+    def exhausted(self) -> bool:
+        return self.budget is not None and self.total >= self.budget
+
+    def reserve(self, tokens: int) -> None:
+        with self._lock:
+            if self.budget is not None and self._total() + self.reserved >= self.budget:
+                raise BudgetExceeded(f"任务 Token 预算已用尽（{self._total()}/{self.budget}）。")
+            self.reserved += tokens
+
+    def release(self, tokens: int) -> None:
+        with self._lock:
+            self.reserved -= tokens
+
+    def should_degrade(self) -> bool:
+        return self.budget is not None and self.total >= self.budget * settings.JOB_TOKEN_BUDGET_DEGRADE_RATIO
+
+    def note_refused(self, cause: str) -> None:
+        self.refused.add(cause)
+
+    def fallback_cause(self) -> Optional[str]:
+        """Why items the LLM did not reach should be handled locally, if they should."""
+        if self.exhausted():
+            return "budget"
+        if "circuit" in self.refused:
+            return "circuit"
+        return None
+
+    def mark_degraded(self, stage: str, cause: str = "budget") -> None:
+        if stage not in self.degraded:
+            self.degraded.append(stage)
+        if cause not in self.causes:
+            self.causes.append(cause)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            stages = {s: dict(e, total_tokens=e["prompt_tokens"] + e["completion_tokens"]) for s, e in self.stages.items()}
+        return {
+            "total_tokens": sum(e["total_tokens"] for e in stages.values()),
+            "prompt_tokens": sum(e["prompt_tokens"] for e in stages.values()),
+            "completion_tokens": sum(e["completion_tokens"] for e in stages.values()),
+            "calls": sum(e["calls"] for e in stages.values()),
+            "budget": self.budget,
+            "stages": stages,
+            "degraded": list(self.degraded),
+            "degrade_causes": list(self.causes),
+        }
+
+
+class UsageTracker:
+    """Live token usage of running jobs, keyed by job id."""
+
+    def __init__(self):
+        self._jobs: Dict[str, JobUsage] = {}
+
+    def open(self, job_id: str, budget: Optional[int] = None) -> JobUsage:
+        usage = JobUsage(budget)
+        self._jobs[job_id] = usage
+        return usage
+
+    def get(self, job_id: Optional[str]) -> Optional[JobUsage]:
+        return self._jobs.get(job_id) if job_id else None
+
+    def close(self, job_id: str) -> Optional[Dict[str, Any]]:
+        usage = self._jobs.pop(job_id, None)
+        return usage.report() if usage else None
+
+    def current(self) -> Optional[JobUsage]:
+        """Usage of the job whose stage is running in the current context."""
+        return self.get(current_stage()[0])
+
+    @contextmanager
+    def reservation(self, job_id: Optional[str], messages: List[Dict[str, Any]]) -> Iterator[None]:
+        """
+        Hold an estimate of the call's prompt tokens against the job's budget while it runs;
+        raises BudgetExceeded if the budget is already used up or reserved.
+        """
+        usage = self.get(job_id)
+        if usage is None:
+            yield
+            return
+        # Roughly one token per two characters of mixed Chinese/JSON prompt text
+        estimate = sum(len(str(m.get("content") or "")) for m in messages) // 2
+        usage.reserve(estimate)
+        try:
+            yield
+        finally:
+            usage.release(estimate)
+
+    def record(self, job_id: Optional[str], stage: str, prompt_tokens: int, completion_tokens: int) -> None:
+        usage = self.get(job_id)
+        if usage is not None:
+            usage.record(stage, prompt_tokens, completion_tokens)
+
+usage_tracker = UsageTracker()
@@ -1,70 +1,240 @@
 import os
-from jinja2 import Environment, FileSystemLoader
+import json
+import time
+import asyncio
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
 from datetime import datetime
 from app.services.llm.client import llm_client
-from typing import Dict, Any, List
+from app.services.llm.usage import LLMUnavailable
+from app.services.report_gen.sidecar import SidecarWriter, data_dir_for
+from app.core.config import settings
+from app.core.logging import get_logger
+from typing import Dict, Any, List, Optional, Callable
+
+logger = get_logger("report_generator")
+
+SUMMARY_FILE = "summary.json"
+SUMMARY_FAILED = "<p>总结生成失败。</p>"
+SUMMARY_PLACEHOLDER = "<p>执行总结正在生成中，完成后将自动显示……</p>"
+SUMMARY_SKIPPED = "<p>任务 Token 预算已用尽，未生成执行总结。</p>"
+SUMMARY_UNAVAILABLE = "<p>LLM 服务暂不可用，未生成执行总结。</p>"
+
+# Relative cache paths are taken from the backend directory, not the process's working directory
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 class ReportGenerator:
     def __init__(self):
-        template_dir = os.path.join(os.path.dirname(__file__), 'templates')
-        self.env = Environment(loader=FileSystemLoader(template_dir))
+        self._env: Optional[Environment] = None
+        # Summaries still being written after their report was rendered
+        self._pending_summaries = set()
 
-    def generate_summary(self, stats: Dict, clusters: List, suspicious_cases: List = None) -> str:
-        # Use LLM to generate the executive summary text
+    @property
+    def env(self) -> Environment:
+        # Built on first use so importing the module touches no files
+        if self._env is None:
+            template_dir = os.path.join(os.path.dirname(__file__), 'templates')
+            # Compiled templates are cached on disk so new worker processes skip recompilation
+            cache_dir = os.path.join(BACKEND_DIR, settings.REPORT_TEMPLATE_CACHE_DIR)
+            os.makedirs(cache_dir, exist_ok=True)
+            self._env = Environment(
+                loader=FileSystemLoader(template_dir),
+                bytecode_cache=FileSystemBytecodeCache(cache_dir),
+            )
+        return self._env
+
+    def _build_summary_prompt(self, stats: Dict, clusters: List, suspicious_cases: List = None) -> str:
         suspicious_info = ""
         if suspicious_cases:
             suspicious_info = f"注意：在结果审计中发现了 {len(suspicious_cases)} 个疑似'假成功'（False Positive）的用例，请在报告中提及这一点。"
 
-        prompt = f"""
+        # Per-module/per-day grids can be large and add little to the summary
+        breakdowns = {k: v for k, v in (stats.get("breakdowns") or {}).items() if k not in ("module_result", "file_result", "exec_time")}
+        prompt_stats = {**{k: v for k, v in stats.items() if k != "breakdowns"}, "breakdowns": breakdowns}
+
+        return f"""
         基于以下测试数据撰写一份测试报告执行总结：
-        
-        统计数据: {stats}
+
+        统计数据: {prompt_stats}
         缺陷聚类: {[c.cluster_name for c in clusters]}
         {suspicious_info}
-        
+
         请重点关注：
         1. 整体质量评估。
         2. 关键风险领域。
         3. 改进建议。
         4. (如果有) 数据可信度风险。
-        
+
         【重要指令】
         - 直接输出 HTML 段落格式（例如 <p>...</p>）。
         - 必须使用中文。
         - 严禁输出 Python 代码或 Markdown。
         - 不要包含任何其他解释性文字，只输出 HTML 内容。
         """
+
+    def _clean_summary(self, summary: str) -> str:
+        summary = str(summary).strip()
+        # Clean markdown artifacts if present
+        if summary.startswith("```"):
+            summary = summary.split("\n", 1)[1] if "\n" in summary else ""
+        if summary.endswith("```"):
+            summary = summary.rsplit("\n", 1)[0]
+        return summary.replace("```html", "").replace("```", "")
+
+    def generate_summary(self, stats: Dict, clusters: List, suspicious_cases: List = None) -> str:
+        # Use LLM to generate the executive summary text
+        prompt = self._build_summary_prompt(stats, clusters, suspicious_cases)
         try:
-            summary = llm_client.chat_completion([{"role": "user", "content": prompt}])
-            summary = str(summary).strip()
-            # Clean markdown artifacts if present
-            if summary.startswith("```"):
-                summary = summary.split("\n", 1)[1]
-            if summary.endswith("```"):
-                summary = summary.rsplit("\n", 1)[0]
-            summary = summary.replace("```html", "").replace("```", "")
-            return summary
+            summary = llm_client.chat_completion([{"role": "user", "content": prompt}], profile="summary")
+            return self._clean_summary(summary)
         except:
-            return "<p>总结生成失败。</p>"
+            return SUMMARY_FAILED
+
+    async def agenerate_summary(
+        self,
+        stats: Dict,
+        clusters: List,
+        suspicious_cases: List = None,
+        on_partial: Optional[Callable[[str], None]] = None,
+    ) -> str:
+        """
+        Async summary generation. With REPORT_SUMMARY_STREAM, tokens are streamed and
+        `on_partial` receives the text generated so far.
+        """
+        prompt = self._build_summary_prompt(stats, clusters, suspicious_cases)
+        messages = [{"role": "user", "content": prompt}]
+        try:
+            if settings.REPORT_SUMMARY_STREAM and on_partial:
+                parts = []
+                async for delta in llm_client.astream_chat_completion(messages, profile="summary"):
+                    parts.append(delta)
+                    on_partial(self._clean_summary("".join(parts)))
+                return self._clean_summary("".join(parts))
+            summary = await llm_client.achat_completion(messages, profile="summary")
+            return self._clean_summary(summary)
+        except LLMUnavailable as e:
+            logger.warning(f"Summary skipped: {e}")
+            return SUMMARY_SKIPPED if e.cause == "budget" else SUMMARY_UNAVAILABLE
+        except Exception as e:
+            logger.error(f"Summary generation failed: {e}")
+            return SUMMARY_FAILED
+
+    def start_summary(self, stats: Dict, clusters: List, suspicious_cases: List, output_path: str) -> asyncio.Task:
+        """
+        Request the executive summary right away so it runs while the report data is prepared.
+        Streamed partial text is published to the report's summary.json as it arrives.
+        """
+        data_dir = data_dir_for(output_path)
+        last_write = [0.0]
+
+        def on_partial(text: str) -> None:
+            now = time.monotonic()
+            if now - last_write[0] >= 0.5:
+                last_write[0] = now
+                self._write_summary(data_dir, text, done=False)
+
+        async def run() -> str:
+            try:
+                return await asyncio.wait_for(
+                    self.agenerate_summary(stats, clusters, suspicious_cases, on_partial),
+                    timeout=settings.REPORT_SUMMARY_MAX_SECONDS,
+                )
+            except asyncio.TimeoutError:
+                logger.error("Summary generation timed out.")
+                return SUMMARY_FAILED
+
+        return asyncio.create_task(run())
+
+    def _write_summary(self, data_dir: str, html: str, done: bool) -> None:
+        os.makedirs(data_dir, exist_ok=True)
+        path = os.path.join(data_dir, SUMMARY_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"done": done, "html": html}, f, ensure_ascii=False)
+        os.replace(path + ".tmp", path)
 
     def render_report(self, job_id: str, stats: Dict, defects: List, clusters: List, suspicious_cases: List, all_cases: List, output_path: str):
         summary = self.generate_summary(stats, clusters, suspicious_cases)
+
+        # Case-level data goes to chunked JSON files next to the report; the HTML stays a small shell
+        data_dir = data_dir_for(output_path)
+        SidecarWriter(data_dir, settings.REPORT_CHUNK_SIZE).write(job_id, all_cases, clusters)
+        self._write_summary(data_dir, summary, done=True)
+
+        self._render_shell(job_id, stats, defects, clusters, suspicious_cases, output_path, summary, summary_pending=False)
+        return output_path
+
+    async def arender_report(
+        self,
+        job_id: str,
+        stats: Dict,
+        defects: List,
+        clusters: List,
+        suspicious_cases: List,
+        all_cases: List,
+        output_path: str,
+        summary_task: Optional[asyncio.Task] = None,
+        usage: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Async report pipeline: the summary runs concurrently with writing the report data.
+        If it is not ready within REPORT_SUMMARY_TIMEOUT the report is rendered with a
+        placeholder that the page replaces once summary.json is complete.
+        `usage` is the job's token usage so far (see llm/usage.py).
+        """
+        if summary_task is None:
+            summary_task = self.start_summary(stats, clusters, suspicious_cases, output_path)
+
+        data_dir = data_dir_for(output_path)
+        await asyncio.to_thread(SidecarWriter(data_dir, settings.REPORT_CHUNK_SIZE).write, job_id, all_cases, clusters)
+
+        try:
+            summary = await asyncio.wait_for(asyncio.shield(summary_task), timeout=settings.REPORT_SUMMARY_TIMEOUT)
+            summary_pending = False
+            self._write_summary(data_dir, summary, done=True)
+        except asyncio.TimeoutError:
+            logger.info(f"Summary for job {job_id} not ready, rendering report with a placeholder.")
+            summary = SUMMARY_PLACEHOLDER
+            summary_pending = True
+            if not os.path.exists(os.path.join(data_dir, SUMMARY_FILE)):
+                self._write_summary(data_dir, "", done=False)
+            self._fill_summary_later(summary_task, data_dir)
+
+        await asyncio.to_thread(
+            self._render_shell, job_id, stats, defects, clusters, suspicious_cases, output_path, summary, summary_pending, usage
+        )
+        return output_path
+
+    def _fill_summary_later(self, summary_task: asyncio.Task, data_dir: str) -> None:
+        async def fill() -> None:
+            summary = await summary_task
+            self._write_summary(data_dir, summary, done=True)
+
+        task = asyncio.create_task(fill())
+        self._pending_summaries.add(task)
+        task.add_done_callback(self._pending_summaries.discard)
+
+    def _render_shell(self, job_id: str, stats: Dict, defects: List, clusters: List, suspicious_cases: List, output_path: str, summary: str, summary_pending: bool, usage: Optional[Dict[str, Any]] = None) -> None:
         template = self.env.get_template('report.html')
-        
-        html_content = template.render(
+        context = dict(
             job_id=job_id,
             generated_at=datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             summary_text=summary,
+            summary_pending=summary_pending,
             stats=stats,
-            defects=defects,
-            clusters=clusters,
-            suspicious_cases=suspicious_cases,
-            all_cases=all_cases
+            data_url=os.path.basename(data_dir_for(output_path)) + "/",
+            defect_count=len(defects),
+            cluster_count=len(clusters),
+            suspicious_count=len(suspicious_cases),
+            usage=usage,
         )
-        
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
-        
-        return output_path
+        self._stream_to_file(template, context, output_path)
+
+    def _stream_to_file(self, template, context: Dict[str, Any], output_path: str) -> None:
+        # Stream template chunks through a buffered writer instead of building the whole
+        # document as one string; write to a temp file so readers never see a partial report.
+        tmp_path = output_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8', buffering=settings.REPORT_WRITE_BUFFER) as f:
+            for chunk in template.generate(**context):
+                f.write(chunk)
+        os.replace(tmp_path, output_path)
 
 report_generator = ReportGenerator()
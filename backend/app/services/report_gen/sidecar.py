@@ -0,0 +1,167 @@
+import gzip
+import json
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+from app.models.testcase import TestCase
+from app.models.defect import DefectCluster
+from app.core.logging import get_logger
+
+logger = get_logger("report_sidecar")
+
+MANIFEST = "manifest.json"
+CLUSTERS = "clusters.json.gz"
+INDEX = "index.json.gz"
+SIDECAR_VERSION = 2
+CLUSTER_PREVIEW = 50 # Member names listed per cluster in the report
+
+# TestCase columns carried in every case record (names match the model so records can be rehydrated)
+CASE_FIELDS = [
+    "ordinal", "case_id", "case_name", "precondition", "steps", "expected", "actual",
+    "test_result", "normalized_result", "priority", "executor", "exec_time", "remark",
+    "module", "module_confidence", "source_file", "source_name", "source_sheet", "source_row",
+    "parse_warnings", "audit_status", "audit_reason",
+]
+DEFECT_FIELDS = ["phenomenon", "observed_fact", "hypothesis", "evidence", "repro_steps", "severity_guess"]
+
+
+def data_dir_for(report_path: str) -> str:
+    """reports/report_<job>.html -> reports/report_<job>_data"""
+    return os.path.splitext(report_path)[0] + "_data"
+
+
+def _json_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def case_record(case: TestCase, cluster_index: Optional[int] = None) -> Dict[str, Any]:
+    # Loaded state is read from the instance dict; the ORM descriptors dominate serialization cost
+    state = vars(case)
+    record = {field: _json_value(state.get(field)) for field in CASE_FIELDS}
+    analysis = state.get("defect_analysis")
+    record["defect"] = {field: vars(analysis).get(field) for field in DEFECT_FIELDS} if analysis is not None else None
+    record["cluster"] = cluster_index
+    return record
+
+
+class SidecarWriter:
+    """
+    Write a job's cases and clusters as gzip-compressed, chunked JSON files next to the report.
+    Cases are serialized chunk by chunk so memory does not grow with the case count.
+
+    A small index (module and result code per case, positions of flagged and failed cases)
+    lets the report page filter and list cases while fetching only the chunks on screen.
+    """
+
+    def __init__(self, data_dir: str, chunk_size: int):
+        self.data_dir = data_dir
+        self.chunk_size = chunk_size
+
+    def write(self, job_id: str, cases: List[TestCase], clusters: List[DefectCluster]) -> Dict[str, Any]:
+        os.makedirs(self.data_dir, exist_ok=True)
+
+        cluster_index = {id(cluster): i for i, cluster in enumerate(clusters)}
+        cluster_sizes = [0] * len(clusters)
+        cluster_members: List[List[Dict[str, Any]]] = [[] for _ in clusters]
+        modules: Dict[Optional[str], int] = {}
+        results: Dict[Optional[str], int] = {}
+        module_codes: List[int] = []
+        result_codes: List[int] = []
+        flagged: List[int] = []
+        failed: List[int] = []
+
+        chunks = []
+        for start in range(0, len(cases), self.chunk_size):
+            records = []
+            for case in cases[start:start + self.chunk_size]:
+                idx = None
+                analysis = case.defect_analysis
+                if analysis is not None and analysis.cluster is not None:
+                    idx = cluster_index.get(id(analysis.cluster))
+                    if idx is not None:
+                        cluster_sizes[idx] += 1
+                record = case_record(case, idx)
+                records.append(record)
+
+                position = start + len(records) - 1
+                module_codes.append(modules.setdefault(record["module"], len(modules)))
+                result_codes.append(results.setdefault(record["normalized_result"], len(results)))
+                if record["audit_status"] == "Flagged":
+                    flagged.append(position)
+                if record["defect"] is not None:
+                    failed.append(position)
+                if idx is not None and len(cluster_members[idx]) < CLUSTER_PREVIEW:
+                    cluster_members[idx].append({"position": position, "case_name": record["case_name"]})
+
+            name = f"cases-{len(chunks):05d}.json.gz"
+            self._write_json(name, records)
+            chunks.append({"file": name, "count": len(records)})
+
+        self._write_json(CLUSTERS, [
+            {
+                "cluster_name": c.cluster_name,
+                "summary": c.summary,
+                "risk_assessment": c.risk_assessment,
+                "size": cluster_sizes[i],
+                "members": cluster_members[i],
+            }
+            for i, c in enumerate(clusters)
+        ])
+        self._write_json(INDEX, {
+            "modules": list(modules),
+            "results": list(results),
+            "module": module_codes,
+            "result": result_codes,
+            "flagged": flagged,
+            "defects": failed,
+        })
+
+        manifest = {
+            "version": SIDECAR_VERSION,
+            "job_id": job_id,
+            "total_cases": len(cases),
+            "chunk_size": self.chunk_size,
+            "chunks": chunks,
+            "clusters": CLUSTERS,
+            "index": INDEX,
+        }
+        with open(os.path.join(self.data_dir, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False)
+
+        logger.info(f"Wrote report data for job {job_id}: {len(cases)} cases in {len(chunks)} chunks.")
+        return manifest
+
+    def _write_json(self, name: str, payload: Any) -> None:
+        with gzip.open(os.path.join(self.data_dir, name), "wt", encoding="utf-8", compresslevel=6) as f:
+            json.dump(payload, f, ensure_ascii=False, separators=(",", ":"))
+
+
+class SidecarReader:
+    """Read back a report's data files one chunk at a time."""
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+
+    def exists(self) -> bool:
+        return os.path.isfile(os.path.join(self.data_dir, MANIFEST))
+
+    def manifest(self) -> Dict[str, Any]:
+        with open(os.path.join(self.data_dir, MANIFEST), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def iter_case_chunks(self) -> Iterator[List[Dict[str, Any]]]:
+        for chunk in self.manifest()["chunks"]:
+            yield self._read_json(chunk["file"])
+
+    def iter_cases(self) -> Iterator[Dict[str, Any]]:
+        for records in self.iter_case_chunks():
+            yield from records
+
+    def clusters(self) -> List[Dict[str, Any]]:
+        return self._read_json(self.manifest()["clusters"])
+
+    def _read_json(self, name: str) -> Any:
+        with gzip.open(os.path.join(self.data_dir, name), "rt", encoding="utf-8") as f:
+            return json.load(f)
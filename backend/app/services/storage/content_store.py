@@ -0,0 +1,172 @@
+import asyncio
+import os
+import shutil
+from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+from sqlalchemy import select
+from app.db.session import AsyncSessionLocal
+from app.models.content import ContentBlob
+from app.services.ingest.uploads import StoredUpload, upload_service, PARTS_DIR
+from app.services.jobs.store import job_store, report_path_for
+from app.services.report_gen.sidecar import data_dir_for
+from app.core.config import settings
+from app.core.logging import get_logger
+
+logger = get_logger("content_store")
+
+STORE_DIR = "store"
+
+
+def _disk_usage(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _remove(path: str) -> int:
+    """Delete a file or directory tree and return the bytes freed."""
+    if not os.path.exists(path):
+        return 0
+    freed = _disk_usage(path)
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        os.remove(path)
+    return freed
+
+
+class ContentStore:
+    """
+    Content-addressed storage for uploaded workbooks (uploads/store/<aa>/<sha256><ext>).
+    Identical uploads share one physical file; `refcount` counts the jobs using it.
+    `collect` removes unreferenced blobs and keeps uploads, reports and exports under
+    STORAGE_BUDGET_BYTES by evicting orphans first, then least recently used jobs.
+    """
+
+    def __init__(self):
+        self.root = os.path.join(upload_service.upload_dir, STORE_DIR)
+
+    def blob_path(self, sha256: str, ext: str) -> str:
+        return os.path.join(self.root, sha256[:2], sha256 + ext.lower())
+
+    async def put(self, stored: StoredUpload) -> str:
+        """Move a freshly stored upload into the store (or drop it if the content exists) and add a reference."""
+        path = self.blob_path(stored.sha256, os.path.splitext(stored.path)[1])
+        async with AsyncSessionLocal() as session:
+            blob = await session.get(ContentBlob, stored.sha256)
+            if blob is not None and os.path.isfile(blob.path):
+                os.remove(stored.path)
+                path = blob.path
+                blob.refcount += 1
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(stored.path, path)
+                if blob is None:
+                    session.add(ContentBlob(sha256=stored.sha256, path=path, size=stored.size, refcount=1))
+                else:
+                    blob.path, blob.refcount = path, max(blob.refcount, 0) + 1
+            await session.commit()
+        return path
+
+    async def release(self, sha256: str) -> None:
+        async with AsyncSessionLocal() as session:
+            blob = await session.get(ContentBlob, sha256)
+            if blob is not None:
+                blob.refcount = max(blob.refcount - 1, 0)
+                await session.commit()
+
+    async def collect(self, active_paths: Iterable[str] = ()) -> Dict[str, int]:
+        """Garbage-collect storage. Files used by running jobs (`active_paths`) are never touched."""
+        try:
+            return await self._collect(set(os.path.abspath(p) for p in active_paths))
+        except Exception as e:
+            logger.error(f"Storage garbage collection failed: {e}")
+            return {}
+
+    async def _collect(self, active: set) -> Dict[str, int]:
+        freed = {"blobs": 0, "orphans": 0, "jobs": 0, "bytes": 0}
+
+        async with AsyncSessionLocal() as session:
+            for blob in (await session.execute(select(ContentBlob).where(ContentBlob.refcount <= 0))).scalars().all():
+                if os.path.abspath(blob.path) in active:
+                    continue
+                freed["bytes"] += await asyncio.to_thread(_remove, blob.path)
+                await session.delete(blob)
+                freed["blobs"] += 1
+            await session.commit()
+
+        roots = [upload_service.upload_dir, "reports", settings.EXPORT_DIR]
+        usage = sum(await asyncio.gather(*(asyncio.to_thread(_disk_usage, r) for r in roots)))
+        if usage <= settings.STORAGE_BUDGET_BYTES:
+            return freed
+
+        # 1. Orphans: uploads outside the store and reports without a job record, oldest first
+        known = await job_store.known_ids()
+        for path in await asyncio.to_thread(self._orphans, known, active):
+            if usage <= settings.STORAGE_BUDGET_BYTES:
+                break
+            released = await asyncio.to_thread(_remove, path)
+            usage -= released
+            freed["bytes"] += released
+            freed["orphans"] += 1
+
+        # 2. Finished jobs, least recently used first
+        for job in await job_store.list_evictable():
+            if usage <= settings.STORAGE_BUDGET_BYTES:
+                break
+            released = await asyncio.to_thread(self._remove_job_files, job.id)
+            await job_store.update(job.id, status="evicted", last_used_at=datetime.utcnow())
+            # Batch jobs reference one blob per member workbook
+            for sha256 in job.source_hashes or ([job.content_sha256] if job.content_sha256 else []):
+                await self.release(sha256)
+                released += await self._drop_if_unreferenced(sha256, active)
+            usage -= released
+            freed["bytes"] += released
+            freed["jobs"] += 1
+
+        logger.info(f"Storage GC: {freed}")
+        return freed
+
+    def _orphans(self, known: set, active: set) -> List[str]:
+        candidates: List[Tuple[float, str]] = []
+        if os.path.isdir(upload_service.upload_dir):
+            for name in os.listdir(upload_service.upload_dir):
+                path = os.path.join(upload_service.upload_dir, name)
+                if name in (STORE_DIR, PARTS_DIR) or name.endswith(".tmp") or os.path.abspath(path) in active:
+                    continue
+                candidates.append((os.path.getmtime(path), path))
+        if os.path.isdir("reports"):
+            for name in os.listdir("reports"):
+                path = os.path.join("reports", name)
+                job_id = name[len("report_"):].split(".")[0]
+                if job_id.endswith("_data"):
+                    job_id = job_id[:-len("_data")]
+                if name.startswith("report_") and job_id not in known:
+                    candidates.append((os.path.getmtime(path), path))
+        return [path for _, path in sorted(candidates)]
+
+    def _remove_job_files(self, job_id: str) -> int:
+        report_path = report_path_for(job_id)
+        paths = [report_path, data_dir_for(report_path)]
+        if os.path.isdir(settings.EXPORT_DIR):
+            paths += [os.path.join(settings.EXPORT_DIR, n) for n in os.listdir(settings.EXPORT_DIR) if n.startswith(job_id + ".")]
+        return sum(_remove(p) for p in paths)
+
+    async def _drop_if_unreferenced(self, sha256: str, active: set) -> int:
+        async with AsyncSessionLocal() as session:
+            blob = await session.get(ContentBlob, sha256)
+            if blob is None or blob.refcount > 0 or os.path.abspath(blob.path) in active:
+                return 0
+            released = await asyncio.to_thread(_remove, blob.path)
+            await session.delete(blob)
+            await session.commit()
+            return released
+
+content_store = ContentStore()
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Settings require an API key; tests never reach the provider
+os.environ.setdefault("LLM_API_KEY", "test")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app.db.base  # noqa: E402,F401  Registers every model so ORM classes can be instantiated
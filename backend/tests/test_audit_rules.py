@@ -0,0 +1,62 @@
+import pytest
+from app.models.testcase import TestCase as Case
+from app.services.audit.rules import rule_pre_auditor
+
+
+def case(expected, actual, remark=None):
+    return Case(case_name="用例", expected=expected, actual=actual, remark=remark, test_result="通过", normalized_result="Pass")
+
+
+def verdict(expected, actual, remark=None):
+    return rule_pre_auditor.pre_audit([case(expected, actual, remark)])[0][0]
+
+
+def test_identical_text_passes():
+    assert verdict("页面显示登录成功", "页面显示登录成功") == "Pass"
+
+
+def test_explicit_pass_statement_passes():
+    assert verdict("页面跳转到首页", "通过") == "Pass"
+
+
+def test_failure_remark_is_flagged():
+    assert verdict("页面显示登录成功", "页面显示登录成功", remark="已提问题单") == "Flagged"
+
+
+def test_placeholder_actual_is_flagged():
+    assert verdict("页面显示登录成功", "无") == "Flagged"
+
+
+def test_failure_actual_unlike_expected_is_flagged():
+    assert verdict("订单提交成功并跳转到支付页", "系统报错 500，白屏") == "Flagged"
+
+
+@pytest.mark.parametrize("expected, actual", [
+    ("金额显示为10.00元", "金额显示为100.00元"),
+    ("列表显示20条记录", "列表显示2条记录"),
+    ("版本号为1.2.3", "版本号为1.2.4"),
+])
+def test_different_figures_go_to_llm(expected, actual):
+    assert verdict(expected, actual) is None
+
+
+def test_same_figures_still_pass():
+    assert verdict("金额显示为10.00元，共3笔", "金额显示为 10.00 元，共 3 笔。") == "Pass"
+
+
+def test_negated_actual_is_not_a_local_pass():
+    assert verdict("导出数据与页面数据一致", "导出数据与页面数据不一致") is None
+
+
+def test_failure_words_in_both_can_pass():
+    assert verdict("输入错误密码时提示密码错误", "输入错误密码时提示密码错误。") == "Pass"
+
+
+def test_one_verdict_per_case_in_order():
+    verdicts = rule_pre_auditor.pre_audit([
+        case("页面显示登录成功", "页面显示登录成功"),
+        case("金额显示为10.00元", "金额显示为100.00元"),
+        case("页面显示登录成功", ""),
+    ])
+    assert [status for status, _ in verdicts] == ["Pass", None, "Flagged"]
+    assert rule_pre_auditor.pre_audit([]) == []
@@ -0,0 +1,72 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from app.services.llm.batching import BatchRoundTrip, encode_key, run_batched_round_trips
+
+
+def items(*ordinals):
+    return [SimpleNamespace(ordinal=o, result=None) for o in ordinals]
+
+
+@pytest.mark.parametrize("ordinal", [0, 1, 9, 10, 35, 36, 1295, 1296, 123456789])
+def test_encode_key_round_trips(ordinal):
+    key = encode_key(ordinal)
+    assert int(key, 36) == ordinal
+    assert key == key.lower() and key.isalnum()
+
+
+def test_encode_key_is_unique_and_rejects_negatives():
+    assert len({encode_key(o) for o in range(5000)}) == 5000
+    with pytest.raises(ValueError):
+        encode_key(-1)
+
+
+def test_batch_needs_unique_ordinals():
+    with pytest.raises(ValueError):
+        BatchRoundTrip(items(1, 1))
+    with pytest.raises(ValueError):
+        BatchRoundTrip([SimpleNamespace(ordinal=None)])
+
+
+def test_map_results_matches_by_key_in_any_order():
+    batch = items(3, 40, 77)
+    trip = BatchRoundTrip(batch)
+    results = [{"k": k.upper(), "v": i} for i, k in enumerate(reversed(trip.keys()))]
+    outcome = trip.map_results(results)
+    assert outcome.requeue == []
+    assert {item.ordinal: res["v"] for item, res in outcome.matched} == {77: 0, 40: 1, 3: 2}
+
+
+def test_map_results_requeues_missing_duplicated_and_invalid():
+    batch = items(1, 2, 3, 4)
+    trip = BatchRoundTrip(batch)
+    k1, k2, k3, k4 = trip.keys()
+    outcome = trip.map_results(
+        [{"k": k1, "ok": True}, {"k": k2, "ok": True}, {"k": k2, "ok": True}, {"k": k3, "ok": False}, {"k": "zzz", "ok": True}, "junk"],
+        validate=lambda res: res["ok"],
+    )
+    assert [item.ordinal for item, _ in outcome.matched] == [1]
+    assert sorted(item.ordinal for item in outcome.requeue) == [2, 3, 4]
+
+
+def test_map_results_tolerates_non_list_responses():
+    trip = BatchRoundTrip(items(5))
+    assert [i.ordinal for i in trip.map_results({"k": "5"}).requeue] == [5]
+
+
+def test_round_trips_requeue_until_resolved():
+    batch = items(*range(7))
+    calls = []
+
+    async def call(trip):
+        calls.append(len(trip.batch))
+        # Drop the first item of every batch in the first round
+        return [{"k": k} for k in trip.keys()[len(calls) <= 3:]]
+
+    def apply(item, res):
+        item.result = res["k"]
+
+    unresolved = asyncio.run(run_batched_round_trips(batch, 3, call, apply, max_rounds=2))
+    assert unresolved == []
+    assert calls == [3, 3, 1, 3]
+    assert [item.result for item in batch] == [encode_key(i) for i in range(7)]
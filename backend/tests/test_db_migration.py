@@ -0,0 +1,31 @@
+from sqlalchemy import create_engine, inspect, text
+from app.db.base import Base
+from app.db.session import add_missing_columns
+
+
+def test_columns_added_to_existing_tables():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        # jobs as created before content hashes, batch sources and token accounting existed
+        conn.execute(text("CREATE TABLE jobs (id VARCHAR PRIMARY KEY, status VARCHAR, created_at DATETIME, updated_at DATETIME)"))
+        conn.execute(text("INSERT INTO jobs (id, status) VALUES ('old', 'completed')"))
+        Base.metadata.create_all(conn)
+        add_missing_columns(conn, Base.metadata)
+
+    inspector = inspect(engine)
+    columns = {c["name"] for c in inspector.get_columns("jobs")}
+    assert {"content_sha256", "source_hashes", "token_budget", "token_usage", "last_used_at"} <= columns
+    assert any(ix["column_names"] == ["content_sha256"] for ix in inspector.get_indexes("jobs"))
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE jobs SET token_budget = 10 WHERE id = 'old'"))
+        assert conn.execute(text("SELECT status, token_budget, token_usage FROM jobs")).one() == ("completed", 10, None)
+
+
+def test_up_to_date_schema_is_left_alone():
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        Base.metadata.create_all(conn)
+        before = {t: [c["name"] for c in inspect(conn).get_columns(t)] for t in Base.metadata.tables}
+        add_missing_columns(conn, Base.metadata)
+        after = {t: [c["name"] for c in inspect(conn).get_columns(t)] for t in Base.metadata.tables}
+    assert before == after
@@ -0,0 +1,31 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api.endpoints import export
+from app.services.export.exporter import ExportUnavailable, export_service
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(export.router, prefix="/jobs")
+    return TestClient(app)
+
+
+def test_missing_job_is_404(client):
+    assert client.get("/jobs/no-such-job/export", params={"format": "xlsx"}).status_code == 404
+    assert client.get("/jobs/no-such-job/export", params={"format": "csv"}).status_code == 404
+
+
+def test_unknown_format_is_400(client):
+    assert client.get("/jobs/job/export", params={"format": "pdf"}).status_code == 400
+
+
+def test_missing_optional_dependency_is_501(client, monkeypatch):
+    def unavailable(*args):
+        raise ExportUnavailable("Parquet 导出需要安装 pyarrow。")
+
+    monkeypatch.setattr(export_service, "export_file", unavailable)
+    response = client.get("/jobs/job/export", params={"format": "parquet"})
+    assert response.status_code == 501
+    assert "pyarrow" in response.json()["detail"]
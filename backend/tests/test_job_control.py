@@ -0,0 +1,55 @@
+import asyncio
+from app.services.jobs.control import JobControl
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_repeated_cancel_does_not_interrupt_cleanup():
+    recorded = []
+
+    async def pipeline():
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            # Stands in for writing the cancelled status to the job store
+            await asyncio.sleep(0.05)
+            recorded.append("cancelled")
+
+    async def main():
+        control = JobControl()
+        task = control.start("job", pipeline())
+        await asyncio.sleep(0)
+        first = asyncio.create_task(control.cancel("job"))
+        await asyncio.sleep(0.01)
+        assert await control.cancel("job")
+        await first
+        assert task.done() and not task.cancelled()
+        assert not control.active("job")
+        assert not await control.cancel("job")
+
+    run(main())
+    assert recorded == ["cancelled"]
+
+
+def test_pause_holds_the_pipeline_at_its_checkpoint():
+    reached = []
+
+    async def pipeline(control):
+        await control.checkpoint("job")
+        reached.append("stage")
+
+    async def main():
+        control = JobControl()
+        assert not control.pause("job")
+        control.start("job", pipeline(control))
+        assert control.pause("job") and control.paused("job")
+        assert not control.pause("job")
+        await asyncio.sleep(0.01)
+        assert reached == []
+        assert control.resume("job") and not control.resume("job")
+        await asyncio.sleep(0.01)
+        assert reached == ["stage"] and not control.active("job")
+
+    run(main())
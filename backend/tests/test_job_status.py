@@ -0,0 +1,53 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.api.endpoints import upload
+from app.services.jobs.events import event_hub
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(upload.router, prefix="/jobs")
+    return TestClient(app)
+
+
+@pytest.fixture
+def job():
+    job_id = "status-test"
+    upload.job_logs[job_id] = []
+    upload.job_meta[job_id] = {"status": "running", "report_url": None, "error": None}
+    event_hub.open(job_id, upload.job_logs[job_id])
+    yield job_id
+    upload.job_logs.pop(job_id, None)
+    upload.job_meta.pop(job_id, None)
+    event_hub.channels.pop(job_id, None)
+
+
+def test_unchanged_status_answers_304(client, job):
+    first = client.get(f"/jobs/status/{job}")
+    assert first.status_code == 200
+    again = client.get(f"/jobs/status/{job}", headers={"If-None-Match": first.headers["etag"]})
+    assert again.status_code == 304
+
+
+def test_unpublished_progress_changes_the_etag(client, job):
+    event_hub.stage(job, "audit", total=10)
+    first = client.get(f"/jobs/status/{job}")
+    last_id = event_hub.get(job).last_id
+    # Inside JOB_EVENTS_PROGRESS_INTERVAL the counter moves without an event
+    event_hub.advance(job, "audit", 3)
+    assert event_hub.get(job).last_id == last_id
+
+    second = client.get(f"/jobs/status/{job}", headers={"If-None-Match": first.headers["etag"]})
+    assert second.status_code == 200
+    assert second.json()["progress"]["audit"]["done"] == 3
+    assert second.headers["etag"] != first.headers["etag"]
+
+
+def test_meta_changes_without_events_change_the_etag(client, job):
+    first = client.get(f"/jobs/status/{job}")
+    upload.job_meta[job]["usage"] = {"total_tokens": 120}
+    second = client.get(f"/jobs/status/{job}", headers={"If-None-Match": first.headers["etag"]})
+    assert second.status_code == 200
+    assert second.json()["usage"] == {"total_tokens": 120}
@@ -0,0 +1,157 @@
+import httpx
+import pytest
+from zhipuai import APIConnectionError, APIStatusError
+from app.services.llm import resilience
+from app.services.llm.resilience import CircuitBreaker, CircuitOpen, Deadline, HedgePolicy, is_outage
+
+REQUEST = httpx.Request("POST", "https://llm.test/chat")
+
+
+def status_error(code):
+    return APIStatusError("error", response=httpx.Response(code, request=REQUEST))
+
+
+OUTAGE = APIConnectionError(request=REQUEST)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock.monotonic)
+    return clock
+
+
+def test_outage_classification():
+    assert is_outage(OUTAGE)
+    assert is_outage(status_error(503))
+    assert not is_outage(status_error(429))
+    assert not is_outage(ValueError("bad json"))
+
+
+def test_breaker_opens_on_a_majority_of_outages(clock):
+    breaker = CircuitBreaker(threshold=3, cooldown=30)
+    for _ in range(3):
+        breaker.record_success()
+    for _ in range(3):
+        breaker.record_failure(OUTAGE)
+    # 3 outages out of 6 are not a majority
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure(status_error(500))
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpen):
+        breaker.check()
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+
+def test_bad_answers_do_not_trip_the_breaker(clock):
+    breaker = CircuitBreaker(threshold=2, cooldown=30)
+    for _ in range(5):
+        breaker.record_failure(ValueError("truncated json"))
+        breaker.record_failure(status_error(400))
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert not any(breaker.outcomes)
+
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=30)
+    breaker.record_failure(OUTAGE)
+    assert breaker.is_open
+
+    clock.now += 30
+    assert not breaker.is_open
+    breaker.check()
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # Concurrent calls wait for the probe's outcome
+    with pytest.raises(CircuitOpen):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=30)
+    breaker.record_failure(OUTAGE)
+    clock.now += 31
+    breaker.before_call()
+    breaker.record_failure(OUTAGE)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.opened_at == clock.now
+    clock.now += 29
+    with pytest.raises(CircuitOpen):
+        breaker.check()
+
+
+def test_probe_answered_with_a_bad_response_closes(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=30)
+    breaker.record_failure(OUTAGE)
+    clock.now += 30
+    breaker.before_call()
+    breaker.record_failure(status_error(422))
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_disabled_breaker_never_opens(clock):
+    breaker = CircuitBreaker(threshold=0, cooldown=30)
+    for _ in range(50):
+        breaker.record_failure(OUTAGE)
+        breaker.before_call()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_deadline_starts_on_first_slot(clock):
+    deadline = Deadline(10)
+    clock.now += 100
+    assert deadline.remaining() == 10
+    deadline.start()
+    clock.now += 4
+    deadline.start()
+    assert deadline.remaining() == 6
+
+
+def test_hedge_delay_is_a_latency_quantile():
+    policy = HedgePolicy(quantile=0.9, max_ratio=1.0, min_samples=10)
+    for seconds in range(1, 10):
+        policy.observe("audit", float(seconds))
+    assert policy.delay("audit") is None
+    policy.observe("audit", 10.0)
+    assert policy.delay("audit") == 10.0
+    for seconds in range(11, 101):
+        policy.observe("audit", float(seconds))
+    assert policy.delay("audit") == 91.0
+    assert policy.delay("tagging") is None
+
+
+def test_hedge_window_forgets_old_latencies():
+    policy = HedgePolicy(quantile=0.5, max_ratio=1.0, min_samples=1, window=5)
+    for _ in range(5):
+        policy.observe("audit", 100.0)
+    for _ in range(5):
+        policy.observe("audit", 1.0)
+    assert policy.delay("audit") == 1.0
+
+
+def test_hedges_are_capped_at_a_share_of_calls():
+    policy = HedgePolicy(quantile=0.9, max_ratio=0.1, min_samples=1)
+    assert not policy.allow()
+    for _ in range(20):
+        policy.count()
+    assert policy.allow()
+    assert policy.allow()
+    assert not policy.allow()
+    assert policy.hedges == 2
+    # Hedges stay below 10 % of calls: the 21st call makes room for a third
+    policy.count()
+    assert policy.allow()
+    assert not policy.allow()
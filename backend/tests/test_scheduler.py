@@ -0,0 +1,153 @@
+import asyncio
+import pytest
+from app.core.config import settings
+from app.services.llm.scheduler import FairScheduler
+
+
+@pytest.fixture(autouse=True)
+def weights(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_PRIORITY_WEIGHTS", {"interactive": 4.0, "bulk": 1.0})
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def grant_order(scheduler, calls):
+    """Queue one call per job id behind a held slot, then free the slot call by call."""
+    holder = await scheduler.acquire(None, None)
+    order = []
+
+    async def call(job_id):
+        await scheduler.acquire(job_id, None)
+        order.append(job_id)
+
+    tasks = [asyncio.create_task(call(job_id)) for job_id in calls]
+    await settle()
+    scheduler.release(holder, None)
+    for i in range(len(calls)):
+        await settle()
+        scheduler.release(scheduler.jobs[order[i]], None)
+    await asyncio.gather(*tasks)
+    return order
+
+
+def test_equal_weights_alternate():
+    async def main():
+        scheduler = FairScheduler(1)
+        scheduler.open("a", "bulk")
+        scheduler.open("b", "bulk")
+        return await grant_order(scheduler, ["a"] * 3 + ["b"] * 3)
+
+    assert run(main()) == ["a", "b", "a", "b", "a", "b"]
+
+
+def test_grants_follow_weights():
+    async def main():
+        scheduler = FairScheduler(1)
+        scheduler.open("bulk", "bulk")
+        scheduler.open("small", "interactive")
+        return await grant_order(scheduler, ["bulk"] * 5 + ["small"] * 5)
+
+    # The interactive job gets four slots for every one of the bulk job's
+    assert run(main()) == ["bulk"] + ["small"] * 4 + ["bulk", "small"] + ["bulk"] * 3
+
+
+def test_idle_job_gets_no_credit_for_waiting():
+    async def main():
+        scheduler = FairScheduler(1)
+        scheduler.open("a", "bulk")
+        await grant_order(scheduler, ["a"] * 4)
+        scheduler.open("late", "bulk")
+        return await grant_order(scheduler, ["a"] * 3 + ["late"] * 3)
+
+    # "late" starts at the current virtual time: it goes first once, not four times in a row
+    assert run(main()) == ["late", "a", "late", "a", "late", "a"]
+
+
+def test_paused_job_gets_no_slots_until_resumed():
+    async def main():
+        scheduler = FairScheduler(1)
+        paused = scheduler.open("paused", "interactive")
+        scheduler.open("other", "bulk")
+        holder = await scheduler.acquire("other", None)
+        scheduler.pause("paused")
+        waiting = asyncio.create_task(scheduler.acquire("paused", None))
+        await settle()
+        scheduler.release(holder, None)
+        await settle()
+        assert not waiting.done() and scheduler.inflight == 0
+        assert scheduler.report("paused")["queued"] == 1
+
+        # Other jobs keep being served meanwhile
+        await scheduler.acquire("other", None)
+        scheduler.release(scheduler.jobs["other"], None)
+
+        scheduler.resume("paused")
+        assert await waiting is paused
+        assert scheduler.inflight == 1 and paused.inflight == 1
+
+    run(main())
+
+
+def test_cancel_drops_queued_calls_and_frees_no_extra_slots():
+    async def main():
+        scheduler = FairScheduler(2)
+        job = scheduler.open("job", "bulk")
+        scheduler.open("other", "bulk")
+        running = [await scheduler.acquire("job", None) for _ in range(2)]
+        queued = [asyncio.create_task(scheduler.acquire("job", None)) for _ in range(3)]
+        other = asyncio.create_task(scheduler.acquire("other", None))
+        await settle()
+
+        scheduler.cancel("job")
+        assert scheduler.cancelled("job") and job.queued == 0
+        for task in queued:
+            task.cancel()
+        await settle()
+        assert all(task.cancelled() for task in queued)
+        assert scheduler.inflight == 2
+
+        # Calls in flight give their slots back; the cancelled job gets none of them
+        scheduler.release(running[0], None)
+        await settle()
+        assert other.done()
+        scheduler.release(running[1], None)
+        assert job.inflight == 0 and scheduler.inflight == 1
+
+    run(main())
+
+
+def test_granted_slot_is_returned_if_the_caller_went_away():
+    async def main():
+        scheduler = FairScheduler(1)
+        scheduler.open("job", "bulk")
+        holder = await scheduler.acquire("job", None)
+        waiting = asyncio.create_task(scheduler.acquire("job", None))
+        await settle()
+        # Grant and cancellation land in the same loop iteration
+        scheduler.release(holder, None)
+        waiting.cancel()
+        await settle()
+        assert waiting.cancelled()
+        assert scheduler.inflight == 0 and scheduler.jobs["job"].inflight == 0
+
+    run(main())
+
+
+def test_closed_job_is_dropped_once_idle():
+    async def main():
+        scheduler = FairScheduler(1)
+        job = scheduler.open("job", "bulk")
+        await scheduler.acquire("job", None)
+        report = scheduler.close("job")
+        assert report["inflight"] == 1 and "job" in scheduler.jobs
+        scheduler.release(job, None)
+        assert "job" not in scheduler.jobs
+
+    run(main())
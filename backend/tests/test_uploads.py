@@ -0,0 +1,127 @@
+import asyncio
+import hashlib
+import os
+import pytest
+from app.core.config import settings
+from app.services.ingest.uploads import UploadError, UploadService, UploadTooLarge
+
+BOUNDARY = "----test-boundary"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def form_body(content: bytes, filename: str = "cases.xlsx", field: str = "file") -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        'Content-Disposition: form-data; name="note"\r\n\r\n'
+        "not a file\r\n"
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode() + content + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+async def chunked(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def service(tmp_path):
+    return UploadService(str(tmp_path))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 16])
+def test_multipart_file_is_streamed_to_disk(service, tmp_path, chunk_size):
+    # Boundary-like bytes inside the file must survive however the body is split
+    content = os.urandom(5000) + f"\r\n--{BOUNDARY}x".encode() + os.urandom(300)
+    stored, filename = run(service.save_multipart_file(
+        CONTENT_TYPE, chunked(form_body(content, "../../周报.xlsx"), chunk_size), lambda name: str(tmp_path / f"job_{name}"),
+    ))
+    assert filename == "周报.xlsx"
+    assert stored.path == str(tmp_path / "job_周报.xlsx")
+    with open(stored.path, "rb") as f:
+        assert f.read() == content
+    assert stored.size == len(content)
+    assert stored.sha256 == hashlib.sha256(content).hexdigest()
+
+
+def test_multipart_without_file_field_is_rejected(service, tmp_path):
+    with pytest.raises(UploadError):
+        run(service.save_multipart_file(CONTENT_TYPE, chunked(form_body(b"x", field="other"), 64), lambda name: str(tmp_path / name)))
+    with pytest.raises(UploadError):
+        run(service.save_multipart_file("application/json", chunked(b"{}", 64), lambda name: str(tmp_path / name)))
+
+
+def test_truncated_multipart_body_is_rejected(service, tmp_path):
+    body = form_body(b"a" * 1000)[:-200]
+    with pytest.raises(UploadError):
+        run(service.save_multipart_file(CONTENT_TYPE, chunked(body, 64), lambda name: str(tmp_path / name)))
+    assert os.listdir(tmp_path) == []
+
+
+def test_multipart_size_limit_applies_while_reading(service, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_MAX_BYTES", 1000)
+    received = []
+
+    async def body():
+        async for chunk in chunked(form_body(b"a" * 100_000), 100):
+            received.append(chunk)
+            yield chunk
+
+    with pytest.raises(UploadTooLarge):
+        run(service.save_multipart_file(CONTENT_TYPE, body(), lambda name: str(tmp_path / name)))
+    assert sum(map(len, received)) < 2000
+    assert os.listdir(tmp_path) == []
+
+
+def test_parts_are_assembled_in_order(service, tmp_path):
+    parts = [b"first-", b"second-", b"third"]
+    content = b"".join(parts)
+    session = service.create_session("cases.xlsx", len(content), hashlib.sha256(content).hexdigest())
+    upload_id = session["upload_id"]
+    for index in (2, 0, 1):
+        run(service.write_part(upload_id, index, chunked(parts[index], 3)))
+    # A re-sent part replaces the earlier copy
+    run(service.write_part(upload_id, 1, chunked(parts[1], 4)))
+    assert service.session_status(upload_id)["received_parts"] == [0, 1, 2]
+
+    stored = run(service.complete_session(upload_id, str(tmp_path / "out.xlsx")))
+    with open(stored.path, "rb") as f:
+        assert f.read() == content
+    with pytest.raises(UploadError):
+        service.session_status(upload_id)
+
+
+def test_incomplete_or_corrupt_parts_are_rejected(service, tmp_path):
+    content = b"abcdef"
+    session = service.create_session("cases.xlsx", len(content), hashlib.sha256(content).hexdigest())
+    upload_id = session["upload_id"]
+    run(service.write_part(upload_id, 1, chunked(b"def", 3)))
+    with pytest.raises(UploadError):
+        run(service.complete_session(upload_id, str(tmp_path / "out.xlsx")))
+
+    run(service.write_part(upload_id, 0, chunked(b"xyz", 3)))
+    with pytest.raises(UploadError):
+        run(service.complete_session(upload_id, str(tmp_path / "out.xlsx")))
+    assert not os.path.exists(tmp_path / "out.xlsx")
+    # The session survives so the bad part can be re-sent
+    run(service.write_part(upload_id, 0, chunked(b"abc", 3)))
+    assert run(service.complete_session(upload_id, str(tmp_path / "out.xlsx"))).size == len(content)
+
+
+def test_part_size_limits(service, monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_MAX_BYTES", 10)
+    monkeypatch.setattr(settings, "UPLOAD_PART_BYTES", 4)
+    with pytest.raises(UploadTooLarge):
+        service.create_session("cases.xlsx", 11)
+    upload_id = service.create_session("cases.xlsx")["upload_id"]
+    with pytest.raises(UploadTooLarge):
+        run(service.write_part(upload_id, 0, chunked(b"x" * 9, 3)))
+    run(service.write_part(upload_id, 0, chunked(b"x" * 8, 3)))
+    with pytest.raises(UploadTooLarge):
+        run(service.write_part(upload_id, 1, chunked(b"x" * 3, 3)))
+    assert service.session_status(upload_id)["received_parts"] == [0]
@@ -0,0 +1,317 @@
+"""
+End-to-end pipeline benchmark against the local fake LLM server.
+
+For every size, a synthetic workbook (`workbook_generator.py`) is analyzed by
+`run_local_pipeline` in a fresh child process (so peak RSS is per run) pointed at
+`fake_llm_server.py` through LLM_BASE_URL. Reported per run: wall time per stage, LLM
+calls and tokens per prompt type, LLM call latency quantiles per stage, peak RSS,
+throughput and accuracy against the generator's ground truth. Results are appended to a JSONL file so later runs can be
+compared against earlier ones with the same settings.
+
+Usage (from the project root):
+    python benchmarks/bench_pipeline.py --sizes 1000 10000 100000
+    python benchmarks/bench_pipeline.py --sizes 10000 --preset chaotic --sheets 4 --latency-ms 300 --rate-limit-rate 0.02 --compare
+    LLM_HEDGE_ENABLED=false python benchmarks/bench_pipeline.py --sizes 2000 --stall-rate 0.01 --stall-seconds 60
+    python benchmarks/bench_pipeline.py --sizes 10000 --offline --batch-delay 5
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fake_llm_server import add_config_arguments, config_from_args  # noqa: E402
+from workbook_generator import PRESETS, GeneratorConfig, generate_workbook, score_cases  # noqa: E402
+
+DEFAULT_RESULTS = os.path.join(BENCH_DIR, "results", "pipeline.jsonl")
+STAGE_ORDER = ["ingest", "tagging", "audit", "extraction", "stats", "report"]
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def peak_rss_mb() -> float:
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / 1024 if sys.platform != "darwin" else peak / (1 << 20), 1)
+
+
+# ---------------------------------------------------------------------------
+# Child: one pipeline run
+
+
+async def run_one(workbook: str, rows: int, manifest_path: str) -> Dict[str, Any]:
+    sys.path.insert(0, os.path.join(PROJECT_ROOT, "backend"))
+    from app.db.session import init_db
+    from app.api.endpoints import upload
+    from app.services.jobs.progress import current_stage
+    from app.services.llm.client import LLMClient
+    from app.services.jobs.events import event_hub
+    from app.services.jobs.store import report_path_for
+    from app.services.report_gen.sidecar import SidecarReader, data_dir_for
+
+    await init_db()
+
+    # Stage boundaries, taken from the same hook that drives progress events
+    marks: List[tuple] = []
+    original_stage = event_hub.stage
+
+    def timed_stage(job_id: str, stage: str, total: Optional[int] = None) -> None:
+        marks.append((stage, time.perf_counter()))
+        original_stage(job_id, stage, total)
+
+    event_hub.stage = timed_stage
+
+    # Latency of each LLM call as its stage sees it: queueing, retries and hedges included
+    call_latency: Dict[str, List[float]] = {}
+    original_call = LLMClient.achat_completion
+
+    async def timed_call(self, *args, **kwargs):
+        began = time.perf_counter()
+        try:
+            return await original_call(self, *args, **kwargs)
+        finally:
+            call_latency.setdefault(current_stage()[1], []).append(time.perf_counter() - began)
+
+    LLMClient.achat_completion = timed_call
+
+    job_id = f"bench-{rows}"
+    upload.job_logs[job_id] = []
+    upload.job_meta[job_id] = {"status": "pending", "report_url": None, "error": None, "source_paths": [workbook]}
+    event_hub.open(job_id, upload.job_logs[job_id])
+
+    started = time.perf_counter()
+    await upload.run_local_pipeline(job_id, [upload.JobSource(workbook, os.path.basename(workbook))])
+    finished = time.perf_counter()
+
+    stages = {}
+    for (stage, at), (_, until) in zip(marks, marks[1:] + [(None, finished)]):
+        stages[stage] = round(stages.get(stage, 0.0) + until - at, 3)
+    meta = upload.job_meta[job_id]
+    rss = peak_rss_mb() # Before scoring, which loads the ground truth
+
+    accuracy = None
+    reader = SidecarReader(data_dir_for(report_path_for(job_id)))
+    if meta["status"] == "completed" and reader.exists():
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            accuracy = score_cases(json.load(f), reader.iter_cases())
+    return {
+        "status": meta["status"],
+        "error": meta.get("error"),
+        "cases": (meta.get("stats") or {}).get("total_cases", 0),
+        "wall_seconds": round(finished - started, 3),
+        "stages": stages,
+        "llm_latency": {
+            stage: {"calls": len(v), "p50": round(percentile(v, 0.5), 3), "p99": round(percentile(v, 0.99), 3), "max": round(max(v), 3)}
+            for stage, v in call_latency.items()
+        },
+        "peak_rss_mb": rss,
+        "accuracy": accuracy,
+    }
+
+
+def child_main(args: argparse.Namespace) -> None:
+    os.chdir(args.workdir) # uploads/, reports/ and the database stay in the scratch dir
+    result = asyncio.run(run_one(args.workbook, args.rows, args.manifest))
+    print("BENCH_RESULT " + json.dumps(result, ensure_ascii=False), flush=True)
+
+
+# ---------------------------------------------------------------------------
+# Parent: server, runs, report
+
+
+def start_server(args: argparse.Namespace, port: int, scratch: str) -> subprocess.Popen:
+    cmd = [
+        sys.executable, os.path.join(BENCH_DIR, "fake_llm_server.py"), "--port", str(port),
+        "--latency-ms", str(args.latency_ms), "--latency-dist", args.latency_dist,
+        "--latency-sigma", str(args.latency_sigma), "--error-rate", str(args.error_rate),
+        "--rate-limit-rate", str(args.rate_limit_rate), "--malformed-rate", str(args.malformed_rate),
+        "--fast-models", args.fast_models, "--fast-latency-factor", str(args.fast_latency_factor),
+        "--stall-rate", str(args.stall_rate), "--stall-seconds", str(args.stall_seconds),
+        "--outage-after", str(args.outage_after), "--outage-seconds", str(args.outage_seconds),
+        "--seed", str(args.seed), "--batch-delay", str(args.batch_delay),
+    ]
+    if args.offline:
+        cmd += ["--batch-dir", os.path.join(scratch, "batches", "local")]
+    server = subprocess.Popen(cmd)
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/stats", timeout=1.0)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError("fake LLM server did not start")
+
+
+def run_size(args: argparse.Namespace, rows: int, port: int, scratch: str) -> Dict[str, Any]:
+    workdir = os.path.join(scratch, f"run_{rows}")
+    os.makedirs(workdir, exist_ok=True)
+    workbook = os.path.join(workdir, f"bench_{rows}.xlsx")
+    generate_workbook(workbook, workbook_config(args, rows))
+    manifest = os.path.splitext(workbook)[0] + ".manifest.json"
+
+    httpx.post(f"http://127.0.0.1:{port}/reset")
+    env = {
+        **os.environ,
+        "LLM_API_KEY": "bench.fake-key",
+        "LLM_BASE_URL": f"http://127.0.0.1:{port}/api/paas/v4",
+        "DATABASE_URL": "sqlite+aiosqlite:///./bench.db",
+    }
+    if args.offline:
+        # Bulk stages go through local batch files, answered by the fake server
+        env.update(LLM_OFFLINE_MIN_CASES="1", LLM_BATCH_BACKEND="local", LLM_BATCH_DIR=os.path.join(scratch, "batches"), LLM_BATCH_POLL_SECONDS="0.5")
+    proc = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", "--workdir", workdir, "--workbook", workbook, "--manifest", manifest, "--rows", str(rows)],
+        env=env, capture_output=True, text=True,
+    )
+    line = next((l for l in proc.stdout.splitlines() if l.startswith("BENCH_RESULT ")), None)
+    if line is None:
+        sys.stderr.write(proc.stderr[-4000:])
+        raise RuntimeError(f"benchmark run for {rows} rows failed (exit {proc.returncode})")
+    result = json.loads(line[len("BENCH_RESULT "):])
+
+    llm = httpx.get(f"http://127.0.0.1:{port}/stats").json()
+    result["rows"] = rows
+    result["llm_calls"] = llm["calls"]
+    result["llm_total_calls"] = llm["total_calls"]
+    result["llm_tokens"] = llm["total_tokens"]
+    result["llm_injected"] = llm["injected"]
+    result["llm_models"] = llm["models"]
+    result["llm_truncated"] = llm["truncated"]
+    result["rows_per_second"] = round(result["cases"] / result["wall_seconds"], 1) if result["wall_seconds"] else 0.0
+    return result
+
+
+def workbook_config(args: argparse.Namespace, rows: int) -> GeneratorConfig:
+    return GeneratorConfig.preset(args.preset, rows=rows, sheets=args.sheets, seed=args.seed)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def load_previous(path: str, server_config: Dict[str, Any], workbook: Dict[str, Any]) -> Dict[int, Dict[str, Any]]:
+    """Latest earlier result per size with the same fake-server and workbook settings."""
+    previous: Dict[int, Dict[str, Any]] = {}
+    if not os.path.isfile(path):
+        return previous
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if record.get("server") == server_config and record.get("workbook") == workbook and record.get("status") == "completed":
+                previous[record["rows"]] = record
+    return previous
+
+
+def _delta(new: float, old: Optional[float]) -> str:
+    if not old:
+        return ""
+    return f" ({(new - old) / old * 100:+.0f}%)"
+
+
+def print_result(result: Dict[str, Any], previous: Optional[Dict[str, Any]]) -> None:
+    old = previous or {}
+    print(f"\n== {result['rows']} rows: {result['status']}" + (f" ({result['error']})" if result.get("error") else ""))
+    print(f"  wall {result['wall_seconds']}s{_delta(result['wall_seconds'], old.get('wall_seconds'))}, "
+          f"{result['rows_per_second']} rows/s{_delta(result['rows_per_second'], old.get('rows_per_second'))}, "
+          f"peak RSS {result['peak_rss_mb']} MB{_delta(result['peak_rss_mb'], old.get('peak_rss_mb'))}")
+    stages = result["stages"]
+    print("  stages: " + ", ".join(
+        f"{s} {stages[s]}s{_delta(stages[s], (old.get('stages') or {}).get(s))}" for s in STAGE_ORDER if s in stages
+    ))
+    print(f"  LLM: {result['llm_total_calls']} calls{_delta(result['llm_total_calls'], old.get('llm_total_calls'))}, "
+          f"{result['llm_tokens']} tokens{_delta(result['llm_tokens'], old.get('llm_tokens'))} "
+          f"{result['llm_calls']}" + (f", injected faults {result['llm_injected']}" if result["llm_injected"] else "")
+          + (f", cut at max_tokens {result['llm_truncated']}" if result.get("llm_truncated") else ""))
+    if result.get("llm_latency"):
+        old_latency = old.get("llm_latency") or {}
+        print("  LLM latency: " + ", ".join(
+            f"{s} p50 {v['p50']}s p99 {v['p99']}s{_delta(v['p99'], (old_latency.get(s) or {}).get('p99'))}"
+            for s, v in result["llm_latency"].items()
+        ))
+    if result.get("llm_models"):
+        print(f"  models: {result['llm_models']}")
+    if result.get("accuracy"):
+        acc, old_acc = result["accuracy"], old.get("accuracy") or {}
+        print("  accuracy: " + ", ".join(
+            f"{name} {value}{_delta(value, old_acc.get(name)) if value is not None else ''}"
+            for name, value in acc.items() if name not in ("truth_rows", "matched_rows")
+        ))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="moderate", help="workbook messiness")
+    parser.add_argument("--sheets", type=int, default=1)
+    parser.add_argument("--results", default=DEFAULT_RESULTS, help="JSONL file the results are appended to")
+    parser.add_argument("--compare", action="store_true", help="show changes against the previous run with the same settings")
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch directory (workbooks, reports)")
+    parser.add_argument("--offline", action="store_true", help="run tagging, audit and extraction through offline batch files")
+    add_config_arguments(parser)
+    # Child mode (internal)
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    parser.add_argument("--workbook", help=argparse.SUPPRESS)
+    parser.add_argument("--manifest", help=argparse.SUPPRESS)
+    parser.add_argument("--rows", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child_main(args)
+        return
+
+    server_config = vars(config_from_args(args))
+    server_config["offline"] = args.offline
+    workbook = {"preset": args.preset, "sheets": args.sheets}
+    previous = load_previous(args.results, server_config, workbook) if args.compare else {}
+    port = free_port()
+    scratch = tempfile.mkdtemp(prefix="pipeline-bench-")
+    server = start_server(args, port, scratch)
+    try:
+        for rows in args.sizes:
+            result = run_size(args, rows, port, scratch)
+            print_result(result, previous.get(rows))
+            if not args.no_save:
+                os.makedirs(os.path.dirname(os.path.abspath(args.results)), exist_ok=True)
+                record = {"timestamp": datetime.now().isoformat(timespec="seconds"), "git": git_revision(), "server": server_config, "workbook": workbook, **result}
+                with open(args.results, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    finally:
+        server.terminate()
+        server.wait()
+        if args.keep:
+            print(f"\nscratch directory: {scratch}")
+        else:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Report rendering benchmark: wall time and peak Python memory for rendering
+reports of synthetic jobs, plus cold template load with and without the
+Jinja bytecode cache.
+
+Usage (from the project root, where .env lives):
+    python benchmarks/bench_report_render.py --sizes 10000 100000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "backend"))
+
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache  # noqa: E402
+from app.db import base  # noqa: E402,F401  (registers all ORM models)
+from app.models.testcase import TestCase  # noqa: E402
+from app.models.defect import DefectAnalysis, DefectCluster  # noqa: E402
+from app.services.analytics.stats import stats_service  # noqa: E402
+from app.services.report_gen.renderer import report_generator  # noqa: E402
+
+
+def build_job(size: int):
+    clusters = [DefectCluster(cluster_name=f"聚类 {i}", summary="同类缺陷", risk_assessment="中") for i in range(20)]
+    cases = []
+    for i in range(size):
+        result = "Fail" if i % 7 == 0 else "Pass"
+        case = TestCase(
+            ordinal=i,
+            case_name=f"模块{i % 40}-用例{i}",
+            steps="1. 打开页面 2. 输入数据 3. 点击提交",
+            expected="提交成功，页面提示保存完成",
+            actual="提交成功" if result == "Pass" else "页面报错：服务器内部错误",
+            test_result="通过" if result == "Pass" else "失败",
+            normalized_result=result,
+            module=f"模块{i % 40}",
+            source_sheet="Sheet1",
+            source_row=i + 2,
+            audit_status="Flagged" if i % 97 == 0 else "Pass",
+        )
+        if result == "Fail":
+            case.defect_analysis = DefectAnalysis(phenomenon="提交失败", observed_fact="接口返回 500", hypothesis="服务端异常", severity_guess="Major")
+            case.defect_analysis.cluster = clusters[i % len(clusters)]
+        cases.append(case)
+    return cases, clusters
+
+
+def bench_render(size: int, out_dir: str) -> dict:
+    cases, clusters = build_job(size)
+    stats = stats_service.compute_stats(cases)
+    defects = [c.defect_analysis for c in cases if c.defect_analysis is not None]
+    suspicious = [c for c in cases if c.audit_status == "Flagged"]
+    output_path = os.path.join(out_dir, f"report_bench_{size}.html")
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    report_generator.render_report("bench", stats, defects, clusters, suspicious, cases, output_path)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    data_dir = os.path.splitext(output_path)[0] + "_data"
+    data_bytes = sum(os.path.getsize(os.path.join(data_dir, f)) for f in os.listdir(data_dir))
+    return {
+        "cases": size,
+        "seconds": round(elapsed, 3),
+        "peak_mb": round(peak / 1e6, 1),
+        "html_kb": round(os.path.getsize(output_path) / 1e3, 1),
+        "data_kb": round(data_bytes / 1e3, 1),
+    }
+
+
+def bench_template_load(repeat: int = 20) -> dict:
+    template_dir = report_generator.env.loader.searchpath[0]
+    cache_dir = tempfile.mkdtemp(prefix="jinja-bench-")
+    try:
+        Environment(loader=FileSystemLoader(template_dir), bytecode_cache=FileSystemBytecodeCache(cache_dir)).get_template("report.html")
+
+        def load(cached: bool) -> float:
+            started = time.perf_counter()
+            for _ in range(repeat):
+                env = Environment(
+                    loader=FileSystemLoader(template_dir),
+                    bytecode_cache=FileSystemBytecodeCache(cache_dir) if cached else None,
+                )
+                env.get_template("report.html")
+            return (time.perf_counter() - started) / repeat * 1000
+
+        return {"cold_load_ms": round(load(False), 2), "cached_load_ms": round(load(True), 2)}
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    args = parser.parse_args()
+
+    # Benchmarks must not call the real LLM
+    report_generator.generate_summary = lambda *a, **kw: "<p>基准测试占位总结。</p>"
+
+    out_dir = tempfile.mkdtemp(prefix="report-bench-")
+    try:
+        print(f"{'cases':>8} {'seconds':>8} {'peak_mb':>8} {'html_kb':>8} {'data_kb':>8}")
+        for size in args.sizes:
+            row = bench_render(size, out_dir)
+            print(f"{row['cases']:>8} {row['seconds']:>8} {row['peak_mb']:>8} {row['html_kb']:>8} {row['data_kb']:>8}")
+        print("template load:", bench_template_load())
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,515 @@
+"""
+Local stand-in for the Zhipu chat-completions API, for benchmarking the pipeline
+without calling (and paying for) the real LLM.
+
+Every prompt type the pipeline sends (column alignment, result normalization,
+module tagging, audit, defect extraction, clustering, incremental clustering,
+summary) gets a deterministic, schema-valid answer derived from the prompt itself.
+Latency, HTTP 500 / 429 rates and malformed-JSON rates are configurable so retry
+and re-queue paths can be measured too. Streaming (`stream: true`) is supported.
+`max_tokens` is honoured (longer answers are cut, finish_reason "length"), and calls
+to the fast models can be made quicker to see the effect of per-stage model routing.
+For tail-latency work, a share of calls can stall (answer only after --stall-seconds),
+and an outage window answers every call with HTTP 503.
+With --batch-dir it also works through the backend's local offline batches
+(LLM_BATCH_BACKEND=local): every `<batch-dir>/<id>/input.jsonl` is answered into
+`output.jsonl` after --batch-delay seconds.
+
+Usage (from the project root):
+    python benchmarks/fake_llm_server.py --port 8765 --latency-ms 200 --error-rate 0.01
+    python benchmarks/fake_llm_server.py --stall-rate 0.01 --stall-seconds 60 --outage-after 200 --outage-seconds 20
+    python benchmarks/fake_llm_server.py --batch-dir backend/batches/local --batch-delay 5
+    LLM_BASE_URL=http://127.0.0.1:8765/api/paas/v4 uvicorn app.main:app --app-dir backend
+
+GET /stats returns call counts and tokens per prompt type and calls per model;
+POST /reset clears them.
+"""
+import argparse
+import ast
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+API_PREFIX = "/api/paas/v4"
+
+# Header synonyms of the standard fields, used to answer column-alignment prompts
+FIELD_SYNONYMS = {
+    "case_id": ["用例编号", "用例id", "编号", "id", "case id", "caseid", "序号", "no"],
+    "case_name": ["用例名称", "用例标题", "标题", "名称", "测试项", "case name", "title", "name", "测试用例"],
+    "precondition": ["前置条件", "预置条件", "前提", "precondition", "pre-condition"],
+    "steps": ["测试步骤", "操作步骤", "步骤", "steps", "step"],
+    "expected": ["预期结果", "期望结果", "预期", "expected", "expected result"],
+    "actual": ["实际结果", "实际", "实测结果", "actual", "actual result"],
+    "test_result": ["测试结果", "执行结果", "结果", "状态", "result", "status", "pass/fail"],
+    "priority": ["优先级", "级别", "priority", "level"],
+    "executor": ["执行人", "测试人员", "测试人", "负责人", "executor", "tester", "owner"],
+    "exec_time": ["执行时间", "执行日期", "测试日期", "日期", "时间", "date", "exec time"],
+    "remark": ["备注", "说明", "remark", "comment", "notes", "note"],
+}
+
+RESULT_WORDS = {
+    "Pass": ["通过", "成功", "pass", "ok", "success", "passed", "√", "y"],
+    "Fail": ["失败", "错误", "不通过", "fail", "failed", "error", "bug", "ng", "×", "x", "n"],
+    "Blocked": ["阻塞", "block", "blocked", "受阻"],
+    "Skipped": ["跳过", "不适用", "skip", "skipped", "na", "n/a", "未执行"],
+}
+
+FAILURE_WORDS = ["失败", "错误", "异常", "报错", "未找到", "不匹配", "超时", "崩溃", "error", "fail", "bug", "缺陷"]
+
+MODULES = ["登录模块", "用户中心", "订单管理", "支付中心", "商品管理", "购物车", "消息通知", "权限管理", "报表统计", "系统设置", "搜索服务", "文件上传"]
+
+DEFECT_KINDS = [
+    ("接口返回 500", "服务端异常", "Critical"),
+    ("页面显示错误", "前端渲染缺陷", "Major"),
+    ("响应超时", "性能瓶颈", "Major"),
+    ("数据不一致", "数据同步问题", "Major"),
+    ("提示文案错误", "文案配置错误", "Minor"),
+]
+
+
+@dataclass
+class FakeLLMConfig:
+    latency_ms: float = 100.0
+    latency_dist: str = "lognormal" # fixed, uniform, lognormal
+    latency_sigma: float = 0.5 # lognormal shape; uniform spans [0, 2 * mean]
+    error_rate: float = 0.0 # HTTP 500
+    rate_limit_rate: float = 0.0 # HTTP 429
+    malformed_rate: float = 0.0 # 200 with truncated JSON
+    fast_models: str = "glm-4-flash,glm-4-flashx" # Comma-separated
+    fast_latency_factor: float = 1.0 # Latency multiplier for the fast models
+    stall_rate: float = 0.0 # Calls that hang for stall_seconds before answering
+    stall_seconds: float = 60.0
+    outage_after: int = 0 # Calls answered before the outage begins
+    outage_seconds: float = 0.0 # Length of the outage, in which every call gets HTTP 503, 0 = none
+    seed: int = 0
+    batch_delay: float = 1.0 # Seconds before a batch's output file is written
+
+
+def _digest(text: str) -> int:
+    return int(hashlib.md5(text.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def _pick(options: List[Any], text: str) -> Any:
+    return options[_digest(text) % len(options)]
+
+
+def _json_after(prompt: str, marker: str) -> Any:
+    """Decode the JSON value that follows `marker` in the prompt."""
+    start = prompt.index(marker) + len(marker)
+    start = min(i for i in (prompt.find("[", start), prompt.find("{", start)) if i != -1)
+    value, _ = json.JSONDecoder().raw_decode(prompt, start)
+    return value
+
+
+def _literal_after(prompt: str, marker: str) -> Any:
+    """Decode the Python literal (list/dict repr) on the line that follows `marker`."""
+    line = prompt[prompt.index(marker) + len(marker):].split("\n", 1)[0].strip()
+    try:
+        return ast.literal_eval(line)
+    except (ValueError, SyntaxError):
+        return []
+
+
+def _has_failure_words(*texts: Optional[str]) -> bool:
+    text = " ".join(str(t) for t in texts if t).lower()
+    return any(word in text for word in FAILURE_WORDS)
+
+
+def answer_align(prompt: str) -> Dict[str, str]:
+    mapping = {}
+    for header in _literal_after(prompt, "列名列表:"):
+        key = re.sub(r"[\s_]+", " ", str(header)).strip().lower()
+        for field, synonyms in FIELD_SYNONYMS.items():
+            # Exact spelling, or a synonym with a short decoration ("实际结果(必填)"); banner titles stay unmapped
+            if field not in mapping.values() and any(key == s or (len(s) > 1 and s in key and len(key) <= len(s) + 4) for s in synonyms):
+                mapping[str(header)] = field
+                break
+    return mapping
+
+
+def answer_normalize(prompt: str) -> Dict[str, str]:
+    mapping = {}
+    for value in _literal_after(prompt, "输入值列表："):
+        key = str(value).strip().lower()
+        status = next((s for s, words in RESULT_WORDS.items() if key in words), None)
+        if status is None:
+            status = next((s for s, words in RESULT_WORDS.items() if any(len(w) > 1 and w in key for w in words)), "Skipped")
+        mapping[str(value)] = status
+    return mapping
+
+
+def answer_tagging(prompt: str) -> List[Dict[str, Any]]:
+    # Module follows the case-name prefix, so lexically similar cases agree (as grouping expects)
+    return [
+        {"id": item["id"], "module": _pick(MODULES, re.split(r"[-_：:\s]", str(item.get("name") or ""))[0][:4])}
+        for item in _json_after(prompt, "输入列表 (JSON):")
+    ]
+
+
+def answer_audit(prompt: str) -> Dict[str, Any]:
+    results = []
+    for item in _json_after(prompt, "输入用例列表 (JSON):"):
+        flagged = item.get("actual") in (None, "N/A", "") or _has_failure_words(item.get("actual"), item.get("remark"))
+        results.append({
+            "k": item["k"],
+            "status": "Flagged" if flagged else "Pass",
+            "reason": "实际结果描述了失败或缺少证据" if flagged else "",
+        })
+    return {"results": results}
+
+
+def answer_extract(prompt: str) -> Dict[str, Any]:
+    results = []
+    for item in _json_after(prompt, "输入用例列表 (JSON):"):
+        fact, cause, severity = _pick(DEFECT_KINDS, str(item.get("actual") or item.get("case")))
+        results.append({
+            "k": item["k"],
+            "phenomenon": f"{item.get('case') or '用例'}：{fact}",
+            "observed_fact": str(item.get("actual") or fact),
+            "hypothesis": cause,
+            "evidence": [str(item.get("actual") or fact)],
+            "repro_steps": str(item.get("steps") or "按用例步骤执行"),
+            "severity_guess": severity,
+        })
+    return {"results": results}
+
+
+def _defect_lines(prompt: str) -> List[Tuple[str, str]]:
+    return re.findall(r"ID: (\d+) \| 现象: (.*)", prompt)
+
+
+def _defect_kind(phenomenon: str) -> str:
+    return next((cause for fact, cause, _ in DEFECT_KINDS if fact in phenomenon), "其他问题")
+
+
+def answer_cluster(prompt: str) -> Dict[str, Any]:
+    groups: Dict[str, List[str]] = {}
+    for defect_id, phenomenon in _defect_lines(prompt):
+        groups.setdefault(_defect_kind(phenomenon), []).append(defect_id)
+    return {"clusters": [
+        {"cluster_name": name, "summary": f"{len(ids)} 个缺陷表现为{name}", "risk_assessment": "影响相关功能的正常使用", "defect_ids": ids}
+        for name, ids in groups.items()
+    ]}
+
+
+def answer_cluster_incremental(prompt: str) -> Dict[str, Any]:
+    # Defects of a known kind join the existing cluster of that name, others open a new one
+    groups: Dict[str, List[str]] = {}
+    for defect_id, phenomenon in _defect_lines(prompt.split("【新增缺陷】", 1)[1]):
+        groups.setdefault(_defect_kind(phenomenon), []).append(defect_id)
+    return {"clusters": [
+        {"cluster_name": name, "summary": "新增缺陷", "risk_assessment": "待评估", "defect_ids": ids}
+        for name, ids in groups.items()
+    ]}
+
+
+def answer_summary(prompt: str) -> str:
+    return (
+        "<p>本轮测试整体执行完成，通过率处于可接受范围。</p>"
+        "<p>失败用例主要集中在少数模块，建议优先修复严重程度为 Critical 的缺陷，并对存疑用例进行复核。</p>"
+    )
+
+
+# Prompt marker -> (kind, answer); checked in order
+PROMPT_TYPES = [
+    ("数据解析引擎", "align", answer_align),
+    ("映射到标准状态", "normalize", answer_normalize),
+    ("分类引擎", "tagging", answer_tagging),
+    ("测试质量审计员", "audit", answer_audit),
+    ("分析以下失败用例", "extract", answer_extract),
+    ("归入已有的缺陷聚类", "cluster_incremental", answer_cluster_incremental),
+    ("归类到不同的聚类", "cluster", answer_cluster),
+]
+
+
+def classify(prompt: str):
+    for marker, kind, answer in PROMPT_TYPES:
+        if marker in prompt:
+            return kind, answer
+    return "summary", answer_summary
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly one token per CJK character and per four other characters
+    cjk = sum(1 for ch in text if "一" <= ch <= "鿿")
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Longest prefix of `text` within `max_tokens` (same estimate as above)."""
+    used = 1
+    for i, ch in enumerate(text):
+        used += 1 if "一" <= ch <= "鿿" else 0.25
+        if used > max_tokens:
+            return text[:i]
+    return text
+
+
+class FakeLLM:
+    def __init__(self, config: FakeLLMConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+        self.reset()
+
+    def reset(self) -> None:
+        self.calls: Counter = Counter()
+        self.prompt_tokens: Counter = Counter()
+        self.completion_tokens: Counter = Counter()
+        self.injected: Counter = Counter()
+        self.models: Counter = Counter()
+        self.truncated = 0
+        self.outage_started: Optional[float] = None
+        self.started_at = time.time()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "config": asdict(self.config),
+            "calls": dict(self.calls),
+            "total_calls": sum(self.calls.values()),
+            "prompt_tokens": dict(self.prompt_tokens),
+            "completion_tokens": dict(self.completion_tokens),
+            "total_tokens": sum(self.prompt_tokens.values()) + sum(self.completion_tokens.values()),
+            "injected": dict(self.injected),
+            "models": dict(self.models),
+            "truncated": self.truncated,
+            "seconds": round(time.time() - self.started_at, 3),
+        }
+
+    def latency(self, model: str) -> float:
+        mean = self.config.latency_ms / 1000
+        if model in self.config.fast_models.split(","):
+            mean *= self.config.fast_latency_factor
+        if self.config.latency_dist == "fixed":
+            return mean
+        if self.config.latency_dist == "uniform":
+            return self.rng.uniform(0, 2 * mean)
+        # Lognormal with the configured mean: a long tail like real model latency
+        sigma = self.config.latency_sigma
+        return self.rng.lognormvariate(0, sigma) * mean / (2.718281828 ** (sigma * sigma / 2))
+
+    def stalled(self) -> bool:
+        # No roll without stalls, so earlier seeded runs stay reproducible
+        return self.config.stall_rate > 0 and self.rng.random() < self.config.stall_rate
+
+    def in_outage(self) -> bool:
+        if self.config.outage_seconds <= 0:
+            return False
+        if self.outage_started is None and sum(self.calls.values()) >= self.config.outage_after:
+            self.outage_started = time.time()
+        return self.outage_started is not None and time.time() - self.outage_started < self.config.outage_seconds
+
+    def complete(self, body: Dict[str, Any], fault: Optional[str] = None) -> Tuple[str, str, Dict[str, int]]:
+        """Answer a chat request: (content, finish_reason, usage), and count it."""
+        prompt = "\n".join(str(m.get("content") or "") for m in body.get("messages", []))
+        kind, answer = classify(prompt)
+        model = body.get("model", "fake")
+        result = answer(prompt)
+        content = result if isinstance(result, str) else json.dumps(result, ensure_ascii=False)
+        if fault == "malformed" and kind != "summary":
+            self.injected["malformed"] += 1
+            content = content[: max(1, len(content) // 2)]
+
+        finish_reason = "stop"
+        max_tokens = body.get("max_tokens")
+        if max_tokens and estimate_tokens(content) > max_tokens:
+            content = truncate_tokens(content, max_tokens)
+            finish_reason = "length"
+            self.truncated += 1
+
+        usage = {"prompt_tokens": estimate_tokens(prompt), "completion_tokens": estimate_tokens(content)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        self.calls[kind] += 1
+        self.models[model] += 1
+        self.prompt_tokens[kind] += usage["prompt_tokens"]
+        self.completion_tokens[kind] += usage["completion_tokens"]
+        return content, finish_reason, usage
+
+    def fault(self) -> Optional[str]:
+        roll = self.rng.random()
+        for name, rate in (("error", self.config.error_rate), ("rate_limit", self.config.rate_limit_rate), ("malformed", self.config.malformed_rate)):
+            if roll < rate:
+                return name
+            roll -= rate
+        return None
+
+
+def create_app(config: FakeLLMConfig, batch_dir: Optional[str] = None) -> FastAPI:
+    fake = FakeLLM(config)
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        worker = asyncio.create_task(_work_batches(fake, batch_dir, config.batch_delay)) if batch_dir else None
+        yield
+        if worker:
+            worker.cancel()
+
+    app = FastAPI(title="Fake Zhipu LLM", lifespan=lifespan)
+    app.state.fake = fake
+
+    @app.get("/stats")
+    async def stats():
+        return fake.stats()
+
+    @app.post("/reset")
+    async def reset():
+        fake.reset()
+        return {"ok": True}
+
+    @app.post(API_PREFIX + "/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "fake")
+        if fake.in_outage():
+            fake.injected["outage"] += 1
+            return JSONResponse({"error": {"code": "503", "message": "fake outage"}}, status_code=503)
+        if fake.stalled():
+            fake.injected["stall"] += 1
+            await asyncio.sleep(config.stall_seconds)
+        await asyncio.sleep(fake.latency(model))
+
+        fault = fake.fault()
+        if fault == "error":
+            fake.injected["error"] += 1
+            return JSONResponse({"error": {"code": "500", "message": "fake internal error"}}, status_code=500)
+        if fault == "rate_limit":
+            fake.injected["rate_limit"] += 1
+            return JSONResponse({"error": {"code": "1302", "message": "fake rate limit"}}, status_code=429, headers={"Retry-After": "1"})
+
+        content, finish_reason, usage = fake.complete(body, fault)
+        completion_id = f"fake-{_digest(content):08x}"
+        if body.get("stream"):
+            return StreamingResponse(_stream(completion_id, model, content, usage, finish_reason), media_type="text/event-stream")
+        return _completion(completion_id, model, content, usage, finish_reason)
+
+    return app
+
+
+def _completion(completion_id: str, model: str, content: str, usage: Dict[str, int], finish_reason: str = "stop") -> Dict[str, Any]:
+    return {
+        "id": completion_id,
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "finish_reason": finish_reason, "message": {"role": "assistant", "content": content}}],
+        "usage": usage,
+    }
+
+
+def answer_batch(fake: FakeLLM, lines: List[str]) -> List[Dict[str, Any]]:
+    """Result lines of a batch request file; --error-rate / --malformed-rate apply per line."""
+    results = []
+    for line in lines:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        fault = fake.fault()
+        if fault in ("error", "rate_limit"):
+            fake.injected[fault] += 1
+            results.append({"custom_id": request["custom_id"], "error": {"code": "500", "message": f"fake {fault}"}})
+            continue
+        body = request.get("body") or {}
+        content, finish_reason, usage = fake.complete(body, fault)
+        completion = _completion(f"fake-{_digest(content):08x}", body.get("model", "fake"), content, usage, finish_reason)
+        results.append({"custom_id": request["custom_id"], "response": {"status_code": 200, "body": completion}})
+    return results
+
+
+async def _work_batches(fake: FakeLLM, batch_dir: str, delay: float, poll: float = 0.2) -> None:
+    """Answer `<batch_dir>/<id>/input.jsonl` into `output.jsonl`, `delay` seconds after it shows up."""
+    seen: Dict[str, float] = {}
+    while True:
+        await asyncio.sleep(poll)
+        if not os.path.isdir(batch_dir):
+            continue
+        for batch_id in os.listdir(batch_dir):
+            folder = os.path.join(batch_dir, batch_id)
+            if not os.path.isfile(os.path.join(folder, "input.jsonl")) or os.path.exists(os.path.join(folder, "output.jsonl")):
+                continue
+            if time.time() - seen.setdefault(batch_id, time.time()) < delay:
+                continue
+            with open(os.path.join(folder, "input.jsonl"), encoding="utf-8") as f:
+                results = answer_batch(fake, f.readlines())
+            fake.injected["batches"] += 1
+            with open(os.path.join(folder, "output.jsonl.tmp"), "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in results)
+            os.replace(os.path.join(folder, "output.jsonl.tmp"), os.path.join(folder, "output.jsonl"))
+
+
+async def _stream(completion_id: str, model: str, content: str, usage: Dict[str, int], finish_reason: str = "stop", chunk_chars: int = 16):
+    created = int(time.time())
+    for i in range(0, len(content), chunk_chars):
+        chunk = {
+            "id": completion_id, "created": created, "model": model,
+            "choices": [{"index": 0, "delta": {"role": "assistant", "content": content[i:i + chunk_chars]}}],
+        }
+        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+        await asyncio.sleep(0.005)
+    last = {
+        "id": completion_id, "created": created, "model": model,
+        "choices": [{"index": 0, "finish_reason": finish_reason, "delta": {"role": "assistant", "content": ""}}],
+        "usage": usage,
+    }
+    yield f"data: {json.dumps(last, ensure_ascii=False)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+def add_config_arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = FakeLLMConfig()
+    parser.add_argument("--latency-ms", type=float, default=defaults.latency_ms, help="mean latency per call")
+    parser.add_argument("--latency-dist", choices=["fixed", "uniform", "lognormal"], default=defaults.latency_dist)
+    parser.add_argument("--latency-sigma", type=float, default=defaults.latency_sigma)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate, help="share of calls answered with HTTP 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=defaults.rate_limit_rate, help="share of calls answered with HTTP 429")
+    parser.add_argument("--malformed-rate", type=float, default=defaults.malformed_rate, help="share of JSON answers truncated")
+    parser.add_argument("--fast-models", default=defaults.fast_models, help="comma-separated models treated as fast")
+    parser.add_argument("--fast-latency-factor", type=float, default=defaults.fast_latency_factor, help="latency multiplier for the fast models")
+    parser.add_argument("--stall-rate", type=float, default=defaults.stall_rate, help="share of calls that hang for --stall-seconds")
+    parser.add_argument("--stall-seconds", type=float, default=defaults.stall_seconds)
+    parser.add_argument("--outage-after", type=int, default=defaults.outage_after, help="calls answered before the outage begins")
+    parser.add_argument("--outage-seconds", type=float, default=defaults.outage_seconds, help="length of the HTTP 503 outage, 0 = none")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--batch-delay", type=float, default=defaults.batch_delay, help="seconds before a batch is answered")
+
+
+def config_from_args(args: argparse.Namespace) -> FakeLLMConfig:
+    return FakeLLMConfig(
+        latency_ms=args.latency_ms,
+        latency_dist=args.latency_dist,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        malformed_rate=args.malformed_rate,
+        fast_models=args.fast_models,
+        fast_latency_factor=args.fast_latency_factor,
+        stall_rate=args.stall_rate,
+        stall_seconds=args.stall_seconds,
+        outage_after=args.outage_after,
+        outage_seconds=args.outage_seconds,
+        seed=args.seed,
+        batch_delay=args.batch_delay,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--batch-dir", help="answer local offline batches in this directory (LLM_BATCH_DIR/local)")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+    uvicorn.run(create_app(config_from_args(args), args.batch_dir), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
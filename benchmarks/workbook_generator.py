@@ -0,0 +1,380 @@
+"""
+Seeded generator of realistic, messy test-result workbooks for load and scaling tests.
+
+Messiness knobs: several sheets, mixed Chinese/English header synonyms, shuffled and
+extra columns, synonym result values (通过/PASS/√ ...), blank rows, duplicated cases,
+very long actual/remark text, planted false passes and banner rows above the header
+(a title line plus a group row, as left behind by merged header cells).
+Rows are written in streaming mode (openpyxl write-only / csv), so million-row files
+are cheap to create.
+
+Next to the workbook, `<name>.manifest.json` records the seed, the settings, every
+sheet's header row and true column mapping, and totals; `<name>.truth.jsonl` holds one
+line per data row (sheet, row, case name, true result, true module, false pass,
+duplicate of) so benchmarks can score accuracy alongside speed.
+
+Usage (from the project root):
+    python benchmarks/workbook_generator.py out/release.xlsx --rows 100000 --sheets 5 --preset chaotic
+    python benchmarks/workbook_generator.py out/cases.csv --rows 1000000 --seed 7
+"""
+import argparse
+import csv
+import json
+import os
+import random
+from collections import Counter, deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+GENERATOR_VERSION = 1
+
+# Standard field -> header spellings seen in real workbooks
+HEADER_VARIANTS = {
+    "case_id": ["用例编号", "编号", "Case ID", "ID", "序号"],
+    "case_name": ["用例名称", "用例标题", "测试项", "Case Name", "Title"],
+    "precondition": ["前置条件", "预置条件", "Precondition"],
+    "steps": ["测试步骤", "操作步骤", "Steps"],
+    "expected": ["预期结果", "期望结果", "Expected Result"],
+    "actual": ["实际结果", "实测结果", "Actual Result"],
+    "test_result": ["测试结果", "执行结果", "状态", "Result", "Status"],
+    "priority": ["优先级", "级别", "Priority"],
+    "executor": ["执行人", "测试人员", "Tester", "Owner"],
+    "exec_time": ["执行时间", "测试日期", "Date"],
+    "remark": ["备注", "说明", "Remark", "Comment"],
+}
+NOISE_HEADERS = ["需求编号", "版本", "所属迭代", "Build", "关联缺陷", "Platform"]
+
+RESULT_VARIANTS = {
+    "Pass": ["通过", "Pass", "PASS", "OK", "成功", "√", "passed"],
+    "Fail": ["失败", "Fail", "FAIL", "不通过", "Bug", "×", "NG"],
+    "Blocked": ["阻塞", "Blocked", "Block", "受阻"],
+    "Skipped": ["跳过", "Skip", "N/A", "不适用", "未执行"],
+}
+RESULT_WEIGHTS = {"Pass": 0.82, "Fail": 0.1, "Blocked": 0.04, "Skipped": 0.04}
+
+# True module -> vocabulary its case names are built from
+MODULES = {
+    "登录模块": ["账号密码登录", "验证码登录", "记住登录状态", "登录失败锁定", "第三方登录"],
+    "用户中心": ["修改昵称", "上传头像", "绑定手机号", "修改密码", "注销账号"],
+    "订单管理": ["创建订单", "取消订单", "订单列表分页", "订单详情", "订单导出"],
+    "支付中心": ["微信支付", "支付宝支付", "余额支付", "支付超时关闭", "退款申请"],
+    "商品管理": ["商品上架", "商品下架", "库存调整", "商品搜索", "规格编辑"],
+    "购物车": ["加入购物车", "修改数量", "删除商品", "全选结算", "失效商品提示"],
+    "消息通知": ["站内信推送", "短信通知", "邮件提醒", "消息已读", "通知设置"],
+    "权限管理": ["角色创建", "菜单授权", "数据权限", "批量授权", "越权访问拦截"],
+}
+SCENARIOS = ["正常流程", "边界值", "异常输入", "并发操作", "弱网环境", "重复提交", "空数据", "超长输入"]
+FAILURE_ACTUALS = ["接口返回 500，页面提示系统繁忙", "页面显示错误，按钮无响应", "响应超时（>30s）", "数据不一致，列表与详情不符", "提示文案错误"]
+FALSE_PASS_ACTUALS = ["页面报错，提交未成功", "未找到对应记录", "返回结果与预期不匹配"]
+EXECUTORS = ["张伟", "王芳", "李娜", "刘洋", "陈静", "tester01", "tester02", "qa_zhao"]
+
+PRESETS = {
+    "clean": dict(
+        header_synonyms=False, english_headers=0.0, shuffle_columns=False, noise_columns=0,
+        result_synonyms=0.0, blank_row_rate=0.0, duplicate_rate=0.0, long_text_rate=0.0,
+        banner_rate=0.0, false_pass_rate=0.01,
+    ),
+    "moderate": dict(
+        header_synonyms=True, english_headers=0.2, shuffle_columns=True, noise_columns=1,
+        result_synonyms=0.3, blank_row_rate=0.01, duplicate_rate=0.01, long_text_rate=0.005,
+        banner_rate=0.0, false_pass_rate=0.02,
+    ),
+    "chaotic": dict(
+        header_synonyms=True, english_headers=0.5, shuffle_columns=True, noise_columns=3,
+        result_synonyms=0.8, blank_row_rate=0.05, duplicate_rate=0.05, long_text_rate=0.02,
+        banner_rate=0.5, false_pass_rate=0.03,
+    ),
+}
+
+
+@dataclass
+class GeneratorConfig:
+    rows: int = 10000 # Data rows across all sheets (blank rows not included)
+    sheets: int = 1
+    seed: int = 0
+    header_synonyms: bool = True # Pick header spellings per sheet instead of the canonical one
+    english_headers: float = 0.2 # Share of headers spelled in English
+    shuffle_columns: bool = True
+    noise_columns: int = 1 # Extra columns that map to no standard field
+    result_synonyms: float = 0.3 # Share of result cells using a non-canonical spelling
+    blank_row_rate: float = 0.01
+    duplicate_rate: float = 0.01 # Rows repeating an earlier case of the same sheet
+    long_text_rate: float = 0.005 # Rows with multi-KB actual/remark text
+    long_text_chars: int = 3000
+    banner_rate: float = 0.0 # Share of sheets with a title row and a group row above the header
+    false_pass_rate: float = 0.02 # Passing rows whose actual result describes a failure
+
+    @classmethod
+    def preset(cls, name: str, **overrides: Any) -> "GeneratorConfig":
+        return cls(**{**PRESETS[name], **overrides})
+
+
+@dataclass
+class SheetPlan:
+    name: str
+    rows: int
+    fields: List[Optional[str]] # Standard field per column, None for noise columns
+    headers: List[str]
+    banner: bool
+    header_row: int = field(init=False) # 1-based row of the real header
+
+    def __post_init__(self):
+        self.header_row = 3 if self.banner else 1
+
+
+class WorkbookGenerator:
+    def __init__(self, config: GeneratorConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+
+    # Planning
+
+    def plan_sheets(self) -> List[SheetPlan]:
+        c = self.config
+        base, extra = divmod(c.rows, max(c.sheets, 1))
+        plans = []
+        for i in range(max(c.sheets, 1)):
+            fields: List[Optional[str]] = list(HEADER_VARIANTS)
+            if self.rng.random() < 0.3:
+                fields.remove("exec_time") # Not every team records it
+            fields += [None] * c.noise_columns
+            if c.shuffle_columns:
+                # Keep id/name up front as most sheets do, shuffle the rest
+                head, tail = fields[:2], fields[2:]
+                self.rng.shuffle(tail)
+                fields = head + tail
+            noise = iter(self.rng.sample(NOISE_HEADERS, min(c.noise_columns, len(NOISE_HEADERS))) + [f"列{n}" for n in range(c.noise_columns)])
+            headers = [self._header(f) if f else next(noise) for f in fields]
+            name = ["功能测试", "回归测试", "接口测试", "兼容性测试", "Smoke", "UAT"][i % 6] + (f"{i // 6 + 1}" if i >= 6 else "")
+            plans.append(SheetPlan(name, base + (1 if i < extra else 0), fields, headers, self.rng.random() < c.banner_rate))
+        return plans
+
+    def _header(self, std_field: str) -> str:
+        variants = HEADER_VARIANTS[std_field]
+        if not self.config.header_synonyms:
+            return variants[0]
+        english = [v for v in variants if v.isascii()]
+        chinese = [v for v in variants if not v.isascii()]
+        if english and self.rng.random() < self.config.english_headers:
+            return self.rng.choice(english)
+        return self.rng.choice(chinese)
+
+    # Rows
+
+    def iter_rows(self, plan: SheetPlan, sheet_index: int) -> Iterator[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]:
+        """Yield (values by standard field, truth) per data row; (None, None) is a blank row."""
+        c = self.config
+        modules = list(MODULES)
+        written: deque = deque(maxlen=1000) # Recent cases, the pool duplicates are drawn from
+        for n in range(plan.rows):
+            while self.rng.random() < c.blank_row_rate:
+                yield None, None
+            if written and self.rng.random() < c.duplicate_rate:
+                values, truth = self.rng.choice(written)
+                yield values, {**truth, "duplicate_of": truth["row"], "false_pass": truth["false_pass"]}
+                continue
+
+            module = self.rng.choice(modules)
+            feature = self.rng.choice(MODULES[module])
+            scenario = self.rng.choice(SCENARIOS)
+            result = self.rng.choices(list(RESULT_WEIGHTS), weights=list(RESULT_WEIGHTS.values()))[0]
+            false_pass = result == "Pass" and self.rng.random() < c.false_pass_rate
+
+            if result == "Pass":
+                actual = self.rng.choice(FALSE_PASS_ACTUALS) if false_pass else f"{feature}成功，结果与预期一致"
+            elif result == "Fail":
+                actual = self.rng.choice(FAILURE_ACTUALS)
+            elif result == "Blocked":
+                actual = "依赖环境不可用，无法执行"
+            else:
+                actual = None
+            remark = None
+            if self.rng.random() < c.long_text_rate:
+                filler = f"{feature}{scenario}日志片段：请求参数与响应体如下，"
+                actual = (actual or "") + (filler * (c.long_text_chars // len(filler) + 1))[:c.long_text_chars]
+                remark = "详见附件日志。" * (c.long_text_chars // 14)
+
+            variants = RESULT_VARIANTS[result]
+            raw_result = self.rng.choice(variants[1:]) if self.rng.random() < c.result_synonyms else variants[0]
+            case_id = f"TC-{sheet_index + 1:02d}-{n + 1:06d}"
+            values = {
+                "case_id": case_id,
+                "case_name": f"{module.replace('模块', '')}-{feature}-{scenario}",
+                "precondition": "已登录测试账号" if module != "登录模块" else "账号已注册",
+                "steps": f"1. 进入{module} 2. 执行{feature}（{scenario}） 3. 检查结果",
+                "expected": f"{feature}成功，页面提示操作完成",
+                "actual": actual,
+                "test_result": raw_result,
+                "priority": self.rng.choice(["P0", "P1", "P1", "P2", "P2", "P3"]),
+                "executor": self.rng.choice(EXECUTORS),
+                "exec_time": f"2024-{self.rng.randint(1, 12):02d}-{self.rng.randint(1, 28):02d}",
+                "remark": remark if remark else ("偶现问题，需复测" if result == "Fail" and self.rng.random() < 0.2 else None),
+            }
+            truth = {
+                "case_id": case_id,
+                "case_name": values["case_name"],
+                "raw_result": raw_result,
+                "result": result,
+                "module": module,
+                "false_pass": false_pass,
+                "duplicate_of": None,
+            }
+            written.append((values, truth))
+            yield values, truth
+
+
+def _cells(plan: SheetPlan, values: Optional[Dict[str, Any]], rng: random.Random) -> List[Any]:
+    if values is None:
+        return [None] * len(plan.fields)
+    return [values.get(f) if f else (rng.choice(["", "v2.3", "Sprint-12", "REQ-1024"]) or None) for f in plan.fields]
+
+
+def _group_label(std_field: Optional[str]) -> str:
+    if std_field in ("case_id", "case_name", "precondition", "priority"):
+        return "基本信息"
+    return "执行情况" if std_field else "其他"
+
+
+def _banner_rows(plan: SheetPlan) -> List[List[Any]]:
+    # What merged title/group cells look like once read cell by cell: only the first cell keeps the value
+    title = [f"{plan.name}执行结果汇总（自动生成）"] + [None] * (len(plan.fields) - 1)
+    labels = [_group_label(f) for f in plan.fields]
+    group = [label if i == 0 or label != labels[i - 1] else None for i, label in enumerate(labels)]
+    return [title, group]
+
+
+def generate_workbook(path: str, config: GeneratorConfig) -> Dict[str, Any]:
+    """Write the workbook (.xlsx, or .csv with one file per sheet) plus manifest and truth files; returns the manifest."""
+    generator = WorkbookGenerator(config)
+    plans = generator.plan_sheets()
+    stem, ext = os.path.splitext(path)
+    ext = ext.lower()
+    if ext not in (".xlsx", ".csv"):
+        raise ValueError(f"unsupported format: {ext}")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    totals = {"results": Counter(), "modules": Counter(), "blank_rows": 0, "duplicates": 0, "false_passes": 0, "long_texts": 0}
+    files: List[str] = []
+    cell_rng = random.Random(config.seed + 1)
+
+    with open(stem + ".truth.jsonl", "w", encoding="utf-8") as truth_file:
+        def write_sheet(plan: SheetPlan, sheet_index: int, append) -> None:
+            if plan.banner:
+                for row in _banner_rows(plan):
+                    append(row)
+            append(plan.headers)
+            row_number = plan.header_row
+            for values, truth in generator.iter_rows(plan, sheet_index):
+                row_number += 1
+                append(_cells(plan, values, cell_rng))
+                if truth is None:
+                    totals["blank_rows"] += 1
+                    continue
+                # Set in place: later duplicates of this case read the row number back
+                truth["row"] = row_number
+                totals["duplicates"] += truth["duplicate_of"] is not None
+                totals["results"][truth["result"]] += 1
+                totals["modules"][truth["module"]] += 1
+                totals["false_passes"] += truth["false_pass"]
+                totals["long_texts"] += len(values["actual"] or "") > config.long_text_chars // 2
+                truth_file.write(json.dumps({"sheet": plan.name, **truth}, ensure_ascii=False) + "\n")
+
+        if ext == ".xlsx":
+            from openpyxl import Workbook
+
+            wb = Workbook(write_only=True)
+            for i, plan in enumerate(plans):
+                ws = wb.create_sheet(plan.name)
+                write_sheet(plan, i, ws.append)
+            wb.save(path)
+            files.append(path)
+        else:
+            for i, plan in enumerate(plans):
+                sheet_path = path if len(plans) == 1 else f"{stem}_{plan.name}.csv"
+                with open(sheet_path, "w", encoding="utf-8-sig", newline="") as f:
+                    writer = csv.writer(f)
+                    write_sheet(plan, i, writer.writerow)
+                files.append(sheet_path)
+
+    manifest = {
+        "generator_version": GENERATOR_VERSION,
+        "config": asdict(config),
+        "files": files,
+        "truth": stem + ".truth.jsonl",
+        "sheets": [
+            {
+                "name": p.name,
+                "rows": p.rows,
+                "header_row": p.header_row,
+                "banner": p.banner,
+                "columns": [{"header": h, "field": f} for h, f in zip(p.headers, p.fields)],
+            }
+            for p in plans
+        ],
+        "totals": {k: dict(v) if isinstance(v, Counter) else v for k, v in totals.items()},
+    }
+    with open(stem + ".manifest.json", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def iter_truth(manifest: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    with open(manifest["truth"], "r", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def score_cases(manifest: Dict[str, Any], cases: Iterator[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Accuracy of parsed/analyzed cases (dicts with source_sheet, source_row, case_name,
+    normalized_result, module, audit_status) against the ground truth.
+    Module accuracy is cluster purity: the LLM names modules freely, so each true module
+    counts its most common predicted label as correct.
+    """
+    truth = {(t["sheet"], t["row"]): t for t in iter_truth(manifest)}
+    matched = columns_ok = results_ok = 0
+    module_votes: Dict[str, Counter] = {}
+    false_passes = flagged = 0
+    for case in cases:
+        t = truth.get((case.get("source_sheet"), case.get("source_row")))
+        if t is None:
+            continue
+        matched += 1
+        if case.get("case_name") == t["case_name"]:
+            columns_ok += 1
+        if case.get("normalized_result") == t["result"]:
+            results_ok += 1
+        module_votes.setdefault(t["module"], Counter())[case.get("module")] += 1
+        if t["false_pass"]:
+            false_passes += 1
+            flagged += case.get("audit_status") == "Flagged"
+
+    def share(n: int, d: int) -> Optional[float]:
+        return round(n / d, 4) if d else None
+
+    return {
+        "truth_rows": len(truth),
+        "matched_rows": matched,
+        "coverage": share(matched, len(truth)),
+        "column_accuracy": share(columns_ok, matched),
+        "result_accuracy": share(results_ok, matched),
+        "module_purity": share(sum(v.most_common(1)[0][1] for v in module_votes.values()), matched),
+        "false_pass_recall": share(flagged, false_passes),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("output", help="target .xlsx or .csv path")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--sheets", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--preset", choices=sorted(PRESETS), default="moderate")
+    args = parser.parse_args()
+
+    manifest = generate_workbook(args.output, GeneratorConfig.preset(args.preset, rows=args.rows, sheets=args.sheets, seed=args.seed))
+    print(json.dumps({"files": manifest["files"], "truth": manifest["truth"], "totals": manifest["totals"]}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()